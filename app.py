@@ -3,6 +3,9 @@ Quick Capture Bot - Zeabur 入口文件
 """
 import os
 import sys
+import time
+import atexit
+import threading
 
 # 添加 scripts 目錄到路徑
 scripts_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts')
@@ -11,9 +14,9 @@ sys.path.insert(0, scripts_dir)
 from dotenv import load_dotenv
 load_dotenv()
 
+import click
 from flask import Flask, request, jsonify
 from datetime import datetime
-import requests
 
 # 環境變數
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -21,14 +24,41 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 # 導入模組
 from message_parser import parse_telegram_message, determine_save_action
-from reader_client import save_url, save_note
-from ai_filter import process_capture_content, detect_domain
+from config import (
+    CAPTURE_WRITE_BEHIND,
+    CAPTURE_ENRICH_LATER,
+    CAPTURE_ENRICH_WORKERS,
+    CAPTURE_QUEUE_POLL,
+    CAPTURE_REPLAY_PER_MIN,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_DRAIN_TIMEOUT,
+)
+from reader_client import save_url, save_note, update_document, get_save_queue, TAG_REGISTRY
+from http_session import get_session, connection_stats
+from ai_filter import process_capture_content, detect_domain, provisional_title
+from saved_urls import find_saved_capture, record_saved_capture
+from worker_pool import WorkerPool, LatencyWindow
+from capture_queue import (
+    CaptureFailed,
+    get_update_queue,
+    enqueue_update,
+    process_next,
+    prune_updates,
+    note_id,
+    reply_id_for_update,
+    remember_reply,
+    get_enrich_queue,
+    enqueue_enrich,
+    process_next_enrich,
+)
+from dead_letters import get_dead_letters, replay as replay_dead_letters
 
 app = Flask(__name__)
 
 
 def send_reply(chat_id: int, text: str, parse_mode: str = "HTML"):
-    """發送回覆訊息"""
+    """發送回覆訊息，返回訊息 ID（失敗時為 None）"""
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": chat_id,
@@ -37,13 +67,38 @@ def send_reply(chat_id: int, text: str, parse_mode: str = "HTML"):
         "disable_web_page_preview": True
     }
     try:
-        requests.post(url, json=payload)
+        response = get_session().post(url, json=payload)
+        return response.json().get("result", {}).get("message_id")
     except Exception as e:
         print(f"Error sending reply: {e}")
+        return None
 
 
-def process_message(message: dict) -> dict:
-    """處理單一訊息"""
+def edit_reply(chat_id: int, message_id: int, text: str, parse_mode: str = "HTML"):
+    """編輯已發送的回覆訊息"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/editMessageText"
+    payload = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "parse_mode": parse_mode,
+        "disable_web_page_preview": True
+    }
+    try:
+        get_session().post(url, json=payload)
+    except Exception as e:
+        print(f"Error editing reply: {e}")
+
+
+def process_message(message: dict, write_behind: bool = CAPTURE_WRITE_BEHIND,
+                    enrich_later: bool = CAPTURE_ENRICH_LATER) -> dict:
+    """
+    處理單一訊息
+
+    write_behind 時存檔交給背景佇列；enrich_later 時不等 AI，先以 #TG收集 與暫時標題存檔，
+    領域 tag 與標題由 enrich_capture 在背景補上（result["enrich"]）。
+    result["stage"] 記錄進行到的階段。
+    """
     parsed = parse_telegram_message(message)
     action = determine_save_action(parsed)
 
@@ -53,46 +108,91 @@ def process_message(message: dict) -> dict:
         "title": None,
         "domain": None,
         "source": parsed.source_label,
+        "duplicate": False,
+        "pending": False,
+        "doc_id": None,
+        "stage": None,
         "error": None
     }
 
     try:
         if action["save_method"] == "save_url":
             url = action["url"]
+            result["url"] = url
             tags = ["#TG收集"]
 
-            domain = detect_domain(parsed.text)
-            if domain != "其他":
-                tags.append(f"@{domain}")
-            result["domain"] = domain
+            # 已存入的連結：直接回覆，不再判斷領域與存入
+            result["stage"] = "lookup"
+            saved = find_saved_capture(url, tags)
+            if saved:
+                result.update(success=True, duplicate=True, doc_id=saved["doc_id"],
+                              title=saved["title"] or url[:50], domain=saved["domain"])
+                return result
+
+            if enrich_later:
+                result["enrich"] = {"kind": "url", "text": parsed.text}
+            else:
+                result["stage"] = "classify"
+                domain = detect_domain(parsed.text)
+                if domain != "其他":
+                    tags.append(f"@{domain}")
+                result["domain"] = domain
 
             user_note = action.get("user_note")
             if parsed.is_forward and parsed.channel_name:
                 source_note = f"來源：{parsed.channel_name}"
                 user_note = f"{source_note}\n\n{user_note}" if user_note else source_note
 
+            if write_behind:
+                # 先回覆，存檔交給背景佇列（見 queue_save）
+                result.update(success=True, pending=True, title=url[:50])
+                result["save"] = {"method": "save_url", "url": url, "tags": tags, "notes": user_note}
+                return result
+
+            result["stage"] = "save"
             doc = save_url(url=url, tags=tags, notes=user_note)
             if doc:
                 result["success"] = True
+                result["doc_id"] = doc.get("id")
                 result["title"] = doc.get("title") or url[:50]
+                record_saved_capture(url, doc, tags)
+            else:
+                result["error"] = "存入失敗"
 
         elif action["save_method"] == "save_note":
             content = action["content"]
-            ai_result = process_capture_content(content)
-
-            result["title"] = ai_result["title"]
-            result["domain"] = ai_result["domain"]
-
-            tags = ["#TG收集", ai_result["domain_tag"]]
+            tags = ["#TG收集"]
 
+            if enrich_later:
+                title = provisional_title(content)
+                result["enrich"] = {"kind": "note", "content": content}
+            else:
+                result["stage"] = "classify"
+                ai_result = process_capture_content(content)
+                title = ai_result["title"]
+                result["domain"] = ai_result["domain"]
+                tags.append(ai_result["domain_tag"])
+            result["title"] = title
+
+            if write_behind:
+                result.update(success=True, pending=True)
+                result["save"] = {"method": "save_note", "content": content, "title": title,
+                                  "source_name": parsed.source_label, "tags": tags}
+                return result
+
+            result["stage"] = "save"
             doc = save_note(
                 content=content,
-                title=ai_result["title"],
+                title=title,
                 source_name=parsed.source_label,
-                tags=tags
+                tags=tags,
+                note_id=note_id(message)
             )
             if doc:
                 result["success"] = True
+                result["doc_id"] = doc.get("id")
+            else:
+                result["error"] = "存入失敗"
 
     except Exception as e:
         result["error"] = str(e)
@@ -103,26 +203,219 @@ def process_message(message: dict) -> dict:
 def format_reply(result: dict) -> str:
     """格式化回覆訊息"""
     if result["success"]:
-        lines = ["<b>OK</b> 已存入 Reader"]
+        if result.get("pending"):
+            lines = ["<b>...</b> 存入 Reader 中"]
+        elif result.get("duplicate"):
+            lines = ["<b>OK</b> 已在 Reader 中"]
+        else:
+            lines = ["<b>OK</b> 已存入 Reader"]
         if result["title"]:
             lines.append(f"<b>{result['title'][:40]}</b>")
         if result["domain"]:
             emoji = {"醫學": "🏥", "AI": "🤖", "國際": "🌍", "知識": "📚",
                      "生產力": "⚡", "生活": "🏠"}.get(result["domain"], "📌")
             lines.append(f"{emoji} {result['domain']}")
+        elif result.get("enrich"):
+            lines.append("🏷 分類中")
+        elif result.get("enrich_skipped"):
+            lines.append("🏷 未分類")
         if result["source"] and result["source"] != "我的筆記":
             lines.append(f"📍 {result['source']}")
         return "\n".join(lines)
     return f"Error\n{result.get('error', '未知錯誤')}"
 
 
+def queue_save(message: dict, reply_id: int, result: dict):
+    """把 process_message 準備好的存檔排入背景佇列，完成後由 on_save_complete 編輯回覆"""
+    save = result.pop("save")
+    chat_id = message["chat"]["id"]
+    meta = {"chat_id": chat_id, "reply_id": reply_id, "result": result, "message": message,
+            "url": save.get("url"), "tags": save["tags"]}
+    # 同一則訊息重新處理時不重複排入
+    key = note_id(message)
+    queue = get_save_queue()
+    if save["method"] == "save_url":
+        queue.save_url(save["url"], tags=save["tags"], notes=save["notes"],
+                       order_key=str(chat_id), meta=meta, dedupe_key=key)
+    else:
+        queue.save_note(save["content"], save["title"], source_name=save["source_name"], tags=save["tags"],
+                        note_id=key, order_key=str(chat_id), meta=meta, dedupe_key=key)
+
+
+@get_save_queue().on_complete
+def on_save_complete(meta: dict, doc: dict, error: str, attempts: int):
+    """背景存檔完成：更新回覆訊息"""
+    result = meta["result"]
+    result["pending"] = False
+    if doc is not None:
+        result["doc_id"] = doc.get("id")
+        if meta.get("url"):
+            result["title"] = doc.get("title") or result["title"]
+            record_saved_capture(meta["url"], doc, meta["tags"])
+        if result.get("enrich"):
+            queue_enrich({"chat_id": meta["chat_id"], "reply_id": meta["reply_id"], "result": result,
+                          "url": meta.get("url"), "tags": meta["tags"]}, note_id(meta["message"]))
+    else:
+        result.update(success=False, error=f"存入失敗：{error}")
+        get_dead_letters().record(meta["message"], "save", error, attempts=attempts)
+
+    text = format_reply(result)
+    if meta.get("reply_id"):
+        edit_reply(meta["chat_id"], meta["reply_id"], text)
+    else:
+        send_reply(meta["chat_id"], text)
+    print(f"Saved: {result['case_type']} - {result.get('title', 'N/A')}")
+
+
 @app.route("/", methods=["GET"])
 def index():
     return jsonify({"status": "ok", "service": "Quick Capture Bot"})
 
 
+@app.route("/stats", methods=["GET"])
+def stats():
+    """HTTP 連線重用、tag 登錄表與存檔佇列統計（本 worker）"""
+    return jsonify({"pid": os.getpid(), "connections": connection_stats(), "tags": TAG_REGISTRY.stats(),
+                    "save_queue": get_save_queue().stats()})
+
+
+# 這些階段的失敗多半是暫時的（Reader 5xx、AI 錯誤），交給 update 佇列延遲重試
+RETRYABLE_STAGES = ("lookup", "classify", "save")
+
+
+def handle_message(message: dict):
+    """
+    處理一則訊息並回覆
+
+    可重試階段失敗時拋出 CaptureFailed（不回覆），由 process_next 延遲重試，
+    重試用盡時由 give_up_update 寫入 dead letter；其他失敗（例如訊息無法解析）直接寫入。
+    回覆後才排入存檔，排入失敗而重試時沿用同一則回覆（reply_id_for_update）。
+    """
+    chat_id = message["chat"]["id"]
+    result = process_message(message)
+    if not result["success"] and result["stage"] in RETRYABLE_STAGES:
+        raise CaptureFailed(result["stage"], result["error"] or "未知錯誤")
+    # 回覆 ID 隨 update 保存：排入存檔失敗而重試時編輯同一則回覆，不重複發送
+    reply_id = reply_id_for_update()
+    if reply_id:
+        edit_reply(chat_id, reply_id, format_reply(result))
+    else:
+        reply_id = send_reply(chat_id, format_reply(result))
+        remember_reply(reply_id)
+    if result.get("save"):
+        queue_save(message, reply_id, result)
+    elif result["success"] and result.get("enrich"):
+        queue_enrich({"chat_id": chat_id, "reply_id": reply_id, "result": result,
+                      "url": result.get("url"), "tags": ["#TG收集"]}, note_id(message))
+    if not result["success"]:
+        get_dead_letters().record(message, result["stage"], result["error"])
+    print(f"Processed: {result['case_type']} - {result.get('title', 'N/A')}")
+
+
+def replay_message(message: dict, notify: bool = True):
+    """重跑 dead letter：同步存檔，成功時回覆（notify）"""
+    result = process_message(message, write_behind=False, enrich_later=False)
+    if result["success"] and notify:
+        send_reply(message["chat"]["id"], "↻ " + format_reply(result))
+    return result["success"], result["stage"], result["error"]
+
+
+def queue_enrich(job: dict, key: str):
+    """排入存檔後的 AI 補充（持久化；pool 已滿或重啟時由 sweep_updates 稍後處理）"""
+    enqueue_enrich(job, key)
+    enrich_pool.submit(None)
+
+
+def enrich_capture(job: dict):
+    """
+    背景 AI 補充：判斷領域（筆記另外生成標題），更新 Reader 文件並編輯回覆
+
+    Raises:
+        RuntimeError: Reader 更新失敗（由 process_next_enrich 延遲重試）
+    """
+    result = job["result"]
+    enrich = result["enrich"]
+    title = None
+    if enrich["kind"] == "note":
+        ai_result = process_capture_content(enrich["content"])
+        title = ai_result["title"]
+        domain, new_tags = ai_result["domain"], [ai_result["domain_tag"]]
+    else:
+        domain = detect_domain(enrich["text"])
+        new_tags = [f"@{domain}"] if domain != "其他" else []
+
+    if not update_document(result["doc_id"], title=title, add_tags=new_tags):
+        raise RuntimeError("Reader 更新失敗")
+
+    del result["enrich"]
+    result["domain"] = domain
+    result["title"] = title or result["title"]
+    if job.get("url"):
+        record_saved_capture(job["url"], {"id": result["doc_id"], "title": result["title"]},
+                             job["tags"] + new_tags)
+    if job.get("reply_id"):
+        edit_reply(job["chat_id"], job["reply_id"], format_reply(result))
+    print(f"Enriched: {result['case_type']} - {result.get('title', 'N/A')} ({result.get('domain')})")
+
+
+def give_up_enrich(job: dict, error: str):
+    """AI 補充重試用盡：回覆改為未分類（文件已存入，可用 domain_backfill.py 補上領域 tag）"""
+    result = job["result"]
+    result.pop("enrich", None)
+    result["enrich_skipped"] = True
+    if job.get("reply_id"):
+        edit_reply(job["chat_id"], job["reply_id"], format_reply(result))
+
+
+def process_enrich(_=None):
+    """worker pool 的工作：從持久化佇列領取一筆 AI 補充處理"""
+    process_next_enrich(enrich_capture, on_give_up=give_up_enrich)
+
+
+# 存檔後的 AI 補充；工作存在 capture_enrich 佇列，pool 只負責喚醒
+enrich_pool = WorkerPool("enrich", process_enrich, CAPTURE_ENRICH_WORKERS, WEBHOOK_QUEUE_SIZE)
+
+
+def give_up_update(message: dict, error: str, attempts: int, stage: str):
+    """update 重試用盡：寫入 dead letter 並回覆錯誤"""
+    get_dead_letters().record(message, stage, error, attempts=attempts)
+    reply_id = reply_id_for_update()
+    if reply_id:
+        edit_reply(message["chat"]["id"], reply_id, f"Error\n{error}")
+    else:
+        send_reply(message["chat"]["id"], f"Error\n{error}")
+
+
+def process_update(_=None):
+    """worker pool 的工作：從持久化佇列領取一筆 update 處理（在背景執行緒中執行）"""
+    process_next(handle_message, on_give_up=give_up_update)
+
+
+# webhook 只負責保存 update 並喚醒背景 worker，AI 判斷、存檔與回覆都不在請求中進行
+update_pool = WorkerPool("webhook", process_update, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+webhook_latency = LatencyWindow()
+
+
+def sweep_updates():
+    """定期喚醒 worker 處理遺留的 update 與 AI 補充（pool 已滿時、重啟前、其他 worker 中斷的）"""
+    last_prune = 0.0
+    while True:
+        time.sleep(CAPTURE_QUEUE_POLL)
+        try:
+            for queue, pool in ((get_update_queue(), update_pool), (get_enrich_queue(), enrich_pool)):
+                for _ in range(queue.ready_count()):
+                    if not pool.submit(None):
+                        break
+            if time.monotonic() - last_prune > 3600:
+                prune_updates()
+                last_prune = time.monotonic()
+        except Exception as e:
+            print(f"Error sweeping updates: {e}")
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
+    started = time.monotonic()
     try:
         update = request.get_json()
         if "message" in update:
@@ -132,14 +425,63 @@ def webhook():
             if str(chat_id) != str(TELEGRAM_CHAT_ID):
                 return jsonify({"status": "ignored"})
 
-            result = process_message(message)
-            send_reply(chat_id, format_reply(result))
-            print(f"Processed: {result['case_type']} - {result.get('title', 'N/A')}")
+            # 以 update_id 去重（Telegram 重送的 update 不再處理）
+            if enqueue_update(update) is None:
+                return jsonify({"status": "duplicate"})
+
+            # update 已保存；pool 已滿時由 sweep_updates 稍後處理
+            update_pool.submit(None)
 
         return jsonify({"status": "ok"})
     except Exception as e:
         print(f"Error: {e}")
         return jsonify({"status": "error"}), 500
+    finally:
+        webhook_latency.add(time.monotonic() - started)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """webhook 回應時間、worker pool 背壓、update、存檔與 AI 補充佇列"""
+    return jsonify({
+        "pid": os.getpid(),
+        "webhook": webhook_latency.summary(),
+        "pool": update_pool.stats(),
+        "updates": get_update_queue().stats(),
+        "save_queue": get_save_queue().stats(),
+        "enrich": enrich_pool.stats(),
+        "enrich_queue": get_enrich_queue().stats(),
+        "dead_letters": get_dead_letters().stats(),
+    })
+
+
+@app.cli.command("dead-letters")
+def dead_letters_command():
+    """列出處理失敗、尚未重跑的訊息"""
+    store = get_dead_letters()
+    for letter in store.open_letters():
+        text = (letter["message"].get("text") or letter["message"].get("caption") or "").replace("\n", " ")
+        failed_at = datetime.fromtimestamp(letter["last_failed_at"]).strftime("%m-%d %H:%M")
+        print(f"{letter['key']:<20} {failed_at} [{letter['stage']}] x{letter['attempts']} "
+              f"{(letter['error'] or '')[:40]} | {text[:40]}")
+    stats = store.stats()
+    print(f"未處理 {stats['open']} 筆，已重跑成功 {stats['resolved']} 筆，失敗階段：{stats['by_stage']}")
+
+
+@app.cli.command("replay-captures")
+@click.option("--workers", default=4, show_default=True, help="同時處理的訊息數")
+@click.option("--per-min", default=CAPTURE_REPLAY_PER_MIN, show_default=True, help="每分鐘最多開始處理的訊息數")
+@click.option("--stage", default=None, help="只重跑此階段失敗的訊息")
+@click.option("--limit", default=None, type=int, help="最多重跑幾筆")
+@click.option("--quiet", is_flag=True, help="成功時不發送 Telegram 回覆")
+def replay_captures_command(workers, per_min, stage, limit, quiet):
+    """以相同流程並行重跑處理失敗的訊息"""
+    summary = replay_dead_letters(lambda message: replay_message(message, notify=not quiet),
+                                  workers=workers, per_min=per_min, stage=stage, limit=limit)
+    print(f"重跑 {summary['total']} 筆：成功 {summary['recovered']}，仍失敗 {summary['failed']}"
+          f"（{summary['seconds']}s，{summary['per_sec']} 筆/秒，限流等待 {summary['throttle']['total_wait']}s）")
+    for failed_stage, count in sorted(summary["failed_by_stage"].items()):
+        print(f"  [{failed_stage}] {count}")
 
 
 @app.route("/set_webhook", methods=["GET"])
@@ -155,16 +497,57 @@ def set_webhook():
         webhook_url = f"{host}/webhook"
 
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
-    r = requests.post(url, json={"url": webhook_url})
+    r = get_session().post(url, json={"url": webhook_url})
     return jsonify({"webhook_url": webhook_url, "result": r.json()})
 
 
 @app.route("/delete_webhook", methods=["GET"])
 def delete_webhook():
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/deleteWebhook"
-    return jsonify(requests.post(url).json())
+    return jsonify(get_session().post(url).json())
+
+
+_background_pid = None
+_background_lock = threading.Lock()
+
+
+def start_background():
+    """
+    啟動背景工作：sweep_updates 與 write-behind 存檔佇列（每個程序一次）
+
+    重啟前未處理的 update 與未送出的存檔在此時繼續。由第一個請求或 __main__ 啟動，
+    flask CLI 指令（dead-letters、replay-captures）不會啟動，不會與 web worker 搶佇列中的工作。
+    """
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+    threading.Thread(target=sweep_updates, name="update-sweeper", daemon=True).start()
+    if CAPTURE_WRITE_BEHIND:
+        get_save_queue().start()
+
+
+@app.before_request
+def ensure_background():
+    start_background()
+
+
+@atexit.register
+def drain_workers():
+    """程序結束前（gunicorn 收到 SIGTERM）處理完已領取的訊息，並等待存檔送出（其餘 update 留在佇列）"""
+    if _background_pid != os.getpid():
+        return
+    deadline = time.monotonic() + WEBHOOK_DRAIN_TIMEOUT
+    update_pool.drain(WEBHOOK_DRAIN_TIMEOUT)
+    if CAPTURE_WRITE_BEHIND and not get_save_queue().drain(max(0.0, deadline - time.monotonic())):
+        print("存檔佇列尚未清空，下次啟動時繼續")
+    enrich_pool.drain(max(0.0, deadline - time.monotonic()))
 
 
 if __name__ == "__main__":
+    start_background()
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
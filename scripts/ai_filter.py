@@ -1,15 +1,88 @@
 """
 AI 篩選模組 - 使用 Claude 進行文章篩選與摘要
 """
+import os
 import json
+import threading
 from typing import List, Dict, Optional
 import anthropic
-from config import ANTHROPIC_API_KEY, USER_INTERESTS, DOMAINS
+from config import ANTHROPIC_API_KEY, ANTHROPIC_BASE_URL, CLAUDE_MODEL, USER_INTERESTS, DOMAINS
+from llm_cache import get_llm_cache, make_key, template_digest
+from chunked_rank import ai_slot, estimate_tokens, score_in_chunks, tournament
 
 
-def get_client():
-    """取得 Anthropic 客戶端"""
-    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+_client: Optional[anthropic.Anthropic] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> anthropic.Anthropic:
+    """
+    取得本程序共用的 Anthropic 客戶端
+
+    客戶端內含 keep-alive 連線池，連續呼叫不必重新建立連線與 TLS context；
+    fork 之後（pid 改變）會重建，避免多個程序共用同一條 socket。
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, base_url=ANTHROPIC_BASE_URL)
+                _client_pid = pid
+    return _client
+
+
+def cached_system(text: str) -> List[Dict]:
+    """
+    把固定不變的指示 / 用戶偏好包成帶 prompt cache 標記的 system 區塊
+
+    同一段 system 在快取有效期間（約 5 分鐘）內重複送出時，
+    Claude 只需讀取快取，降低首字延遲與輸入成本。
+    """
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def log_usage(label: str, message) -> Dict:
+    """
+    記錄單次呼叫的 token 用量與 prompt cache 命中情況
+
+    Args:
+        label: 呼叫名稱（顯示用）
+        message: messages.create 的回傳值
+
+    Returns:
+        用量字典（input, cache_read, cache_write, output）
+    """
+    usage = getattr(message, "usage", None)
+    stats = {
+        "input": getattr(usage, "input_tokens", 0) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        "cache_write": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        "output": getattr(usage, "output_tokens", 0) or 0,
+    }
+    status = "命中" if stats["cache_read"] else ("寫入" if stats["cache_write"] else "未使用")
+    print(f"  [{label}] prompt cache {status}：讀取 {stats['cache_read']} / 寫入 {stats['cache_write']} tokens，"
+          f"未快取輸入 {stats['input']}，輸出 {stats['output']}")
+    return stats
+
+
+def keyword_domains(title: str, summary: str, source: str) -> List[str]:
+    """
+    列出關鍵字命中的所有領域
+
+    Args:
+        title: 文章標題
+        summary: 文章摘要
+        source: 來源名稱
+
+    Returns:
+        領域名稱列表（依 DOMAINS 順序，沒有命中時為空）
+    """
+    text = f"{title} {summary} {source}".lower()
+
+    return [domain for domain, keywords in DOMAINS.items()
+            if any(keyword.lower() in text for keyword in keywords)]
 
 
 def classify_domain(title: str, summary: str, source: str) -> str:
@@ -24,53 +97,97 @@ def classify_domain(title: str, summary: str, source: str) -> str:
     Returns:
         領域名稱
     """
-    text = f"{title} {summary} {source}".lower()
+    matches = keyword_domains(title, summary, source)
+    return matches[0] if matches else "其他"
 
-    for domain, keywords in DOMAINS.items():
-        for keyword in keywords:
-            if keyword.lower() in text:
-                return domain
 
-    return "其他"
+# 批次領域分類 prompt 的版本：修改 prompt 時遞增，讓舊的快取失效
+CLASSIFY_TEMPLATE_VERSION = "classify-v1"
 
+VALID_DOMAINS = list(DOMAINS) + ["其他"]
 
-def filter_and_summarize_batch(articles: List[Dict], max_articles: int = 10) -> List[Dict]:
+
+def classify_domains_batch(articles: List[Dict], client=None) -> Dict[int, str]:
     """
-    批量篩選與摘要文章
+    一次 Claude 呼叫判斷多篇文章的領域（關鍵字無法判斷的文章用）
+
+    結果以 (model, prompt 版本, 標題 + 摘要) 快取。
 
     Args:
-        articles: 原始文章列表
-        max_articles: 最多返回幾篇
+        articles: 文章列表（title, summary, site_name / source）
+        client: Anthropic 客戶端（未指定則使用 get_client()）
 
     Returns:
-        篩選後的文章列表，包含 AI 生成的摘要
+        文章索引 -> 領域名稱（呼叫失敗的文章不在結果中）
     """
     if not articles:
-        return []
+        return {}
 
-    client = get_client()
-
-    # 準備文章資訊
-    articles_text = []
-    for i, article in enumerate(articles[:30]):  # 最多處理 30 篇
-        title = article.get("title", "")
-        summary = article.get("summary", "")[:200] if article.get("summary") else ""
+    template = f"{CLASSIFY_TEMPLATE_VERSION}:{template_digest(*VALID_DOMAINS)}"
+    keys = [make_key(CLAUDE_MODEL, template, a.get("title", ""), a.get("summary", "")) for a in articles]
+    try:
+        cached = get_llm_cache().get_many(keys)
+    except Exception as e:
+        print(f"分類快取讀取失敗: {e}")
+        cached = {}
+
+    domains = {i: cached[key]["domain"] for i, key in enumerate(keys)
+               if key in cached and cached[key].get("domain") in VALID_DOMAINS}
+    misses = [i for i in range(len(articles)) if i not in domains]
+    if not misses:
+        return domains
+
+    lines = []
+    for n, i in enumerate(misses):
+        article = articles[i]
+        summary = (article.get("summary") or "")[:150]
         source = article.get("site_name", "") or article.get("source", "")
+        lines.append(f"{n+1}. [{source}] {article.get('title', '')}\n   摘要: {summary}")
 
-        articles_text.append(f"""
-文章 {i+1}:
-- 標題: {title}
-- 來源: {source}
-- 摘要: {summary}
-""")
+    prompt = f"""判斷以下每篇文章屬於哪個領域：{"、".join(VALID_DOMAINS)}
 
-    prompt = f"""你是一個資訊篩選助手。請根據用戶的關注領域，評估以下文章的重要性。
+{chr(10).join(lines)}
 
-{USER_INTERESTS}
+請用 JSON 格式回覆，以文章編號為 key，例如：{{"1": "AI", "2": "其他"}}
+只回覆 JSON，不要其他說明。"""
+
+    client = client or get_client()
+    try:
+        with ai_slot():
+            message = client.messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=min(100 + 15 * len(misses), 4000),
+                messages=[{"role": "user", "content": prompt}]
+            )
+        log_usage("classify", message)
 
-以下是今日的文章列表：
+        response_text = message.content[0].text
+        if "```" in response_text:
+            response_text = response_text.split("```")[1].removeprefix("json")
+        data = json.loads(response_text.strip())
+    except Exception as e:
+        print(f"AI domain classification error: {e}")
+        return domains
 
-{"".join(articles_text)}
+    fresh = {}
+    for key, domain in (data.items() if isinstance(data, dict) else []):
+        if str(key).isdigit() and 0 < int(key) <= len(misses) and domain in VALID_DOMAINS:
+            fresh[misses[int(key) - 1]] = domain
+
+    try:
+        get_llm_cache().put_many({keys[i]: {"importance": None, "domain": d, "highlight": ""}
+                                  for i, d in fresh.items()})
+    except Exception as e:
+        print(f"分類快取寫入失敗: {e}")
+
+    domains.update(fresh)
+    return domains
+
+
+# 批量篩選的固定指示（作為可快取的 system prefix，文章列表放在 user message）
+BATCH_FILTER_SYSTEM = f"""你是一個資訊篩選助手。請根據用戶的關注領域，評估文章的重要性。
+
+{USER_INTERESTS}
 
 請完成以下任務：
 1. 為每篇文章評分 (1-5)：5=必讀，4=值得看，3=可看可不看，2=可略過，1=不相關
@@ -90,50 +207,165 @@ def filter_and_summarize_batch(articles: List[Dict], max_articles: int = 10) ->
 
 只回覆 JSON，不要其他說明。"""
 
-    try:
+
+# 批次評分 prompt 的版本：修改評分規則 / 回覆格式時遞增，讓舊的快取失效
+BATCH_TEMPLATE_VERSION = "batch-v1"
+
+
+def _batch_cache_keys(articles: List[Dict]) -> List[str]:
+    """計算每篇文章的批次評分快取 key"""
+    template = f"{BATCH_TEMPLATE_VERSION}:{template_digest(BATCH_FILTER_SYSTEM)}"
+    return [make_key(CLAUDE_MODEL, template, a.get("title", ""), a.get("summary", ""))
+            for a in articles]
+
+
+def _format_batch_articles(articles: List[Dict]) -> str:
+    """準備批次評分的文章列表"""
+    articles_text = []
+    for i, article in enumerate(articles):
+        title = article.get("title", "")
+        summary = article.get("summary", "")[:200] if article.get("summary") else ""
+        source = article.get("site_name", "") or article.get("source", "")
+
+        articles_text.append(f"""
+文章 {i+1}:
+- 標題: {title}
+- 來源: {source}
+- 摘要: {summary}
+""")
+    return "".join(articles_text)
+
+
+def _batch_article_tokens(article: Dict) -> int:
+    """文章在批次評分 prompt 中的 token 估計"""
+    return estimate_tokens(_format_batch_articles([article]))
+
+
+def _score_batch(client, articles: List[Dict]) -> Dict[int, Dict]:
+    """
+    單次呼叫為一批文章評分
+
+    Returns:
+        批內索引 -> {"importance", "domain", "highlight"}
+
+    Raises:
+        ValueError: 回覆無法解析
+    """
+    prompt = f"""以下是今日的文章列表：
+
+{_format_batch_articles(articles)}"""
+
+    with ai_slot():
         message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
+            model=CLAUDE_MODEL,
+            max_tokens=min(300 + 60 * len(articles), 8000),
+            system=cached_system(BATCH_FILTER_SYSTEM),
             messages=[{"role": "user", "content": prompt}]
         )
+    log_usage("batch filter", message)
+
+    response_text = message.content[0].text
+
+    # 解析 JSON
+    # 找到 JSON 部分
+    if "```json" in response_text:
+        json_str = response_text.split("```json")[1].split("```")[0]
+    elif "```" in response_text:
+        json_str = response_text.split("```")[1].split("```")[0]
+    else:
+        json_str = response_text
+
+    data = json.loads(json_str.strip())
+    results = data.get("results", [])
+
+    verdicts = {}
+    for result in results:
+        idx = result.get("index", 0) - 1
+        if idx < 0 or idx >= len(articles):
+            continue
+        verdicts[idx] = {
+            "importance": result.get("importance", 1),
+            "domain": result.get("domain", "其他"),
+            "highlight": result.get("summary") or ""
+        }
+    if not verdicts:
+        raise ValueError("沒有有效的評分")
+    return verdicts
+
+
+def filter_and_summarize_batch(articles: List[Dict], max_articles: int = 10,
+                               client=None) -> List[Dict]:
+    """
+    批量篩選與摘要文章
 
-        response_text = message.content[0].text
+    所有文章都會評分：依 token 預算分批並行送出，超過 max_articles 篇達標時以決賽決定排名。
+    評分結果會快取，已評分過的文章不再送進 prompt。
 
-        # 解析 JSON
-        # 找到 JSON 部分
-        if "```json" in response_text:
-            json_str = response_text.split("```json")[1].split("```")[0]
-        elif "```" in response_text:
-            json_str = response_text.split("```")[1].split("```")[0]
-        else:
-            json_str = response_text
-
-        data = json.loads(json_str.strip())
-        results = data.get("results", [])
-
-        # 合併結果
-        filtered = []
-        for result in results:
-            idx = result.get("index", 0) - 1
-            if idx < 0 or idx >= len(articles):
-                continue
-
-            importance = result.get("importance", 1)
-            if importance >= 4:
-                article = articles[idx].copy()
-                article["importance"] = importance
-                article["domain"] = result.get("domain", "其他")
-                article["ai_summary"] = result.get("summary", "")
-                filtered.append(article)
-
-        # 按重要性排序，取前 N 篇
-        filtered.sort(key=lambda x: x.get("importance", 0), reverse=True)
-        return filtered[:max_articles]
+    Args:
+        articles: 原始文章列表
+        max_articles: 最多返回幾篇
+        client: Anthropic 客戶端（未指定則使用 get_client()）
+
+    Returns:
+        篩選後的文章列表，包含 AI 生成的摘要
+    """
+    if not articles:
+        return []
 
+    keys = _batch_cache_keys(articles)
+    try:
+        cached = get_llm_cache().get_many(keys)
     except Exception as e:
-        print(f"AI filter error: {e}")
-        # 降級處理：使用簡單規則篩選
-        return simple_filter(articles, max_articles)
+        print(f"評分快取讀取失敗: {e}")
+        cached = {}
+    verdicts = {i: cached[key] for i, key in enumerate(keys) if key in cached}
+    misses = [i for i in range(len(articles)) if i not in verdicts]
+    print(f"評分快取命中 {len(verdicts)} 篇，需評分 {len(misses)} 篇")
+
+    mixed = False
+    if misses:
+        client = client or get_client()
+
+        # 只送出未命中快取的文章
+        fresh, calls = score_in_chunks(
+            [articles[i] for i in misses], _batch_article_tokens,
+            lambda chunk: _score_batch(client, chunk), label="batch filter"
+        )
+        if not fresh and not verdicts:
+            print("AI filter error: 所有批次評分失敗")
+            # 降級處理：使用簡單規則篩選
+            return simple_filter(articles, max_articles)
+
+        mixed = calls + (1 if verdicts else 0) > 1
+        fresh = {misses[i]: v for i, v in fresh.items()}
+        try:
+            get_llm_cache().put_many({keys[i]: v for i, v in fresh.items()})
+        except Exception as e:
+            print(f"評分快取寫入失敗: {e}")
+        verdicts.update(fresh)
+
+    for verdict in verdicts.values():
+        verdict["importance"] = verdict.get("importance") or 1
+
+    # 按重要性排序，取前 N 篇（分數來自多次呼叫時重新比較入圍文章）
+    if mixed:
+        order = tournament(articles, verdicts, max_articles, 4, _batch_article_tokens,
+                           lambda pool: _score_batch(client, pool), label="batch filter")
+    else:
+        order = sorted((i for i, v in verdicts.items() if v["importance"] >= 4),
+                       key=lambda i: (-verdicts[i]["importance"], i))
+
+    # 合併結果
+    filtered = []
+    for idx in order[:max_articles]:
+        verdict = verdicts[idx]
+        article = articles[idx].copy()
+        article["importance"] = verdict["importance"]
+        article["domain"] = verdict.get("domain") or "其他"
+        article["ai_summary"] = verdict.get("highlight", "")
+        filtered.append(article)
+
+    return filtered
 
 
 def simple_filter(articles: List[Dict], max_articles: int = 10) -> List[Dict]:
@@ -181,13 +413,38 @@ def simple_filter(articles: List[Dict], max_articles: int = 10) -> List[Dict]:
 # Quick Capture 功能 - AI 輔助
 # ============================================================
 
-def generate_title(content: str, max_length: int = 30) -> str:
+def provisional_title(content: str, max_length: int = 30) -> str:
+    """
+    不呼叫 AI 的暫時標題（第一行內容，先存檔後再由 generate_title 取代）
+
+    Args:
+        content: 內容文字
+        max_length: 標題最大長度
+
+    Returns:
+        暫時標題
+    """
+    first_line = next((line.strip() for line in (content or "").splitlines() if line.strip()), "")
+    if not first_line:
+        return "TG 筆記"
+    if len(first_line) > max_length:
+        return first_line[:max_length - 1] + "..."
+    return first_line
+
+
+def _fallback_title(content: str) -> str:
+    """AI 無法生成標題時使用內容開頭"""
+    return content[:20].replace("\n", " ") + "..."
+
+
+def generate_title(content: str, max_length: int = 30, client=None) -> str:
     """
     使用 AI 生成標題
 
     Args:
         content: 內容文字
         max_length: 標題最大長度
+        client: Anthropic 客戶端（未指定則使用 get_client()）
 
     Returns:
         生成的標題
@@ -195,7 +452,7 @@ def generate_title(content: str, max_length: int = 30) -> str:
     if not content or len(content.strip()) < 10:
         return "TG 筆記"
 
-    client = get_client()
+    client = client or get_client()
 
     prompt = f"""根據以下內容生成一個簡潔的中文標題（{max_length}字以內）：
 
@@ -210,7 +467,7 @@ def generate_title(content: str, max_length: int = 30) -> str:
 
     try:
         message = client.messages.create(
-            model="claude-sonnet-4-20250514",
+            model=CLAUDE_MODEL,
             max_tokens=100,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -227,15 +484,16 @@ def generate_title(content: str, max_length: int = 30) -> str:
     except Exception as e:
         print(f"AI title generation error: {e}")
         # 降級：使用內容開頭
-        return content[:20].replace("\n", " ") + "..."
+        return _fallback_title(content)
 
 
-def detect_domain(content: str) -> str:
+def detect_domain(content: str, client=None) -> str:
     """
     使用 AI 判斷內容領域
 
     Args:
         content: 內容文字
+        client: Anthropic 客戶端（未指定則使用 get_client()）
 
     Returns:
         領域名稱
@@ -244,14 +502,12 @@ def detect_domain(content: str) -> str:
         return "其他"
 
     # 先用簡單規則判斷
-    text = content.lower()
-    for domain, keywords in DOMAINS.items():
-        for keyword in keywords:
-            if keyword.lower() in text:
-                return domain
+    matches = keyword_domains(content, "", "")
+    if matches:
+        return matches[0]
 
     # 如果簡單規則無法判斷，使用 AI
-    client = get_client()
+    client = client or get_client()
 
     prompt = f"""判斷以下內容屬於哪個領域，只回覆領域名稱：
 - 醫學
@@ -269,7 +525,7 @@ def detect_domain(content: str) -> str:
 
     try:
         message = client.messages.create(
-            model="claude-sonnet-4-20250514",
+            model=CLAUDE_MODEL,
             max_tokens=20,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -288,19 +544,82 @@ def detect_domain(content: str) -> str:
         return "其他"
 
 
-def process_capture_content(content: str, is_forward: bool = False) -> Dict:
+def title_and_domain(content: str, max_length: int = 30, client=None) -> Dict[str, str]:
+    """
+    一次 AI 呼叫同時生成標題與判斷領域（取代 generate_title + detect_domain 的兩次呼叫）
+
+    關鍵字規則命中時以關鍵字的領域為準；內容太短時不生成標題，只判斷領域。
+
+    Args:
+        content: 內容文字
+        max_length: 標題最大長度
+        client: Anthropic 客戶端（未指定則使用 get_client()）
+
+    Returns:
+        {"title", "domain"}
+    """
+    if not content or len(content.strip()) < 10:
+        return {"title": "TG 筆記", "domain": detect_domain(content, client=client)}
+
+    matches = keyword_domains(content, "", "")
+    client = client or get_client()
+
+    prompt = f"""根據以下內容生成一個簡潔的中文標題（{max_length}字以內），並判斷內容屬於哪個領域：{"、".join(VALID_DOMAINS)}
+
+標題規則：
+- 如果是觀點/分析，標題應反映核心論點
+- 如果是隨手記/感想，標題應反映主題
+- 不要使用引號
+
+請用 JSON 格式回覆，例如：{{"title": "標題", "domain": "生活"}}
+只回覆 JSON，不要其他說明。
+
+內容：
+{content[:500]}"""
+
+    try:
+        message = client.messages.create(
+            model=CLAUDE_MODEL,
+            max_tokens=150,
+            messages=[{"role": "user", "content": prompt}]
+        )
+
+        response_text = message.content[0].text
+        if "```" in response_text:
+            response_text = response_text.split("```")[1].removeprefix("json")
+        data = json.loads(response_text.strip())
+        if not isinstance(data, dict):
+            raise ValueError("回覆不是 JSON 物件")
+
+        title = str(data.get("title") or "").strip().strip('"\'')
+        if not title:
+            title = _fallback_title(content)
+        elif len(title) > max_length:
+            title = title[:max_length-1] + "..."
+        domain = data.get("domain") if data.get("domain") in VALID_DOMAINS else "其他"
+
+    except Exception as e:
+        print(f"AI title/domain error: {e}")
+        # 降級：使用內容開頭
+        title, domain = _fallback_title(content), "其他"
+
+    return {"title": title, "domain": matches[0] if matches else domain}
+
+
+def process_capture_content(content: str, is_forward: bool = False, client=None) -> Dict:
     """
-    處理 Quick Capture 的內容（生成標題 + 判斷領域）
+    處理 Quick Capture 的內容（生成標題 + 判斷領域，一次 AI 呼叫）
 
     Args:
         content: 內容文字
         is_forward: 是否為轉發內容
+        client: Anthropic 客戶端（未指定則使用 get_client()）
 
     Returns:
         包含 title 和 domain 的字典
     """
-    title = generate_title(content)
-    domain = detect_domain(content)
+    result = title_and_domain(content, client=client)
+    title, domain = result["title"], result["domain"]
 
     # 領域對應的 Tag
     domain_tags = {
@@ -0,0 +1,187 @@
+"""
+Quick Capture 筆記 AI 延遲比較
+
+在本機啟動一個模擬 Anthropic Messages API 的替代伺服器（固定模擬模型延遲），
+用同一批筆記比較兩種處理方式：
+
+- two-call：舊流程，generate_title + detect_domain 兩次呼叫，每次都建立新的 Anthropic 客戶端
+- combined：process_capture_content，一次呼叫同時返回標題與領域，使用共用的客戶端
+
+輸出每則筆記的延遲百分位數、每則的 API 呼叫數與連線數，以及扣除模擬模型時間後的額外開銷。
+不會連到真正的 Claude API。
+
+使用方式：
+    python capture_latency.py
+    python capture_latency.py --notes 50 --model-latency 0.5
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+from worker_pool import LatencyWindow
+
+# 不含 DOMAINS 關鍵字的筆記：舊流程每則都需要兩次 AI 呼叫
+SAMPLE_NOTES = [
+    "今天看了一百公尺這部電影，我覺得挺有趣的，很青春",
+    "下午在咖啡店遇到以前的同學，聊了很多畢業後各自的轉變",
+    "讀完一本關於城市規劃的書，作者認為步行距離決定了社區的樣貌",
+    "週末爬山時發現山頂的步道被重新整修過，變得好走很多",
+    "晚餐試做了一道新的湯品，下次可以少放一點鹽",
+    "聽了一場關於古典音樂的講座，講者把巴哈的賦格拆解得很清楚",
+    "想記下來：好的簡報應該先講結論，再用三個重點支撐",
+    "整理書架時翻到十年前的日記，字跡和想法都很陌生",
+]
+
+
+class StandInServer:
+    """模擬 /v1/messages 的本機 HTTP 伺服器（統計請求數與連線數）"""
+
+    def __init__(self, model_latency: float):
+        self.model_latency = model_latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="stand-in", daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "connections": self.connections}
+
+    def _reply_text(self, prompt: str) -> str:
+        if "JSON" in prompt:
+            return json.dumps({"title": "一則生活隨筆", "domain": "生活"}, ensure_ascii=False)
+        if "領域：" in prompt:
+            return "生活"
+        return "一則生活隨筆"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                prompt = "".join(
+                    m["content"] if isinstance(m["content"], str)
+                    else "".join(block.get("text", "") for block in m["content"])
+                    for m in body.get("messages", [])
+                )
+                time.sleep(server.model_latency)
+
+                payload = json.dumps({
+                    "id": f"msg_local_{server.requests}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model", ""),
+                    "content": [{"type": "text", "text": server._reply_text(prompt)}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": len(prompt), "output_tokens": 20},
+                }, ensure_ascii=False).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def run_mode(label: str, process: Callable[[str], Dict], notes: List[str], server: StandInServer) -> Dict:
+    """
+    依序處理所有筆記並統計
+
+    Returns:
+        {"label", "latency", "seconds", "calls_per_note", "connections", "overhead_ms"}
+    """
+    latency = LatencyWindow()
+    before = server.counters()
+    started = time.monotonic()
+    for content in notes:
+        t0 = time.monotonic()
+        process(content)
+        latency.add(time.monotonic() - t0)
+    seconds = time.monotonic() - started
+    after = server.counters()
+
+    calls = after["requests"] - before["requests"]
+    per_note = seconds / len(notes)
+    return {
+        "label": label,
+        "latency": latency.summary(),
+        "seconds": round(seconds, 2),
+        "calls_per_note": round(calls / len(notes), 2),
+        "connections": after["connections"] - before["connections"],
+        # 扣除模擬模型時間後，每則筆記花在建立客戶端 / 連線 / 請求往返的時間
+        "overhead_ms": round((per_note - calls / len(notes) * server.model_latency) * 1000, 1),
+    }
+
+
+def print_result(result: Dict):
+    lat = result["latency"]
+    print(f"{result['label']:>9}: {result['seconds']}s，每則 p50 {lat['p50_ms']}ms / p95 {lat['p95_ms']}ms，"
+          f"{result['calls_per_note']} 次呼叫，{result['connections']} 個連線，額外開銷 {result['overhead_ms']}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="比較 Quick Capture 筆記兩次 / 一次 AI 呼叫的延遲")
+    parser.add_argument("--notes", type=int, default=20, help="處理幾則筆記")
+    parser.add_argument("--model-latency", type=float, default=0.3, help="替代伺服器每次回覆前等待的秒數")
+    args = parser.parse_args()
+
+    server = StandInServer(args.model_latency)
+    server.start()
+
+    # 在載入 config 之前指向替代伺服器（get_client 會以此建立共用客戶端）
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    os.environ["ANTHROPIC_API_KEY"] = "stand-in"
+
+    import anthropic
+    from ai_filter import generate_title, detect_domain, process_capture_content
+
+    def two_call(content: str) -> Dict:
+        # 舊流程：每次呼叫都建立新的客戶端
+        title = generate_title(content, client=anthropic.Anthropic(api_key="stand-in", base_url=server.url))
+        domain = detect_domain(content, client=anthropic.Anthropic(api_key="stand-in", base_url=server.url))
+        return {"title": title, "domain": domain}
+
+    notes = [SAMPLE_NOTES[i % len(SAMPLE_NOTES)] for i in range(args.notes)]
+    print(f"替代伺服器 {server.url}，模擬模型延遲 {args.model_latency}s，{len(notes)} 則筆記")
+
+    results = [run_mode("two-call", two_call, notes, server),
+               run_mode("combined", process_capture_content, notes, server)]
+    for result in results:
+        print_result(result)
+
+    old, new = results
+    print(f"每則延遲 {old['latency']['p50_ms']}ms → {new['latency']['p50_ms']}ms"
+          f"（{new['latency']['p50_ms'] / old['latency']['p50_ms']:.0%}），"
+          f"額外開銷 {old['overhead_ms']}ms → {new['overhead_ms']}ms")
+    server.stop()
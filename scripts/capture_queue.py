@@ -0,0 +1,191 @@
+"""
+Telegram update 持久化佇列
+
+webhook 收到的每個 update 先寫入 SQLite 工作佇列（與存檔佇列同一個檔案）再處理：
+- 以 update_id 去重，Telegram 因逾時重送同一個 update 時不會再存一次
+- 處理中途容器重啟時，lease 到期後由任一 gunicorn worker 重新領取（至少處理一次）
+- 重複處理是安全的：URL 由 Reader 以 URL 識別，筆記使用以 chat_id + message_id 決定的 URL
+- 存檔後的 AI 補充（領域 tag、標題）另存於 capture_enrich 佇列，worker 忙碌或重啟時不會遺失
+"""
+import threading
+from typing import Callable, Dict, Optional
+
+from config import WORK_QUEUE_PATH, CAPTURE_QUEUE_ATTEMPTS, CAPTURE_QUEUE_LEASE, CAPTURE_QUEUE_KEEP_DAYS
+from work_queue import WorkQueue
+
+UPDATE_QUEUE = "telegram_updates"
+ENRICH_QUEUE = "capture_enrich"
+
+_queue: Optional[WorkQueue] = None
+_enrich_queue: Optional[WorkQueue] = None
+_queue_lock = threading.Lock()
+# 目前執行緒正在處理的 update（handler 以 reply_id_for_update / remember_reply 讀寫回覆 ID）
+_current = threading.local()
+
+
+def get_update_queue() -> WorkQueue:
+    """取得共用的 update 佇列"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = WorkQueue(WORK_QUEUE_PATH, UPDATE_QUEUE)
+        return _queue
+
+
+def get_enrich_queue() -> WorkQueue:
+    """取得共用的 AI 補充佇列（存檔後補上領域 tag 與標題）"""
+    global _enrich_queue
+    with _queue_lock:
+        if _enrich_queue is None:
+            _enrich_queue = WorkQueue(WORK_QUEUE_PATH, ENRICH_QUEUE)
+        return _enrich_queue
+
+
+def note_id(message: Dict) -> str:
+    """筆記的固定識別碼（重複處理同一則訊息時存成同一份文件）"""
+    return f"{message['chat']['id']}-{message['message_id']}"
+
+
+class CaptureFailed(Exception):
+    """可重試階段（查詢、分類、存檔）的處理失敗：由 process_next 延遲重試"""
+
+    def __init__(self, stage: str, error: str):
+        super().__init__(error)
+        self.stage = stage
+
+
+def reply_id_for_update() -> Optional[int]:
+    """
+    目前處理中的 update 先前已發送的回覆 ID
+
+    重試時 handler 應編輯這則回覆，而不是再發送一則新的。
+
+    Returns:
+        回覆訊息 ID，尚未回覆過（或不在 process_next 中）時為 None
+    """
+    job = getattr(_current, "job", None)
+    if job is None:
+        return None
+    return (job["result"] or {}).get("reply_id")
+
+
+def remember_reply(reply_id: Optional[int]):
+    """把回覆 ID 存進目前處理中的 update（之後的重試與放棄時沿用同一則回覆）"""
+    job = getattr(_current, "job", None)
+    if job is None or not reply_id:
+        return
+    job["result"] = {**(job["result"] or {}), "reply_id": reply_id}
+    get_update_queue().set_result(job["id"], job["result"])
+
+
+def enqueue_update(update: Dict) -> Optional[int]:
+    """
+    保存 update（以 update_id 去重）
+
+    Args:
+        update: Telegram update（需包含 message）
+
+    Returns:
+        工作 ID，update_id 已處理過或已在佇列中時為 None
+    """
+    return get_update_queue().put(
+        {"update_id": update["update_id"], "message": update["message"]},
+        dedupe_key=str(update["update_id"]),
+    )
+
+
+def process_next(handler: Callable[[Dict], None],
+                 on_give_up: Callable[[Dict, str, int, str], None] = None) -> Optional[bool]:
+    """
+    領取並處理一筆 update
+
+    handler 拋出例外時依 CAPTURE_QUEUE_ATTEMPTS 延遲重試，超過次數則標記為 failed。
+    例外帶有 stage 屬性（例如 CaptureFailed）時，放棄時回報該階段，否則為 "handler"。
+
+    Args:
+        handler: 處理 message 的函式（可用 reply_id_for_update / remember_reply 讓回覆只發送一次）
+        on_give_up: 放棄時呼叫 on_give_up(message, error, attempts, stage)
+
+    Returns:
+        是否成功，沒有可領取的工作時為 None
+    """
+    queue = get_update_queue()
+    job = queue.claim(CAPTURE_QUEUE_LEASE)
+    if job is None:
+        return None
+
+    _current.job = job
+    try:
+        handler(job["payload"]["message"])
+    except Exception as e:
+        stage = getattr(e, "stage", None)
+        error = str(e) if stage else f"{type(e).__name__}: {e}"
+        if _fail(queue, job, f"update {job['payload']['update_id']}", error) and on_give_up:
+            on_give_up(job["payload"]["message"], error, job["attempts"], stage or "handler")
+        return False
+    finally:
+        _current.job = None
+
+    queue.complete(job["id"])
+    return True
+
+
+def enqueue_enrich(job: Dict, key: str) -> Optional[int]:
+    """
+    保存存檔後的 AI 補充工作（以筆記識別碼去重）
+
+    Args:
+        job: 補充工作（chat_id、reply_id、result 等，需可序列化為 JSON）
+        key: note_id(message)，同一則訊息重新處理時不重複排入
+
+    Returns:
+        工作 ID，已在佇列中時為 None
+    """
+    return get_enrich_queue().put(job, dedupe_key=key)
+
+
+def process_next_enrich(handler: Callable[[Dict], None],
+                        on_give_up: Callable[[Dict, str], None] = None) -> Optional[bool]:
+    """
+    領取並處理一筆 AI 補充工作（重試方式與 update 相同）
+
+    Args:
+        handler: 處理補充工作的函式，失敗時拋出例外
+        on_give_up: 放棄時呼叫 on_give_up(job, error)
+
+    Returns:
+        是否成功，沒有可領取的工作時為 None
+    """
+    queue = get_enrich_queue()
+    job = queue.claim(CAPTURE_QUEUE_LEASE)
+    if job is None:
+        return None
+
+    try:
+        handler(job["payload"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if _fail(queue, job, f"enrich {job['payload']['result'].get('doc_id')}", error) and on_give_up:
+            on_give_up(job["payload"], error)
+        return False
+
+    queue.complete(job["id"])
+    return True
+
+
+def _fail(queue: WorkQueue, job: Dict, label: str, error: str) -> bool:
+    """依 CAPTURE_QUEUE_ATTEMPTS 延遲重試或放棄，返回是否已放棄"""
+    if job["attempts"] < CAPTURE_QUEUE_ATTEMPTS:
+        delay = min(300, 10 * 2 ** (job["attempts"] - 1))
+        print(f"Error processing {label}: {error}，{delay}s 後重試")
+        queue.fail(job["id"], error, retry_in=delay)
+        return False
+    print(f"Error processing {label}: {error}，放棄")
+    queue.fail(job["id"], error)
+    return True
+
+
+def prune_updates() -> int:
+    """刪除超過去重保留期間的已完成 update 與 AI 補充工作"""
+    keep = CAPTURE_QUEUE_KEEP_DAYS * 86400
+    return get_update_queue().prune(keep) + get_enrich_queue().prune(keep)
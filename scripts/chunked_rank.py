@@ -0,0 +1,162 @@
+"""
+分批評分
+
+候選文章不再截斷為前 20 / 30 篇：先估算每篇文章在 prompt 中的 token 數，
+在每次呼叫的 token 預算內把文章裝箱成多個批次並行評分，
+再把各批次的高分文章放進同一次呼叫重新評分（淘汰賽），選出最終的 max_items 篇。
+
+呼叫次數與成本隨候選數線性成長，不會因為某天新聞特別多而漏看後面的 feed。
+
+各領域的篩選與各自的分批評分會同時進行，實際送出的 Claude 呼叫一律經過 ai_slot()，
+整個程序同一時間最多 AI_CONCURRENCY 個呼叫。
+"""
+import re
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from config import AI_CHUNK_TOKEN_BUDGET, AI_CHUNK_WORKERS, AI_CONCURRENCY
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+_ai_slots = threading.BoundedSemaphore(AI_CONCURRENCY)
+
+
+def set_ai_concurrency(limit: int):
+    """調整全程序的 AI 呼叫併發上限（在開始篩選前呼叫）"""
+    global _ai_slots
+    _ai_slots = threading.BoundedSemaphore(max(1, limit))
+
+
+@contextmanager
+def ai_slot():
+    """佔用一個 AI 呼叫名額（包住每次 messages.create，名額用完時等待）"""
+    slots = _ai_slots
+    with slots:
+        yield
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗估文字的 token 數（不呼叫 API）
+
+    中日文約每字 1 token，其他文字約每 4 個字元 1 token。
+    """
+    text = text or ""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def pack_chunks(costs: Sequence[int], budget: int = AI_CHUNK_TOKEN_BUDGET) -> List[List[int]]:
+    """
+    依序把項目裝進批次，每批的 token 總和不超過預算
+
+    單一項目超過預算時自成一批。
+
+    Args:
+        costs: 每個項目的 token 估計
+        budget: 每批的 token 預算
+
+    Returns:
+        批次列表（每批為項目索引）
+    """
+    chunks = []
+    current, used = [], 0
+    for i, cost in enumerate(costs):
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def score_in_chunks(items: List[Dict], cost_of: Callable[[Dict], int],
+                    score: Callable[[List[Dict]], Dict[int, Dict]],
+                    budget: int = AI_CHUNK_TOKEN_BUDGET, workers: int = AI_CHUNK_WORKERS,
+                    label: str = "") -> Tuple[Dict[int, Dict], int]:
+    """
+    分批並行評分
+
+    Args:
+        items: 待評分的項目
+        cost_of: 計算單一項目 token 數的函式
+        score: 評分函式，傳入一批項目，返回批內索引 -> 評分結果（失敗時 raise）
+        budget: 每批的 token 預算
+        workers: 同時進行的批次數（實際呼叫仍受 ai_slot 的全程序上限限制）
+        label: log 用的標籤
+
+    Returns:
+        (項目索引 -> 評分結果, 成功的批次數)
+    """
+    if not items:
+        return {}, 0
+
+    chunks = pack_chunks([cost_of(item) for item in items], budget)
+    if len(chunks) > 1:
+        print(f"  [{label}] {len(items)} 篇分成 {len(chunks)} 批評分")
+
+    def run(chunk: List[int]) -> Dict[int, Dict]:
+        result = score([items[i] for i in chunk])
+        return {chunk[local]: verdict for local, verdict in result.items()}
+
+    verdicts, succeeded = {}, 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as executor:
+        futures = [executor.submit(run, chunk) for chunk in chunks]
+        for n, future in enumerate(futures):
+            try:
+                verdicts.update(future.result())
+                succeeded += 1
+            except Exception as e:
+                print(f"  [{label}] 第 {n + 1} 批評分失敗: {e}")
+
+    return verdicts, succeeded
+
+
+def tournament(items: List[Dict], verdicts: Dict[int, Dict], max_items: int, min_score: int,
+               cost_of: Callable[[Dict], int], score: Callable[[List[Dict]], Dict[int, Dict]],
+               budget: int = AI_CHUNK_TOKEN_BUDGET, label: str = "") -> List[int]:
+    """
+    決賽：把各批次的高分文章放進同一次呼叫重新評分，決定最終排序
+
+    不同批次（或不同次執行）的分數尺度不一定一致，
+    決賽讓入圍文章在同一個上下文裡比較。決賽失敗時沿用原本的分數排序。
+
+    Args:
+        items: 所有候選項目
+        verdicts: 項目索引 -> {"importance", ...}
+        max_items: 最終選出幾篇
+        min_score: 入圍的最低分
+        cost_of: 計算單一項目 token 數的函式
+        score: 評分函式（同 score_in_chunks）
+        budget: 決賽的 token 預算
+        label: log 用的標籤
+
+    Returns:
+        最終選出的項目索引（依排名）
+    """
+    finalists = sorted((i for i, v in verdicts.items() if v["importance"] >= min_score),
+                       key=lambda i: (-verdicts[i]["importance"], i))
+    if len(finalists) <= max_items:
+        return finalists
+
+    # 依分數順序取決賽名單，直到用完預算
+    pool = [finalists[i] for i in pack_chunks([cost_of(items[i]) for i in finalists], budget)[0]]
+    if len(pool) <= max_items:
+        return finalists[:max_items]
+
+    print(f"  [{label}] 決賽：{len(finalists)} 篇入圍，{len(pool)} 篇重新評分")
+    try:
+        result = score([items[i] for i in pool])
+    except Exception as e:
+        print(f"  [{label}] 決賽失敗，沿用原本排序: {e}")
+        return finalists[:max_items]
+
+    rank = {i: n for n, i in enumerate(pool)}
+    final = {pool[local]: verdict["importance"] for local, verdict in result.items()}
+    ordered = sorted(pool, key=lambda i: (-final.get(i, 0), rank[i]))
+    return ordered[:max_items]
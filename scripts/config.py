@@ -17,11 +17,95 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 # Claude API
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL") or None  # 未設定時使用官方 API（測試時可指向本機替代伺服器）
 
 # Settings
 DAILY_PUSH_TIME = os.getenv("DAILY_PUSH_TIME", "06:00")
 LANGUAGE = os.getenv("LANGUAGE", "zh-TW")
 
+# Reader 寫入（更新 tags 等）同時進行的請求數
+READER_WRITE_WORKERS = int(os.getenv("READER_WRITE_WORKERS", "4"))
+
+# Reader API 限流（每分鐘請求數，依官方公告的限額）與 429 重試次數
+READER_LIST_PER_MIN = int(os.getenv("READER_LIST_PER_MIN", "20"))
+READER_SAVE_PER_MIN = int(os.getenv("READER_SAVE_PER_MIN", "50"))
+READER_UPDATE_PER_MIN = int(os.getenv("READER_UPDATE_PER_MIN", "50"))
+TAG_REGISTRY_TTL = int(os.getenv("TAG_REGISTRY_TTL", "900"))  # tag 登錄表的有效秒數，過期後在背景重新載入
+READER_THROTTLE_RETRIES = int(os.getenv("READER_THROTTLE_RETRIES", "5"))
+
+# 共用 HTTP 連線池（Reader / Telegram / RSS）
+HTTP_TIMEOUT = int(os.getenv("HTTP_TIMEOUT", "30"))  # 未指定 timeout 的請求預設逾時（秒）
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "32"))  # 保留連線池的主機數（RSS 來源多）
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))  # 每個主機保留的 keep-alive 連線數
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))  # 連線失敗 / 5xx 的重試次數
+
+# 本地狀態目錄（快取、索引等，GitHub Actions 以 actions/cache 保存）
+STATE_DIR = os.getenv("STATE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".state"))
+
+# RSS 抓取併發設定
+FEED_FETCH_WORKERS = int(os.getenv("FEED_FETCH_WORKERS", "8"))  # 同時抓取的 feed 數
+FEED_FETCH_PER_HOST = int(os.getenv("FEED_FETCH_PER_HOST", "2"))  # 同一主機最多同時連線數（避免 Reddit 等限流）
+FEED_FETCH_TIMEOUT = int(os.getenv("FEED_FETCH_TIMEOUT", "20"))  # 單一 feed 請求逾時（秒）
+FEED_CACHE_DIR = os.getenv("FEED_CACHE_DIR", os.path.join(STATE_DIR, "feeds"))
+
+# 已處理 entry 索引（每個 領域+feed 保留最近幾筆）
+SEEN_INDEX_PATH = os.getenv("SEEN_INDEX_PATH", os.path.join(STATE_DIR, "seen_entries.json"))
+SEEN_MAX_PER_FEED = int(os.getenv("SEEN_MAX_PER_FEED", "500"))
+
+# Reader 文件本地鏡像（SQLite，增量同步）
+READER_MIRROR_PATH = os.getenv("READER_MIRROR_PATH", os.path.join(STATE_DIR, "reader_mirror.sqlite3"))
+
+# Quick Capture 已存入 URL 索引（正規化 URL -> Reader 文件，重複轉傳時不再呼叫 AI 與 save）
+SAVED_URL_INDEX_PATH = os.getenv("SAVED_URL_INDEX_PATH", os.path.join(STATE_DIR, "saved_urls.sqlite3"))
+CAPTURE_DUPLICATE_TAG_MERGE = os.getenv("CAPTURE_DUPLICATE_TAG_MERGE", "true").lower() == "true"  # 重複轉傳時補上 #TG收集 tag
+
+# 背景工作佇列（SQLite，gunicorn 多個 worker 共用）
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", os.path.join(STATE_DIR, "work_queue.sqlite3"))
+
+# app.py webhook 背景處理：立即回應 Telegram，訊息交給 worker pool
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))  # 每個 gunicorn worker 的處理執行緒數
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))  # 佇列上限，滿了時 update 留在持久化佇列，由 sweep_updates 稍後處理
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "20"))  # 關閉時等待處理完的秒數（需小於 gunicorn graceful_timeout）
+
+# Telegram update 持久化佇列（以 update_id 去重，重啟後繼續處理）
+CAPTURE_QUEUE_ATTEMPTS = int(os.getenv("CAPTURE_QUEUE_ATTEMPTS", "3"))  # 處理拋出例外時最多嘗試次數
+CAPTURE_QUEUE_LEASE = int(os.getenv("CAPTURE_QUEUE_LEASE", "300"))  # 處理時限，逾時視為 worker 已中斷
+CAPTURE_QUEUE_POLL = float(os.getenv("CAPTURE_QUEUE_POLL", "5"))  # 檢查遺留 update 的間隔秒數
+CAPTURE_QUEUE_KEEP_DAYS = int(os.getenv("CAPTURE_QUEUE_KEEP_DAYS", "3"))  # 已完成 update 的保留天數（去重期間）
+CAPTURE_REPLAY_PER_MIN = float(os.getenv("CAPTURE_REPLAY_PER_MIN", "40"))  # 重跑失敗訊息時每分鐘最多處理幾則（Reader save 上限 50/min）
+
+# Quick Capture 先存檔、後分類：不等 AI 判斷領域 / 生成標題，存入後在背景補上 tag 與標題並編輯回覆
+CAPTURE_ENRICH_LATER = os.getenv("CAPTURE_ENRICH_LATER", "true").lower() == "true"
+CAPTURE_ENRICH_WORKERS = int(os.getenv("CAPTURE_ENRICH_WORKERS", "2"))  # 每個程序同時進行的 AI 補充數
+
+# Reader write-behind 存檔：Quick Capture 先回覆，存檔在背景送出，完成後編輯回覆訊息
+CAPTURE_WRITE_BEHIND = os.getenv("CAPTURE_WRITE_BEHIND", "true").lower() == "true"
+READER_SAVE_QUEUE_WORKERS = int(os.getenv("READER_SAVE_QUEUE_WORKERS", "2"))  # 每個程序的背景存檔執行緒數
+READER_SAVE_QUEUE_ATTEMPTS = int(os.getenv("READER_SAVE_QUEUE_ATTEMPTS", "5"))  # 連線錯誤 / 5xx 最多嘗試次數
+READER_SAVE_QUEUE_BACKOFF = float(os.getenv("READER_SAVE_QUEUE_BACKOFF", "5"))  # 第一次重試的等待秒數（之後加倍）
+READER_SAVE_QUEUE_LEASE = int(os.getenv("READER_SAVE_QUEUE_LEASE", "120"))  # 處理時限，逾時視為 worker 已中斷
+
+# 已推播 URL 帳本（跨領域、跨推播去重）
+SENT_LEDGER_PATH = os.getenv("SENT_LEDGER_PATH", os.path.join(STATE_DIR, "sent_ledger.jsonl"))
+SENT_LEDGER_RETENTION_DAYS = int(os.getenv("SENT_LEDGER_RETENTION_DAYS", "30"))
+SENT_LEDGER_COMPACT_RATIO = float(os.getenv("SENT_LEDGER_COMPACT_RATIO", "2.0"))  # 檔案行數超過有效筆數幾倍時壓縮
+
+# 全領域推播時同時進行的 AI 篩選數，也是整個程序同時送出的 Claude 呼叫上限（含分批評分與決賽）
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "3"))
+
+# AI 分批評分：每次呼叫的文章列表 token 預算，以及單一篩選同時排隊的批次數（實際呼叫受 AI_CONCURRENCY 限制）
+AI_CHUNK_TOKEN_BUDGET = int(os.getenv("AI_CHUNK_TOKEN_BUDGET", "3000"))
+AI_CHUNK_WORKERS = int(os.getenv("AI_CHUNK_WORKERS", "4"))
+
+# AI 評分結果快取（SQLite，可由多個程序共用）
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(STATE_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL_DAYS = int(os.getenv("LLM_CACHE_TTL_DAYS", "14"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+# 近似重複文章合併（標題 + 摘要的 Jaccard 相似度門檻，>= 1 表示停用）
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.5"))
+
 # 領域分類
 DOMAINS = {
     "醫學": ["醫學", "ECMO", "VAD", "心臟", "cardiac", "surgery", "NEJM", "Lancet", "LITFL", "EMCrit", "PubMed"],
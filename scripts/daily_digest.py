@@ -14,18 +14,42 @@ from datetime import datetime
 sys.stdout.reconfigure(encoding='utf-8')
 
 from config import validate_config
-from reader_client import get_recent_documents, add_tag_to_document
+from reader_client import get_recent_documents, add_tags_to_documents, print_rate_limit_stats
 from ai_filter import filter_and_summarize_batch, simple_filter
 from telegram_bot import send_message, format_daily_digest
+from sent_ledger import get_sent_ledger
+from http_session import print_connection_stats
 
 
-def run_daily_digest(use_ai: bool = True, dry_run: bool = False):
+def _article_url(article: dict) -> str:
+    """取得文章原始 URL（Reader 的 url 欄位是 Reader 內部連結）"""
+    return article.get("source_url") or article.get("url", "")
+
+
+def _fetch_articles(use_mirror: bool) -> list:
+    """獲取過去 24 小時的 feed 文章（use_mirror 時先增量同步本地鏡像再查詢）"""
+    if use_mirror:
+        from reader_mirror import get_reader_mirror
+        mirror = get_reader_mirror()
+        try:
+            result = mirror.sync(since_hours=24)
+            print(f"  ✓ 鏡像同步 {result['documents']} 篇變更（{result['pages']} 頁，{result['seconds']}s）")
+            return mirror.recent_documents(hours=24, location="feed")
+        except Exception as e:
+            print(f"  ⚠ 鏡像同步失敗: {e}")
+            print("  → 改為直接列出 Reader 文章")
+
+    return get_recent_documents(hours=24, location="feed")
+
+
+def run_daily_digest(use_ai: bool = True, dry_run: bool = False, use_mirror: bool = False):
     """
     執行每日推播
 
     Args:
         use_ai: 是否使用 AI 篩選
         dry_run: 測試模式，不實際發送
+        use_mirror: 從本地 Reader 鏡像讀取文章（先增量同步）
     """
     print("=" * 60)
     print("每日推播系統啟動")
@@ -44,9 +68,17 @@ def run_daily_digest(use_ai: bool = True, dry_run: bool = False):
 
     # 2. 獲取新文章
     print("\n[2/5] 獲取新文章...")
-    articles = get_recent_documents(hours=24, location="feed")
+    try:
+        articles = _fetch_articles(use_mirror)
+    except Exception as e:
+        print(f"  ✗ 獲取文章失敗: {e}")
+        return False
     print(f"  ✓ 找到 {len(articles)} 篇新文章")
 
+    articles, skipped = get_sent_ledger().filter_unsent(articles, _article_url)
+    if skipped:
+        print(f"  排除 {skipped} 篇已推播過的文章")
+
     if not articles:
         print("  沒有新文章，結束執行")
         if not dry_run:
@@ -78,10 +110,11 @@ def run_daily_digest(use_ai: bool = True, dry_run: bool = False):
             "title": article.get("title", ""),
             "summary": article.get("ai_summary") or article.get("summary", "")[:100],
             "domain": article.get("domain", "其他"),
-            "url": article.get("source_url") or article.get("url", ""),
+            "url": _article_url(article),
             "source": article.get("site_name", ""),
             "importance": article.get("importance", 3),
-            "id": article.get("id")
+            "id": article.get("id"),
+            "tags": article.get("tags")
         })
 
     message = format_daily_digest(push_articles, today)
@@ -103,6 +136,7 @@ def run_daily_digest(use_ai: bool = True, dry_run: bool = False):
         success = send_message(message)
         if success:
             print("  ✓ 推播發送成功")
+            get_sent_ledger().record([a["url"] for a in push_articles], "readwise")
 
             # 更新文章 Tag
             print("\n  更新文章標籤...")
@@ -115,15 +149,18 @@ def run_daily_digest(use_ai: bool = True, dry_run: bool = False):
                 "生產力": "@生產力",
                 "其他": "@其他"
             }
+            additions = {}
+            known_tags = {}
             for article in push_articles:
                 doc_id = article.get("id")
                 if doc_id:
-                    add_tag_to_document(doc_id, "#推播")
                     # 加入領域 Tag
                     domain = article.get("domain", "其他")
-                    domain_tag = domain_tags.get(domain, f"@{domain}")
-                    add_tag_to_document(doc_id, domain_tag)
-            print("  ✓ 標籤更新完成")
+                    additions[doc_id] = ["#推播", domain_tags.get(domain, f"@{domain}")]
+                    if article.get("tags") is not None:
+                        known_tags[doc_id] = article["tags"]
+            results = add_tags_to_documents(additions, known_tags)
+            print(f"  ✓ 標籤更新完成 ({sum(results.values())}/{len(results)})")
         else:
             print("  ✗ 推播發送失敗")
             return False
@@ -161,10 +198,10 @@ def test_connection():
     print("\n[3] Claude API...")
     try:
         import anthropic
-        from config import ANTHROPIC_API_KEY
+        from config import ANTHROPIC_API_KEY, CLAUDE_MODEL
         client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
         message = client.messages.create(
-            model="claude-sonnet-4-20250514",
+            model=CLAUDE_MODEL,
             max_tokens=100,
             messages=[{"role": "user", "content": "Say 'API connection successful' in Chinese"}]
         )
@@ -182,10 +219,13 @@ if __name__ == "__main__":
     parser.add_argument("--test", action="store_true", help="測試服務連接")
     parser.add_argument("--dry-run", action="store_true", help="測試模式，不實際發送")
     parser.add_argument("--no-ai", action="store_true", help="不使用 AI 篩選")
+    parser.add_argument("--mirror", action="store_true", help="從本地 Reader 鏡像讀取文章（增量同步）")
 
     args = parser.parse_args()
 
     if args.test:
         test_connection()
     else:
-        run_daily_digest(use_ai=not args.no_ai, dry_run=args.dry_run)
+        run_daily_digest(use_ai=not args.no_ai, dry_run=args.dry_run, use_mirror=args.mirror)
+        print_connection_stats()
+        print_rate_limit_stats()
@@ -0,0 +1,183 @@
+"""
+Quick Capture 失敗紀錄（dead letter）與重跑
+
+處理失敗的訊息（Reader 5xx、AI 錯誤、背景存檔放棄）連同錯誤、失敗階段與嘗試次數寫入 SQLite，
+之後可用 replay 以相同流程並行重跑：
+- 每則訊息以 chat_id-message_id 為 key，重複失敗時累加嘗試次數
+- 重跑時以 token bucket 控制送出速率（Reader 請求另外經過 reader_client 的限流器）
+- 成功的紀錄標記為 resolved，仍失敗的更新錯誤與嘗試次數
+
+使用方式（app.py 的 flask 指令）：
+    flask --app app dead-letters
+    flask --app app replay-captures --workers 4
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import WORK_QUEUE_PATH
+from rate_limit import TokenBucket
+from capture_queue import note_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dead_letters (
+    key TEXT PRIMARY KEY,
+    message TEXT NOT NULL,
+    stage TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'open',
+    first_failed_at REAL NOT NULL,
+    last_failed_at REAL NOT NULL,
+    resolved_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_dead_letters_status ON dead_letters (status, first_failed_at);
+"""
+
+
+class DeadLetterStore:
+    """失敗訊息的 SQLite 紀錄（與工作佇列同一個檔案）"""
+
+    def __init__(self, path: str = WORK_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每個執行緒使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, message: Dict, stage: Optional[str], error: Optional[str], attempts: int = 1):
+        """
+        記錄失敗（同一則訊息再次失敗時累加嘗試次數並重新開啟）
+
+        Args:
+            message: Telegram 訊息
+            stage: 失敗階段（classify, title, save, reply...）
+            error: 錯誤訊息
+            attempts: 這次失敗前嘗試的次數
+        """
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO dead_letters (key, message, stage, error, attempts, first_failed_at, last_failed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET stage = excluded.stage, error = excluded.error, "
+            "attempts = attempts + excluded.attempts, status = 'open', "
+            "last_failed_at = excluded.last_failed_at, resolved_at = NULL",
+            (note_id(message), json.dumps(message, ensure_ascii=False), stage, error, attempts, now, now),
+        )
+        print(f"Dead letter: {note_id(message)} [{stage}] {error}")
+
+    def resolve(self, key: str):
+        """標記已重跑成功"""
+        self._conn().execute(
+            "UPDATE dead_letters SET status = 'resolved', resolved_at = ? WHERE key = ?", (time.time(), key)
+        )
+
+    def open_letters(self, stage: str = None, limit: int = None) -> List[Dict]:
+        """依失敗時間列出尚未處理的紀錄"""
+        sql = "SELECT * FROM dead_letters WHERE status = 'open'"
+        params: list = []
+        if stage:
+            sql += " AND stage = ?"
+            params.append(stage)
+        sql += " ORDER BY first_failed_at"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        letters = []
+        for row in self._conn().execute(sql, params):
+            letter = dict(row)
+            letter["message"] = json.loads(letter["message"])
+            letters.append(letter)
+        return letters
+
+    def stats(self) -> Dict:
+        """各狀態筆數與未處理紀錄的失敗階段分布"""
+        conn = self._conn()
+        counts = {"open": 0, "resolved": 0}
+        counts.update({row[0]: row[1] for row in conn.execute(
+            "SELECT status, COUNT(*) FROM dead_letters GROUP BY status")})
+        counts["by_stage"] = {row[0] or "unknown": row[1] for row in conn.execute(
+            "SELECT stage, COUNT(*) FROM dead_letters WHERE status = 'open' GROUP BY stage")}
+        return counts
+
+
+_store: Optional[DeadLetterStore] = None
+_store_lock = threading.Lock()
+
+
+def get_dead_letters() -> DeadLetterStore:
+    """取得共用的 dead letter 紀錄"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = DeadLetterStore()
+        return _store
+
+
+def replay(handler: Callable[[Dict], Tuple[bool, Optional[str], Optional[str]]],
+           workers: int, per_min: float, stage: str = None, limit: int = None) -> Dict:
+    """
+    並行重跑未處理的失敗紀錄
+
+    Args:
+        handler: 處理一則訊息，返回 (是否成功, 失敗階段, 錯誤訊息)
+        workers: 同時處理的訊息數
+        per_min: 每分鐘最多開始處理的訊息數
+        stage: 只重跑此階段失敗的紀錄
+        limit: 最多重跑幾筆
+
+    Returns:
+        {"total", "recovered", "failed", "failed_by_stage", "seconds", "per_sec", "throttle"}
+    """
+    store = get_dead_letters()
+    letters = store.open_letters(stage=stage, limit=limit)
+    bucket = TokenBucket("replay", per_min, burst=workers)
+    summary = {"total": len(letters), "recovered": 0, "failed": 0, "failed_by_stage": {}}
+    lock = threading.Lock()
+
+    def run(letter: Dict):
+        bucket.acquire()
+        try:
+            ok, failed_stage, error = handler(letter["message"])
+        except Exception as e:
+            ok, failed_stage, error = False, "replay", f"{type(e).__name__}: {e}"
+
+        if ok:
+            store.resolve(letter["key"])
+        else:
+            store.record(letter["message"], failed_stage, error)
+        with lock:
+            if ok:
+                summary["recovered"] += 1
+            else:
+                summary["failed"] += 1
+                key = failed_stage or "unknown"
+                summary["failed_by_stage"][key] = summary["failed_by_stage"].get(key, 0) + 1
+            done = summary["recovered"] + summary["failed"]
+        if done % 50 == 0:
+            print(f"  已重跑 {done}/{len(letters)}")
+
+    started = time.monotonic()
+    if letters:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(letters)))) as executor:
+            list(executor.map(run, letters))
+    summary["seconds"] = round(time.monotonic() - started, 1)
+    summary["per_sec"] = round(len(letters) / summary["seconds"], 1) if summary["seconds"] else 0.0
+    summary["throttle"] = bucket.stats()
+    return summary
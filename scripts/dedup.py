@@ -0,0 +1,180 @@
+"""
+近似重複文章偵測
+
+同一則新聞常同時出現在 Reuters、BBC、r/worldnews，
+在送進 AI 篩選前以 MinHash + LSH 找出標題/摘要近似的文章並合併成一篇，
+保留所有來源，讓 prompt 能放進更多不同的故事。
+"""
+import re
+import random
+import hashlib
+from typing import List, Dict, Set, Tuple
+
+from config import DEDUP_THRESHOLD
+
+NUM_PERM = 64
+BAND_ROWS = 2  # 32 個 band，每個 2 列：Jaccard 0.5 的配對幾乎必定成為候選
+MIN_OVERLAP = 4  # 至少要有幾個共同 shingle 才算重複（避免短標題誤判，例如 "Claude 4" vs "Claude 4.1"）
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_HTML_TAG = re.compile(r"<[^>]+>")
+_URL = re.compile(r"https?://\S+")
+_LATIN_WORD = re.compile(r"[a-z0-9][a-z0-9'+.-]*")
+_CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+
+# 不具區辨力的字（含 Reddit feed 摘要的固定字樣）
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was",
+    "with", "by", "at", "as", "from", "it", "its", "this", "that", "be", "has", "have",
+    "says", "said", "after", "over", "new", "how", "why", "what",
+    "submitted", "link", "comments", "via",
+}
+
+
+def tokenize(text: str) -> Set[str]:
+    """
+    把文字轉為 shingle 集合：英文取單字，中日文取相鄰兩字
+
+    Args:
+        text: 標題或摘要（可含 HTML）
+
+    Returns:
+        shingle 集合
+    """
+    text = _URL.sub(" ", _HTML_TAG.sub(" ", text or "")).lower()
+
+    tokens = {w.strip(".'-") for w in _LATIN_WORD.findall(text)}
+    tokens = {w for w in tokens if (len(w) > 1 or w.isdigit()) and w not in STOPWORDS}
+
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+
+    return tokens
+
+
+def article_shingles(article: Dict) -> Set[str]:
+    """文章的 shingle：標題 + 摘要"""
+    return tokenize(article.get("title", "")) | tokenize(article.get("summary", ""))
+
+
+def minhash(shingles: Set[str]) -> Tuple[int, ...]:
+    """計算 MinHash 簽章"""
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashed) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    """兩個集合的 Jaccard 相似度"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def is_near_duplicate(full_a: Set[str], full_b: Set[str], title_a: Set[str], title_b: Set[str],
+                      threshold: float) -> bool:
+    """
+    判斷兩篇文章是否近似重複：標題 + 摘要相似，或標題本身高度相似
+    （Reddit 等來源的摘要是固定字樣，只能靠標題判斷）
+    """
+    for a, b in ((full_a, full_b), (title_a, title_b)):
+        if len(a & b) >= MIN_OVERLAP and jaccard(a, b) >= threshold:
+            return True
+    return False
+
+
+def cluster_near_duplicates(articles: List[Dict], threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """
+    找出近似重複的文章群組
+
+    Args:
+        articles: 文章列表
+        threshold: Jaccard 相似度門檻
+
+    Returns:
+        群組列表（每組為文章索引，組內與組間皆依原順序排列）
+    """
+    titles = [tokenize(a.get("title", "")) for a in articles]
+    shingles = [article_shingles(a) for a in articles]
+
+    # LSH：標題或全文簽章在同一 band 相同的文章才成為候選配對
+    buckets = {}
+    for kind, sets in (("title", titles), ("full", shingles)):
+        for i, s in enumerate(sets):
+            if not s:
+                continue
+            signature = minhash(s)
+            for band in range(0, NUM_PERM, BAND_ROWS):
+                buckets.setdefault((kind, band, signature[band:band + BAND_ROWS]), []).append(i)
+
+    parent = list(range(len(articles)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked = set()
+    for members in buckets.values():
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                pair = (members[x], members[y])
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                a, b = pair
+                if is_near_duplicate(shingles[a], shingles[b], titles[a], titles[b], threshold):
+                    # 以較早的文章為根，讓代表文章維持 feed 順序
+                    ra, rb = find(a), find(b)
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+
+    clusters = {}
+    for i in range(len(articles)):
+        clusters.setdefault(find(i), []).append(i)
+    return [clusters[root] for root in sorted(clusters)]
+
+
+def collapse_near_duplicates(articles: List[Dict], threshold: float = DEDUP_THRESHOLD) -> List[Dict]:
+    """
+    合併近似重複的文章，每組保留最早出現的一篇
+
+    代表文章會加上：
+    - sources: 組內所有來源（依出現順序、不重複）
+    - duplicates: 被合併的其他文章（供標記已處理 / 已推播）
+
+    Args:
+        articles: 文章列表（依 feed 設定順序）
+        threshold: Jaccard 相似度門檻，>= 1 表示不合併
+
+    Returns:
+        合併後的文章列表
+    """
+    if threshold >= 1 or len(articles) < 2:
+        return articles
+
+    collapsed = []
+    for cluster in cluster_near_duplicates(articles, threshold):
+        representative = articles[cluster[0]]
+        if len(cluster) == 1:
+            collapsed.append(representative)
+            continue
+
+        members = [articles[i] for i in cluster]
+        sources = []
+        for member in members:
+            for source in member.get("sources") or [member.get("source", "")]:
+                if source and source not in sources:
+                    sources.append(source)
+
+        merged = representative.copy()
+        merged["sources"] = sources
+        merged["duplicates"] = members[1:]
+        collapsed.append(merged)
+
+    return collapsed
@@ -0,0 +1,188 @@
+"""
+領域 Tag 回補
+
+只有經過每日推播或 Quick Capture 的文章才會被加上 @AI、@醫學 等領域 tag。
+這個工作逐頁走訪 Reader 文件庫，為還沒有領域 tag 的文件分類並補上 tag：
+
+1. 先用 classify_domain 的關鍵字規則（只命中一個領域時直接採用）
+2. 沒有命中或命中多個領域的文件，整頁合併成一次 Claude 呼叫判斷
+3. 每篇文件的新 tag 合併成一次 PATCH，並行送出（受 Reader update 限流）
+
+每頁的 PATCH 完成後記錄 cursor checkpoint，中斷後重新執行會從下一頁繼續。
+
+使用方式：
+    python domain_backfill.py --dry-run            # 只列出會加上的 tag
+    python domain_backfill.py --location archive   # 實際寫入
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+from config import STATE_DIR, DOMAINS
+from reader_client import (
+    CursorCheckpoint,
+    iter_document_pages,
+    tag_names,
+    add_tags_to_documents,
+    TAG_REGISTRY,
+    print_rate_limit_stats,
+)
+from ai_filter import keyword_domains, classify_domains_batch
+
+CHECKPOINT_PATH = os.path.join(STATE_DIR, "domain_backfill.checkpoint.json")
+
+# 已有任一領域 tag（不分大小寫）的文件視為已分類
+DOMAIN_TAGS = {f"@{domain}".lower() for domain in list(DOMAINS) + ["其他"]}
+
+# 要分類的文件類別（note / highlight 依附在父文件上）
+BACKFILL_CATEGORIES = ("article", "rss", "email", "pdf", "epub", "tweet", "video")
+
+
+def _needs_domain(doc: Dict) -> bool:
+    if doc.get("parent_id") or doc.get("category") not in BACKFILL_CATEGORIES:
+        return False
+    return not DOMAIN_TAGS.intersection(name.lower() for name in tag_names(doc.get("tags")))
+
+
+def classify_page(docs: List[Dict], use_ai: bool = True) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    為一頁文件分類領域
+
+    Args:
+        docs: 需要分類的文件
+        use_ai: 關鍵字無法判斷時是否呼叫 Claude
+
+    Returns:
+        (文件 ID -> 領域, {"keyword": 關鍵字判斷篇數, "ai": AI 判斷篇數})
+    """
+    domains = {}
+    ambiguous = []
+    for doc in docs:
+        matches = keyword_domains(doc.get("title") or "", doc.get("summary") or "", doc.get("site_name") or "")
+        if len(matches) == 1:
+            domains[doc["id"]] = matches[0]
+        else:
+            ambiguous.append(doc)
+
+    counts = {"keyword": len(domains), "ai": 0}
+    if ambiguous and use_ai:
+        results = classify_domains_batch(ambiguous)
+        for i, domain in results.items():
+            domains[ambiguous[i]["id"]] = domain
+        counts["ai"] = len(results)
+    return domains, counts
+
+
+def run_backfill(params: Dict = None, dry_run: bool = False, use_ai: bool = True,
+                 tag_other: bool = False, resume: bool = True) -> Dict:
+    """
+    回補領域 tag
+
+    Args:
+        params: /list/ 的查詢參數（location, category, updatedAfter）
+        dry_run: 只列出差異，不寫入（也不記錄 checkpoint）
+        use_ai: 關鍵字無法判斷時是否呼叫 Claude
+        tag_other: 是否也加上 @其他
+        resume: 有 checkpoint 時是否續傳
+
+    Returns:
+        統計字典
+    """
+    params = dict(params or {})
+    # 先載入 tag 登錄表：加 tag 時以它換成 Reader 既有的名稱，之後的查詢都不連網
+    TAG_REGISTRY.warm(block=True)
+    checkpoint = CursorCheckpoint(CHECKPOINT_PATH)
+    cursor, stats = None, {}
+    if resume and not dry_run:
+        params, cursor, stats = checkpoint.load_state(params)
+        if cursor:
+            print(f"從 checkpoint 繼續（已掃描 {stats.get('scanned', 0)} 篇）")
+    elif not dry_run:
+        checkpoint.clear()
+
+    for key in ("scanned", "skipped", "keyword", "ai", "tagged", "failed"):
+        stats.setdefault(key, 0)
+    # 各領域的標記數與其他統計一起寫入 checkpoint，續傳後的摘要涵蓋整次回補
+    by_domain: Dict[str, int] = stats.setdefault("by_domain", {})
+
+    started = time.monotonic()
+    scanned_now = 0
+    for docs, next_cursor in iter_document_pages(params, cursor=cursor):
+        pending = [doc for doc in docs if _needs_domain(doc)]
+        stats["scanned"] += len(docs)
+        stats["skipped"] += len(docs) - len(pending)
+        scanned_now += len(docs)
+
+        domains, counts = classify_page(pending, use_ai=use_ai)
+        stats["keyword"] += counts["keyword"]
+        stats["ai"] += counts["ai"]
+
+        additions, known_tags = {}, {}
+        for doc in pending:
+            domain = domains.get(doc["id"])
+            if not domain or (domain == "其他" and not tag_other):
+                continue
+            additions[doc["id"]] = [f"@{domain}"]
+            known_tags[doc["id"]] = doc.get("tags") or {}
+            by_domain[domain] = by_domain.get(domain, 0) + 1
+            if dry_run:
+                new = "" if TAG_REGISTRY.has(f"@{domain}") else "（新 tag）"
+                print(f"  + @{domain:<4} {(doc.get('title') or '')[:60]}{new}")
+
+        if not dry_run:
+            results = add_tags_to_documents(additions, known_tags)
+            stats["tagged"] += sum(results.values())
+            stats["failed"] += len(results) - sum(results.values())
+            if next_cursor:
+                checkpoint.save(params, next_cursor, stats)
+            else:
+                checkpoint.clear()
+        else:
+            stats["tagged"] += len(additions)
+
+        elapsed = time.monotonic() - started
+        print(f"  已掃描 {stats['scanned']} 篇（{scanned_now / elapsed:.1f} 篇/秒），"
+              f"{'將' if dry_run else '已'}標記 {stats['tagged']} 篇")
+
+    stats["seconds"] = round(time.monotonic() - started, 1)
+    stats["docs_per_sec"] = round(scanned_now / stats["seconds"], 1) if stats["seconds"] else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="為 Reader 文件回補領域 tag")
+    parser.add_argument("--dry-run", action="store_true", help="只列出會加上的 tag，不寫入")
+    parser.add_argument("--no-ai", action="store_true", help="只用關鍵字規則，不呼叫 Claude")
+    parser.add_argument("--tag-other", action="store_true", help="無法歸類的文件也加上 @其他")
+    parser.add_argument("--location", default=None, help="只處理此位置 (new, later, archive, feed...)")
+    parser.add_argument("--category", default=None, help="只處理此類別 (article, rss, email...)")
+    parser.add_argument("--updated-after", default=None, help="只處理此時間之後有變更的文件 (ISO 8601)")
+    parser.add_argument("--restart", action="store_true", help="忽略 checkpoint，從頭開始")
+    args = parser.parse_args()
+
+    query = {}
+    if args.location:
+        query["location"] = args.location
+    if args.category:
+        query["category"] = args.category
+    if args.updated_after:
+        query["updatedAfter"] = args.updated_after
+
+    try:
+        result = run_backfill(query, dry_run=args.dry_run, use_ai=not args.no_ai,
+                              tag_other=args.tag_other, resume=not args.restart)
+    except KeyboardInterrupt:
+        print("\n中斷，下次執行會從 checkpoint 繼續")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print(f"{'預覽' if args.dry_run else '完成'}：掃描 {result['scanned']} 篇，"
+          f"已有領域 tag / 不適用 {result['skipped']} 篇")
+    print(f"  關鍵字判斷 {result['keyword']} 篇，AI 判斷 {result['ai']} 篇")
+    print(f"  {'將' if args.dry_run else '已'}標記 {result['tagged']} 篇，失敗 {result['failed']} 篇")
+    for domain, count in sorted(result["by_domain"].items(), key=lambda item: -item[1]):
+        print(f"    @{domain}: {count}")
+    print(f"  耗時 {result['seconds']}s（{result['docs_per_sec']} 篇/秒）")
+    print_rate_limit_stats()
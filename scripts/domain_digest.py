@@ -5,11 +5,14 @@
 支援的領域：醫學, AI, 國際, GitHub, 知識
 """
 import sys
+import time
 import argparse
-import feedparser
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from urllib.parse import urlparse
+from typing import Callable, List, Dict, Optional, Set, Tuple
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 # 設定 stdout 編碼
@@ -19,10 +22,26 @@ from config import (
     TELEGRAM_BOT_TOKEN,
     TELEGRAM_CHAT_ID,
     ANTHROPIC_API_KEY,
+    CLAUDE_MODEL,
+    FEED_FETCH_WORKERS,
+    FEED_FETCH_PER_HOST,
+    AI_CONCURRENCY,
+    AI_CHUNK_TOKEN_BUDGET,
     validate_config
 )
+from feed_cache import fetch_feed_entries, stats as feed_cache_stats
+from seen_index import get_seen_index, entry_key
+from sent_ledger import get_sent_ledger
+from dedup import collapse_near_duplicates
+from ai_filter import cached_system, log_usage
+from llm_cache import get_llm_cache, make_key, template_digest
+from chunked_rank import ai_slot, set_ai_concurrency, estimate_tokens, score_in_chunks, tournament
+from http_session import get_session, print_connection_stats
 
 # 領域配置
+# feed 選項：
+#   max_articles: 最多取幾篇（用於無時間戳記的 feed）
+#   ranked: 排行榜型 feed（非時間排序），遇到已處理的 entry 只跳過、不提前停止
 DOMAIN_CONFIG = {
     "medical": {
         "name": "醫學",
@@ -54,7 +73,7 @@ DOMAIN_CONFIG = {
             {"name": "LlamaIndex Blog", "url": "https://www.llamaindex.ai/blog/rss.xml"},
             {"name": "e2b Blog", "url": "https://e2b.dev/blog/rss.xml"},
             # Reddit（精簡）
-            {"name": "r/ClaudeAI", "url": "https://www.reddit.com/r/ClaudeAI/top/.rss?t=day"},
+            {"name": "r/ClaudeAI", "url": "https://www.reddit.com/r/ClaudeAI/top/.rss?t=day", "ranked": True},
         ],
         "max_items": 10,
         "use_ai_filter": True
@@ -72,8 +91,8 @@ DOMAIN_CONFIG = {
             {"name": "BBC World", "url": "https://feeds.bbci.co.uk/news/world/rss.xml"},
             {"name": "AP News", "url": "https://apnews.com/world-news.rss"},
             # Reddit
-            {"name": "r/geopolitics", "url": "https://www.reddit.com/r/geopolitics/top/.rss?t=day"},
-            {"name": "r/worldnews", "url": "https://www.reddit.com/r/worldnews/top/.rss?t=day"},
+            {"name": "r/geopolitics", "url": "https://www.reddit.com/r/geopolitics/top/.rss?t=day", "ranked": True},
+            {"name": "r/worldnews", "url": "https://www.reddit.com/r/worldnews/top/.rss?t=day", "ranked": True},
         ],
         "max_items": 10,
         "use_ai_filter": True
@@ -82,13 +101,13 @@ DOMAIN_CONFIG = {
         "name": "GitHub/開發",
         "emoji": "💻",
         "feeds": [
-            {"name": "GitHub Trending (Python)", "url": "https://mshibanami.github.io/GitHubTrendingRSS/daily/python.xml"},
-            {"name": "GitHub Trending (All)", "url": "https://mshibanami.github.io/GitHubTrendingRSS/daily/all.xml"},
+            {"name": "GitHub Trending (Python)", "url": "https://mshibanami.github.io/GitHubTrendingRSS/daily/python.xml", "ranked": True},
+            {"name": "GitHub Trending (All)", "url": "https://mshibanami.github.io/GitHubTrendingRSS/daily/all.xml", "ranked": True},
             {"name": "Claude Code Releases", "url": "https://github.com/anthropics/claude-code/releases.atom"},
             # Reddit
-            {"name": "r/programming", "url": "https://www.reddit.com/r/programming/top/.rss?t=day"},
-            {"name": "r/webdev", "url": "https://www.reddit.com/r/webdev/top/.rss?t=day"},
-            {"name": "r/Python", "url": "https://www.reddit.com/r/Python/top/.rss?t=day"},
+            {"name": "r/programming", "url": "https://www.reddit.com/r/programming/top/.rss?t=day", "ranked": True},
+            {"name": "r/webdev", "url": "https://www.reddit.com/r/webdev/top/.rss?t=day", "ranked": True},
+            {"name": "r/Python", "url": "https://www.reddit.com/r/Python/top/.rss?t=day", "ranked": True},
         ],
         "max_items": 10,
         "use_ai_filter": True
@@ -98,7 +117,7 @@ DOMAIN_CONFIG = {
         "emoji": "📚",
         "feeds": [
             # 高頻來源（每日更新，放前面保證有內容）
-            {"name": "Hacker News Best", "url": "https://hnrss.org/best"},
+            {"name": "Hacker News Best", "url": "https://hnrss.org/best", "ranked": True},
             {"name": "電腦玩物", "url": "https://www.playpcesor.com/feeds/posts/default?alt=rss"},
             {"name": "少数派", "url": "https://sspai.com/feed"},
             {"name": "閱讀前哨站", "url": "https://readingoutpost.com/feed/"},
@@ -127,92 +146,245 @@ DOMAIN_CONFIG = {
 }
 
 
+def select_entries(url: str, entries: List[Dict], hours: int = 24, max_articles: int = None,
+                   seen_keys: Set[str] = None, stop_at_seen: bool = True) -> List[Dict]:
+    """
+    從 feed entries 中挑出時間窗口內、尚未處理過的文章
+
+    Args:
+        url: RSS feed URL
+        entries: fetch_feed_entries 返回的 entries
+        hours: 獲取過去幾小時的文章
+        max_articles: 最多返回幾篇文章（用於無時間戳記的 feed）
+        seen_keys: 已處理過的 entry keys，這些 entry 不再返回
+        stop_at_seen: 遇到第一篇已處理的 entry 即停止（適用時間排序的 feed）
+
+    Returns:
+        文章列表（含 feed_url / entry_id，供標記已處理）
+    """
+    articles = []
+    cutoff = datetime.now() - timedelta(hours=hours)
+
+    for entry in entries[:20]:  # 最多處理 20 篇
+        key = entry_key(entry)
+        if seen_keys and key in seen_keys:
+            if stop_at_seen:
+                break  # 之後的 entry 都更舊，已在先前的推播處理過
+            continue
+
+        # 解析發布時間
+        published = None
+        if entry.get("published"):
+            try:
+                published = datetime.fromisoformat(entry["published"])
+            except ValueError:
+                pass
+
+        # 如果無法解析時間，保留文章（假設是新的）
+        # 如果有時間但太舊，則跳過
+        if published and published < cutoff:
+            continue
+
+        articles.append({
+            "title": entry.get("title", ""),
+            "link": entry.get("link", ""),
+            "summary": entry.get("summary", "")[:200] if entry.get("summary") else "",
+            "published": published,
+            "feed_url": url,
+            "entry_id": key
+        })
+
+    # 如果設定了 max_articles，限制返回數量
+    if max_articles:
+        articles = articles[:max_articles]
+
+    return articles
+
+
 @retry(
     stop=stop_after_attempt(2),
     wait=wait_exponential(multiplier=1, min=1, max=5),
     retry=retry_if_exception_type(Exception),
     reraise=False  # RSS 失敗不中斷整個流程
 )
-def fetch_rss_feed(url: str, hours: int = 24, max_articles: int = None) -> List[Dict]:
+def fetch_rss_feed(url: str, hours: int = 24, max_articles: int = None,
+                   seen_keys: Set[str] = None, stop_at_seen: bool = True) -> List[Dict]:
     """
-    從 RSS feed 獲取最近的文章（帶 retry）
+    從 RSS feed 獲取最近的文章（帶 retry，以 ETag/Last-Modified 快取）
 
     Args:
         url: RSS feed URL
         hours: 獲取過去幾小時的文章
         max_articles: 最多返回幾篇文章（用於無時間戳記的 feed）
+        seen_keys: 已處理過的 entry keys，這些 entry 不再返回
+        stop_at_seen: 遇到第一篇已處理的 entry 即停止（適用時間排序的 feed）
 
     Returns:
-        文章列表
+        文章列表（含 feed_url / entry_id，供標記已處理）
     """
     try:
-        feed = feedparser.parse(url)
-        articles = []
-        cutoff = datetime.now() - timedelta(hours=hours)
-
-        for entry in feed.entries[:20]:  # 最多處理 20 篇
-            # 解析發布時間
-            published = None
-            if hasattr(entry, 'published_parsed') and entry.published_parsed:
-                try:
-                    published = datetime(*entry.published_parsed[:6])
-                except (TypeError, ValueError):
-                    pass
-            elif hasattr(entry, 'updated_parsed') and entry.updated_parsed:
-                try:
-                    published = datetime(*entry.updated_parsed[:6])
-                except (TypeError, ValueError):
-                    pass
-
-            # 如果無法解析時間，保留文章（假設是新的）
-            # 如果有時間但太舊，則跳過
-            if published and published < cutoff:
-                continue
+        entries = fetch_feed_entries(url)
+        return select_entries(url, entries, hours, max_articles=max_articles,
+                              seen_keys=seen_keys, stop_at_seen=stop_at_seen)
+    except Exception as e:
+        print(f"  Error fetching {url}: {e}")
+        return []
 
-            articles.append({
-                "title": entry.get("title", ""),
-                "link": entry.get("link", ""),
-                "summary": entry.get("summary", "")[:200] if entry.get("summary") else "",
-                "published": published
-            })
 
-        # 如果設定了 max_articles，限制返回數量
-        if max_articles:
-            articles = articles[:max_articles]
+def _host_of(url: str) -> str:
+    """取得 URL 的主機名稱（用於每主機併發上限）"""
+    return urlparse(url).netloc.lower()
 
+
+def _map_per_host(fn: Callable, items: List, url_of: Callable, workers: int = None,
+                  per_host: int = None) -> List:
+    """
+    以有上限的 worker 數併發執行 fn，同一主機同時最多 per_host 個
+
+    Returns:
+        與 items 順序一致的結果列表
+    """
+    workers = workers or FEED_FETCH_WORKERS
+    per_host = per_host or FEED_FETCH_PER_HOST
+
+    host_slots = {}
+    for item in items:
+        host = _host_of(url_of(item))
+        if host not in host_slots:
+            host_slots[host] = threading.BoundedSemaphore(per_host)
+
+    def run_one(item):
+        with host_slots[_host_of(url_of(item))]:
+            return fn(item)
+
+    if workers <= 1 or len(items) <= 1:
+        return [run_one(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        # map 會依輸入順序返回結果，確保文章順序固定
+        return list(executor.map(run_one, items))
+
+
+def fetch_feeds(feeds: List[Dict], hours: int = 24, workers: int = None,
+                per_host: int = None, seen: Dict[str, Set[str]] = None) -> List[List[Dict]]:
+    """
+    併發抓取多個 feed（有上限的 worker 數 + 每主機上限）
+
+    Args:
+        feeds: feed 設定列表（含 name, url, max_articles, ranked）
+        hours: 獲取過去幾小時的文章
+        workers: 同時抓取的 feed 數（1 = 逐一抓取）
+        per_host: 同一主機最多同時抓取幾個 feed
+        seen: feed URL -> 已處理的 entry keys
+
+    Returns:
+        與 feeds 順序一致的文章列表（每個 feed 一個列表）
+    """
+    def fetch_one(feed: Dict) -> List[Dict]:
+        max_articles = feed.get("max_articles")  # 取得自訂的最大文章數
+        articles = fetch_rss_feed(
+            feed["url"], hours, max_articles=max_articles,
+            seen_keys=(seen or {}).get(feed["url"]),
+            stop_at_seen=not feed.get("ranked")
+        )
+        for article in articles:
+            article["source"] = feed["name"]
         return articles
-    except Exception as e:
-        print(f"  Error fetching {url}: {e}")
-        return []
 
+    return _map_per_host(fetch_one, feeds, lambda feed: feed["url"], workers, per_host)
+
+
+def fetch_unique_feeds(urls: List[str], workers: int = None,
+                       per_host: int = None) -> Dict[str, List[Dict]]:
+    """
+    併發抓取一組不重複的 feed URL（多領域共用同一次抓取）
+
+    Returns:
+        feed URL -> entries（抓取失敗為空列表）
+    """
+    def fetch_one(url: str) -> List[Dict]:
+        try:
+            return fetch_feed_entries(url)
+        except Exception as e:
+            print(f"  Error fetching {url}: {e}")
+            return []
+
+    urls = list(dict.fromkeys(urls))
+    return dict(zip(urls, _map_per_host(fetch_one, urls, lambda url: url, workers, per_host)))
+
+
+def _domain_seen(domain: str, feeds: List[Dict]) -> Dict[str, Set[str]]:
+    """取得領域內每個 feed 已處理過的 entry keys"""
+    index = get_seen_index()
+    return {feed["url"]: index.seen_keys(domain, feed["url"]) for feed in feeds}
 
-def fetch_domain_articles(domain: str, hours: int = 24) -> List[Dict]:
+
+def build_domain_articles(domain: str, entries_by_url: Dict[str, List[Dict]], hours: int = 24,
+                          skip_seen: bool = True) -> List[Dict]:
+    """
+    從已抓取的 feed entries 組出特定領域的文章（用於多領域共用抓取）
+
+    Args:
+        domain: 領域名稱
+        entries_by_url: feed URL -> entries
+        hours: 獲取過去幾小時的文章
+        skip_seen: 跳過先前推播已處理過的 entry
+
+    Returns:
+        文章列表（依 feed 設定順序排列）
+    """
+    feeds = DOMAIN_CONFIG[domain]["feeds"]
+    seen = _domain_seen(domain, feeds) if skip_seen else {}
+
+    all_articles = []
+    for feed in feeds:
+        articles = select_entries(
+            feed["url"], entries_by_url.get(feed["url"], []), hours,
+            max_articles=feed.get("max_articles"),
+            seen_keys=seen.get(feed["url"]),
+            stop_at_seen=not feed.get("ranked")
+        )
+        for article in articles:
+            article["source"] = feed["name"]
+        all_articles.extend(articles)
+
+    return all_articles
+
+
+def fetch_domain_articles(domain: str, hours: int = 24, workers: int = None,
+                          skip_seen: bool = True) -> List[Dict]:
     """
     獲取特定領域的所有文章
 
     Args:
         domain: 領域名稱 (ai, international, github, knowledge)
         hours: 獲取過去幾小時的文章
+        workers: 同時抓取的 feed 數（未指定則使用 FEED_FETCH_WORKERS）
+        skip_seen: 跳過先前推播已處理過的 entry
 
     Returns:
-        文章列表
+        文章列表（依 feed 設定順序排列）
     """
     config = DOMAIN_CONFIG.get(domain)
     if not config:
         print(f"Unknown domain: {domain}")
         return []
 
-    all_articles = []
+    feeds = config["feeds"]
+    seen = _domain_seen(domain, feeds) if skip_seen else None
 
-    for feed in config["feeds"]:
-        print(f"  Fetching {feed['name']}...")
-        max_articles = feed.get("max_articles")  # 取得自訂的最大文章數
-        articles = fetch_rss_feed(feed["url"], hours, max_articles=max_articles)
-        for article in articles:
-            article["source"] = feed["name"]
+    started = time.monotonic()
+    stats_before = dict(feed_cache_stats)
+    results = fetch_feeds(feeds, hours, workers=workers, seen=seen)
+
+    all_articles = []
+    for feed, articles in zip(feeds, results):
+        print(f"  {feed['name']}: {len(articles)} articles")
         all_articles.extend(articles)
-        print(f"    Found {len(articles)} articles")
 
+    print(f"  抓取 {len(feeds)} 個 feed 耗時 {time.monotonic() - started:.1f}s"
+          f"（304 未變更 {feed_cache_stats['not_modified'] - stats_before['not_modified']}，"
+          f"重新下載 {feed_cache_stats['fetched'] - stats_before['fetched']}）")
     return all_articles
 
 
@@ -234,6 +406,22 @@ USER_PROFILE = """
 - 避免：純粹的新聞速報、標題黨、重複內容
 """
 
+# AI 篩選的固定前綴（指示 + 用戶偏好），以 prompt cache 在各領域 / 各次呼叫間共用
+RANK_SYSTEM = f"""你是個人化資訊篩選助手。根據用戶的背景和偏好，從文章中選出最符合他興趣的內容。
+
+{USER_PROFILE}"""
+
+
+# 各領域在 prompt 中的描述
+DOMAIN_CONTEXT = {
+    "medical": "ECMO、VAD、心臟外科、重症醫學相關",
+    "ai": "AI、LLM、Claude、機器學習、深度學習相關",
+    "international": "國際情勢、地緣政治、全球事務相關",
+    "github": "GitHub 開源專案、程式開發、技術工具相關",
+    "knowledge": "知識管理、生產力、學習方法、筆記工具相關",
+    "claude-code": "Claude Code 版本更新、新功能、bug 修復"
+}
+
 
 @retry(
     stop=stop_after_attempt(3),
@@ -241,118 +429,382 @@ USER_PROFILE = """
     retry=retry_if_exception_type((requests.exceptions.RequestException, Exception)),
     reraise=True
 )
-def _call_claude_api(client, prompt: str) -> str:
-    """呼叫 Claude API（帶 retry）"""
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=800,  # 增加 token 數，確保有足夠空間生成摘要
-        messages=[{"role": "user", "content": prompt}]
-    )
+def _call_claude_api(client, prompt: str, max_tokens: int = 800, label: str = "AI filter") -> str:
+    """呼叫 Claude API（帶 retry）：固定的 RANK_SYSTEM 走 prompt cache，prompt 只含本次文章"""
+    with ai_slot():
+        message = client.messages.create(
+            model=CLAUDE_MODEL,
+            max_tokens=max_tokens,  # 增加 token 數，確保有足夠空間生成摘要
+            system=cached_system(RANK_SYSTEM),
+            messages=[{"role": "user", "content": prompt}]
+        )
+    log_usage(label, message)
     return message.content[0].text.strip()
 
 
-def ai_filter_articles(articles: List[Dict], domain: str, max_items: int) -> List[Dict]:
+def _strip_code_fence(response: str) -> str:
+    """移除 markdown 程式碼區塊包裝"""
+    if response.startswith("```"):
+        lines = response.split("\n")
+        # 移除首行 ```json 和尾行 ```
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        response = "\n".join(lines)
+    return response
+
+
+def _format_candidates(articles: List[Dict]) -> str:
+    """準備文章列表（包含摘要以提供更多上下文）"""
+    articles_text = []
+    for i, article in enumerate(articles):
+        summary = article.get('summary', '')[:100] if article.get('summary') else ''
+        sources = " / ".join(article.get("sources") or [article.get("source", "")])
+        articles_text.append(f"{i+1}. [{sources}] {article.get('title')}\n   摘要: {summary}")
+    return "\n".join(articles_text)
+
+
+# 評分 prompt 的版本：修改評分規則 / 回覆格式時遞增，讓舊的快取失效
+RANK_TEMPLATE_VERSION = "rank-v1"
+
+# 評分達此分數才會被選入推播
+MIN_RANK_SCORE = 3
+
+# 評分任務的回覆格式說明（單一領域與合併篩選共用）
+RANK_REPLY_RULES = """評分標準（1-5）：5=必讀，4=值得看，3=可看可不看，2=可略過，1=不相關
+
+每個領域的回覆包含：
+1. scores：每篇文章的評分
+2. highlights：評分 >= 3 的文章的一句話核心論點（這篇文章的主要觀點或內容是什麼，不要說為什麼適合用戶）
+
+**重要**：highlights 中的每個值都必須是有意義的摘要，不可為空字串。"""
+
+
+def _verdict_keys(articles: List[Dict], domain: str) -> List[str]:
+    """計算每篇文章在此領域的評分快取 key"""
+    template = f"{RANK_TEMPLATE_VERSION}:{domain}:" + template_digest(
+        RANK_SYSTEM, RANK_REPLY_RULES, DOMAIN_CONTEXT.get(domain, ""))
+    return [make_key(CLAUDE_MODEL, template, a.get("title", ""), a.get("summary", ""))
+            for a in articles]
+
+
+def _load_verdicts(keys: List[str]) -> Dict[int, Dict]:
+    """從快取讀取評分（快取失敗時視為全部未命中）"""
+    try:
+        cached = get_llm_cache().get_many(keys)
+    except Exception as e:
+        print(f"  評分快取讀取失敗: {e}")
+        return {}
+    return {i: cached[key] for i, key in enumerate(keys) if key in cached}
+
+
+def _store_verdicts(keys: List[str], verdicts: Dict[int, Dict], domain: str):
+    """寫入新的評分到快取"""
+    try:
+        get_llm_cache().put_many({
+            keys[i]: {"importance": v["importance"], "domain": domain, "highlight": v["highlight"]}
+            for i, v in verdicts.items()
+        })
+    except Exception as e:
+        print(f"  評分快取寫入失敗: {e}")
+
+
+def _parse_verdicts(result, count: int) -> Dict[int, Dict]:
+    """
+    解析單一領域的評分回覆
+
+    Args:
+        result: {"scores": {"1": 5, ...}, "highlights": {"1": "...", ...}}
+        count: 送出的文章數
+
+    Returns:
+        文章索引（從 0 開始）-> {"importance", "highlight"}
+
+    Raises:
+        ValueError: 格式不符或沒有任何有效評分
+    """
+    if result is None:
+        raise ValueError("回覆中缺少此領域")
+    if not isinstance(result, dict):
+        raise ValueError("回覆不是 JSON 物件")
+    scores = result.get("scores")
+    highlights = result.get("highlights") or {}
+    if not isinstance(scores, dict) or not isinstance(highlights, dict):
+        raise ValueError("缺少 scores / highlights")
+
+    verdicts = {}
+    for key, score in scores.items():
+        if not str(key).isdigit() or isinstance(score, bool) or not isinstance(score, (int, float)):
+            continue
+        index = int(key) - 1
+        if 0 <= index < count:
+            highlight = highlights.get(str(key))
+            verdicts[index] = {
+                "importance": max(1, min(5, int(score))),
+                "highlight": highlight.strip() if isinstance(highlight, str) else ""
+            }
+
+    if not verdicts:
+        raise ValueError("沒有有效的評分")
+    return verdicts
+
+
+def _article_tokens(article: Dict) -> int:
+    """文章在評分 prompt 中的 token 估計"""
+    return estimate_tokens(_format_candidates([article]))
+
+
+def _reply_tokens(count: int) -> int:
+    """評分回覆的 max_tokens（每篇一個分數 + 一句話摘要）"""
+    return min(300 + 60 * count, 8000)
+
+
+def _score_articles(client, domain: str, articles: List[Dict], max_items: int) -> Dict[int, Dict]:
+    """
+    單次呼叫為一批文章評分
+
+    Returns:
+        批內索引 -> {"importance", "highlight"}
+
+    Raises:
+        ValueError: 回覆無法解析
+    """
+    import json
+
+    prompt = f"""## 本次任務
+領域：{DOMAIN_CONTEXT.get(domain, '')}
+為以下每篇文章評分，之後會選出最符合用戶興趣的 {max_items} 篇推播：
+
+{_format_candidates(articles)}
+
+{RANK_REPLY_RULES}
+
+請用 JSON 格式回覆，格式範例：
+{{"scores": {{"1": 5, "2": 2, "3": 4}}, "highlights": {{"1": "作者認為...", "3": "研究發現..."}}}}
+
+只回覆 JSON，不要其他說明。"""
+
+    response = _strip_code_fence(_call_claude_api(client, prompt, max_tokens=_reply_tokens(len(articles)),
+                                                  label=domain))
+    try:
+        return _parse_verdicts(json.loads(response), len(articles))
+    except ValueError as e:
+        print(f"  [{domain}] JSON 解析失敗: {e}")
+        print(f"  Response: {response[:200]}")
+        raise
+
+
+def _merge_verdicts(articles: List[Dict], verdicts: Dict[int, Dict], order: List[int],
+                    max_items: int) -> List[Dict]:
+    """
+    依排名組出精選文章
+
+    Args:
+        articles: 候選文章
+        verdicts: 文章索引 -> {"importance", "highlight"}（快取 + 本次評分）
+        order: 最終排名（文章索引）
+        max_items: 最多返回幾篇
+
+    Returns:
+        精選文章列表（沒有文章達到門檻時返回前 max_items 篇）
+    """
+    filtered = []
+    for i in order[:max_items]:
+        article = articles[i].copy()
+        # 加入 AI 生成的重點摘要，如果為空則使用 fallback
+        highlight = verdicts[i]["highlight"]
+        if not highlight:
+            # Fallback：使用原文摘要或「待補充」
+            highlight = article.get('summary', '')[:80] or "（AI 摘要生成失敗）"
+            print(f"  使用 fallback highlight: {article.get('title', '')[:30]}")
+        article["highlight"] = highlight
+        article["importance"] = verdicts[i]["importance"]
+        filtered.append(article)
+
+    if not filtered:
+        print(f"  警告：AI 篩選後沒有文章，使用前 {max_items} 篇")
+        return articles[:max_items]
+
+    return filtered
+
+
+def _finalize(domain: str, articles: List[Dict], verdicts: Dict[int, Dict], max_items: int,
+              client, mixed: bool) -> List[Dict]:
+    """
+    決定最終精選：分數來自多次呼叫（多個批次或快取）時進行決賽重新評分
+
+    Args:
+        mixed: 分數是否來自不只一次呼叫
+    """
+    if mixed and client is not None:
+        order = tournament(articles, verdicts, max_items, MIN_RANK_SCORE, _article_tokens,
+                           lambda pool: _score_articles(client, domain, pool, max_items),
+                           label=domain)
+    else:
+        order = sorted((i for i, v in verdicts.items() if v["importance"] >= MIN_RANK_SCORE),
+                       key=lambda i: (-verdicts[i]["importance"], i))
+    return _merge_verdicts(articles, verdicts, order, max_items)
+
+
+def _split_cached(articles: List[Dict], domain: str) -> Tuple[List[str], Dict[int, Dict], List[int]]:
+    """
+    把候選文章分成快取命中與未命中
+
+    Returns:
+        (快取 keys, 已命中的評分, 未命中的文章索引)
+    """
+    keys = _verdict_keys(articles, domain)
+    verdicts = _load_verdicts(keys)
+    misses = [i for i in range(len(articles)) if i not in verdicts]
+    print(f"  [{domain}] 評分快取命中 {len(verdicts)} 篇，需評分 {len(misses)} 篇")
+    return keys, verdicts, misses
+
+
+def ai_filter_articles(articles: List[Dict], domain: str, max_items: int,
+                       client=None, split: Tuple[List[str], Dict[int, Dict], List[int]] = None) -> List[Dict]:
     """
     使用 AI 篩選文章並產生摘要（根據用戶偏好）
     帶 retry 機制，確保摘要不為空
+
+    所有候選文章都會評分：依 token 預算分批並行送出，再以決賽決定最終排名。
+    評分結果會快取，已評分過的文章不再送進 prompt。
+    client 可傳入替代的客戶端（例如記錄請求內容的測試替身）
+    split 為已算好的 _split_cached 結果（ai_rank_domains 轉交時不再重新讀取快取）
     """
     if not articles:
         return []
 
+    keys, verdicts, misses = split or _split_cached(articles, domain)
+    if not misses:
+        return _finalize(domain, articles, verdicts, max_items, None, mixed=False)
+
     import anthropic
-    import json
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    client = client or anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 
-    # 準備文章列表（包含摘要以提供更多上下文）
-    articles_text = []
-    for i, article in enumerate(articles[:20]):
-        summary = article.get('summary', '')[:100] if article.get('summary') else ''
-        articles_text.append(f"{i+1}. [{article.get('source')}] {article.get('title')}\n   摘要: {summary}")
-
-    domain_context = {
-        "medical": "ECMO、VAD、心臟外科、重症醫學相關",
-        "ai": "AI、LLM、Claude、機器學習、深度學習相關",
-        "international": "國際情勢、地緣政治、全球事務相關",
-        "github": "GitHub 開源專案、程式開發、技術工具相關",
-        "knowledge": "知識管理、生產力、學習方法、筆記工具相關",
-        "claude-code": "Claude Code 版本更新、新功能、bug 修復"
-    }
+    fresh, calls = score_in_chunks(
+        [articles[i] for i in misses], _article_tokens,
+        lambda chunk: _score_articles(client, domain, chunk, max_items),
+        label=domain
+    )
+    if not fresh and not verdicts:
+        # Fallback：返回前 N 篇，不附加 AI 摘要
+        print(f"  AI filter 失敗，使用前 {max_items} 篇")
+        return articles[:max_items]
 
-    prompt = f"""你是個人化資訊篩選助手。根據用戶的背景和偏好，從文章中選出最符合他興趣的內容。
+    mixed = calls + (1 if verdicts else 0) > 1
+    fresh = {misses[i]: v for i, v in fresh.items()}
+    _store_verdicts(keys, fresh, domain)
+    verdicts.update(fresh)
+    return _finalize(domain, articles, verdicts, max_items, client, mixed=mixed)
 
-{USER_PROFILE}
 
-## 本次任務
-領域：{domain_context.get(domain, '')}
-從以下文章中選出最符合用戶興趣的 {max_items} 篇：
+def ai_rank_domains(candidates: Dict[str, List[Dict]], client=None) -> Dict[str, List[Dict]]:
+    """
+    一次 Claude 呼叫同時篩選多個領域（USER_PROFILE 只送一次）
+
+    已快取評分的文章不送出；合併 prompt 依序放入各領域未快取的文章直到用完 token 預算，
+    放不下的領域、合併回覆中驗證失敗的領域（或整個回覆無法解析時的所有領域）
+    改以 ai_filter_articles 逐領域分批篩選。
 
-{chr(10).join(articles_text)}
+    Args:
+        candidates: 領域 -> 候選文章
 
-請用 JSON 格式回覆，包含：
-1. 選中的文章編號
-2. 每篇文章的一句話核心論點（這篇文章的主要觀點或內容是什麼，不要說為什麼適合用戶）
+    Returns:
+        領域 -> 精選文章
+    """
+    candidates = {d: a for d, a in candidates.items() if a}
+    if not candidates:
+        return {}
 
-**重要**：highlights 中的每個值都必須是有意義的摘要，不可為空字串。
+    import anthropic
+    import json
 
-格式範例：
-{{"selected": [1, 3, 5], "highlights": {{"1": "作者認為...", "3": "研究發現...", "5": "新功能可以..."}}}}
+    client = client or anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+
+    results = {}
+    splits = {}
+    pending = {}
+    separate = []
+    used = 0
+    for domain, articles in candidates.items():
+        split = splits[domain] = _split_cached(articles, domain)
+        keys, verdicts, misses = split
+        if not misses:
+            results[domain] = _finalize(domain, articles, verdicts, DOMAIN_CONFIG[domain]["max_items"],
+                                        None, mixed=False)
+            continue
+        cost = sum(_article_tokens(articles[i]) for i in misses)
+        if pending and used + cost > AI_CHUNK_TOKEN_BUDGET:
+            separate.append(domain)
+            continue
+        pending[domain] = split
+        used += cost
+
+    if len(pending) == 1:
+        separate[:0] = list(pending)
+        pending = {}
+
+    if pending:
+        sections = []
+        for domain, (_, _, misses) in pending.items():
+            sections.append(
+                f"### {domain}\n"
+                f"領域：{DOMAIN_CONTEXT.get(domain, '')}\n"
+                f"之後會選出 {DOMAIN_CONFIG[domain]['max_items']} 篇：\n\n"
+                f"{_format_candidates([candidates[domain][i] for i in misses])}"
+            )
+
+        example = {d: {"scores": {"1": 5, "2": 2, "3": 4}, "highlights": {"1": "作者認為...", "3": "研究發現..."}}
+                   for d in list(pending)[:2]}
+
+        prompt = f"""## 本次任務
+以下有 {len(pending)} 個領域的候選文章（編號在各領域內獨立），請分別為每個領域的每篇文章評分。
+
+{chr(10).join(sections)}
+
+{RANK_REPLY_RULES}
+
+請用 JSON 格式回覆，以領域代號（{", ".join(pending)}）為 key，每個領域都必須出現。格式範例：
+{json.dumps(example, ensure_ascii=False)}
 
 只回覆 JSON，不要其他說明。"""
 
-    try:
-        response = _call_claude_api(client, prompt)
-
-        # 移除 markdown 程式碼區塊包裝
-        if response.startswith("```"):
-            lines = response.split("\n")
-            # 移除首行 ```json 和尾行 ```
-            if lines[0].startswith("```"):
-                lines = lines[1:]
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            response = "\n".join(lines)
-
-        # 嘗試解析 JSON
+        data = {}
+        total = sum(len(misses) for _, _, misses in pending.values())
         try:
+            response = _strip_code_fence(_call_claude_api(client, prompt, max_tokens=_reply_tokens(total),
+                                                          label="combined"))
             data = json.loads(response)
-            selected_indices = [int(x) - 1 for x in data.get("selected", [])]
-            highlights = data.get("highlights", {})
-
-            # 檢查是否有空的 highlight
-            empty_highlights = [k for k, v in highlights.items() if not v or not v.strip()]
-            if empty_highlights:
-                print(f"  警告：偵測到空的 highlight: {empty_highlights}")
-
-            filtered = []
-            for i in selected_indices:
-                if 0 <= i < len(articles):
-                    article = articles[i].copy()
-                    # 加入 AI 生成的重點摘要，如果為空則使用 fallback
-                    highlight = highlights.get(str(i + 1), "").strip()
-                    if not highlight:
-                        # Fallback：使用原文摘要或「待補充」
-                        highlight = article.get('summary', '')[:80] or "（AI 摘要生成失敗）"
-                        print(f"  使用 fallback highlight: {article.get('title', '')[:30]}")
-                    article["highlight"] = highlight
-                    filtered.append(article)
-
-            if not filtered:
-                print(f"  警告：AI 篩選後沒有文章，使用前 {max_items} 篇")
-                return articles[:max_items]
-
-            return filtered[:max_items]
-
-        except json.JSONDecodeError as e:
-            print(f"  JSON 解析失敗: {e}")
-            print(f"  Response: {response[:200]}")
-            # Fallback：返回前 N 篇
-            return articles[:max_items]
+            if not isinstance(data, dict):
+                raise ValueError("回覆不是 JSON 物件")
+        except Exception as e:
+            print(f"  合併篩選失敗，改為逐領域篩選: {e}")
+            data = {}
+
+        for domain, (keys, verdicts, misses) in pending.items():
+            try:
+                fresh = _parse_verdicts(data.get(domain), len(misses))
+            except ValueError as e:
+                if data:
+                    print(f"  [{domain}] 合併篩選結果驗證失敗（{e}），改為單獨篩選")
+                separate.append(domain)
+                continue
 
-    except Exception as e:
-        print(f"  AI filter error (已重試 3 次): {e}")
-        # Fallback：返回前 N 篇，不附加 AI 摘要
-        return articles[:max_items]
+            mixed = bool(verdicts)
+            fresh = {misses[i]: v for i, v in fresh.items()}
+            _store_verdicts(keys, fresh, domain)
+            verdicts.update(fresh)
+            results[domain] = _finalize(domain, candidates[domain], verdicts,
+                                        DOMAIN_CONFIG[domain]["max_items"], client, mixed=mixed)
+
+    for domain in separate:
+        results[domain] = ai_filter_articles(candidates[domain], domain,
+                                             DOMAIN_CONFIG[domain]["max_items"], client=client,
+                                             split=splits[domain])
+
+    return {d: results[d] for d in candidates}
 
 
 def format_domain_message(articles: List[Dict], domain: str, date_str: str) -> str:
@@ -373,7 +825,7 @@ def format_domain_message(articles: List[Dict], domain: str, date_str: str) -> s
         if len(title) > 60:
             title = title[:57] + "..."
 
-        source = article.get("source", "")
+        source = ", ".join(article.get("sources") or [article.get("source", "")])
         link = article.get("link", "")
         highlight = article.get("highlight", "")
 
@@ -406,7 +858,7 @@ def send_telegram_message(text: str) -> bool:
         "disable_web_page_preview": True
     }
 
-    response = requests.post(url, json=payload, timeout=10)
+    response = get_session().post(url, json=payload, timeout=10)
     if response.status_code != 200:
         print(f"  Telegram API 錯誤: {response.status_code}")
         print(f"  Response: {response.text}")
@@ -415,7 +867,116 @@ def send_telegram_message(text: str) -> bool:
     return True
 
 
-def run_domain_digest(domain: str, hours: int = None, dry_run: bool = False):
+def _with_duplicates(articles: List[Dict]) -> List[Dict]:
+    """展開被合併的近似重複文章（標記已處理 / 已推播時一併記錄）"""
+    expanded = []
+    for article in articles:
+        expanded.append(article)
+        expanded.extend(article.get("duplicates", []))
+    return expanded
+
+
+def prepare_candidates(domain: str, articles: List[Dict], ignore_seen: bool = False) -> List[Dict]:
+    """
+    AI 篩選前的前處理：排除已推播過的文章、合併近似重複
+
+    Args:
+        domain: 領域名稱
+        articles: 抓取到的文章
+        ignore_seen: 不排除已推播過的文章
+
+    Returns:
+        候選文章列表
+    """
+    if not ignore_seen:
+        articles, skipped = get_sent_ledger().filter_unsent(articles, lambda a: a.get("link", ""))
+        if skipped:
+            print(f"  [{domain}] 排除 {skipped} 篇已推播過的文章")
+
+    # 合併不同來源報導的同一則新聞
+    total = len(articles)
+    articles = collapse_near_duplicates(articles)
+    if len(articles) < total:
+        print(f"  [{domain}] 合併 {total - len(articles)} 篇近似重複文章，剩 {len(articles)} 篇")
+
+    return articles
+
+
+def rank_candidates(domain: str, articles: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    篩選並產生摘要
+
+    Returns:
+        (精選文章, 已送進篩選的文章)
+    """
+    config = DOMAIN_CONFIG[domain]
+    if config.get("use_ai_filter"):
+        filtered = ai_filter_articles(articles, domain, config["max_items"])
+        return filtered, articles
+
+    filtered = articles[:config["max_items"]]
+    return filtered, filtered
+
+
+def deliver_digest(domain: str, filtered: List[Dict], handled: List[Dict],
+                   dry_run: bool = False) -> bool:
+    """
+    推播精選文章，成功後記錄已推播 / 已處理
+
+    Args:
+        domain: 領域名稱
+        filtered: 精選文章
+        handled: 已送進篩選的文章（標記為已處理）
+        dry_run: 測試模式
+
+    Returns:
+        是否成功
+    """
+    if not dry_run:
+        # 同一輪中較早推播的領域可能已推送同一篇文章
+        filtered, skipped = get_sent_ledger().filter_unsent(filtered, lambda a: a.get("link", ""))
+        if skipped:
+            print(f"  排除 {skipped} 篇本輪其他領域已推播的文章")
+
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    message = format_domain_message(filtered, domain, date_str)
+
+    if dry_run:
+        print("  (測試模式) 訊息內容：")
+        print("-" * 40)
+        # 移除 HTML tags 顯示
+        import re
+        clean_msg = re.sub(r'<[^>]+>', '', message)
+        print(clean_msg)
+        print("-" * 40)
+        return True
+
+    success = send_telegram_message(message)
+    print(f"  {'✓ 推播成功' if success else '✗ 推播失敗'}")
+
+    if success:
+        # 記錄已推播的 URL，其他領域 / 之後的推播不再重複推送
+        get_sent_ledger().record([a.get("link", "") for a in _with_duplicates(filtered)], domain)
+
+        # 記錄已處理的 entry，之後的推播不再送進 AI
+        index = get_seen_index()
+        marked = index.mark_articles(domain, _with_duplicates(handled))
+        index.save()
+        print(f"  已標記 {marked} 篇為已處理")
+
+    return success
+
+
+def _send_empty_notice(domain: str, hours: int, dry_run: bool = False):
+    """沒有新文章時的通知"""
+    config = DOMAIN_CONFIG[domain]
+    print("  沒有新文章")
+    if not dry_run:
+        send_telegram_message(f"{config['emoji']} <b>{config['name']}</b>\n\n過去 {hours} 小時沒有新內容。")
+
+
+def run_domain_digest(domain: str, hours: int = None, dry_run: bool = False,
+                      workers: int = None, ignore_seen: bool = False):
     """
     執行特定領域的推播
 
@@ -423,6 +984,8 @@ def run_domain_digest(domain: str, hours: int = None, dry_run: bool = False):
         domain: 領域名稱
         hours: 獲取過去幾小時的文章（若未指定則使用領域預設值）
         dry_run: 測試模式
+        workers: 同時抓取的 feed 數（未指定則使用 FEED_FETCH_WORKERS）
+        ignore_seen: 不跳過先前已處理過 / 已推播過的文章
     """
     config = DOMAIN_CONFIG.get(domain)
     if not config:
@@ -442,40 +1005,26 @@ def run_domain_digest(domain: str, hours: int = None, dry_run: bool = False):
 
     # 1. 獲取文章
     print(f"\n[1/3] 獲取文章...")
-    articles = fetch_domain_articles(domain, hours)
+    articles = fetch_domain_articles(domain, hours, workers=workers,
+                                     skip_seen=not ignore_seen)
     print(f"  共找到 {len(articles)} 篇文章")
 
+    articles = prepare_candidates(domain, articles, ignore_seen=ignore_seen)
+
     if not articles:
-        print("  沒有新文章")
-        if not dry_run:
-            send_telegram_message(f"{config['emoji']} <b>{config['name']}</b>\n\n過去 {hours} 小時沒有新內容。")
+        _send_empty_notice(domain, hours, dry_run)
         return True
 
     # 2. 篩選並產生摘要
     print(f"\n[2/3] 篩選文章...")
     if config.get("use_ai_filter"):
         print("  使用 AI 篩選...")
-        filtered = ai_filter_articles(articles, domain, config["max_items"])
-    else:
-        filtered = articles[:config["max_items"]]
+    filtered, handled = rank_candidates(domain, articles)
     print(f"  精選 {len(filtered)} 篇")
 
     # 3. 推播
     print(f"\n[3/3] 推播...")
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    message = format_domain_message(filtered, domain, date_str)
-
-    if dry_run:
-        print("  (測試模式) 訊息內容：")
-        print("-" * 40)
-        # 移除 HTML tags 顯示
-        import re
-        clean_msg = re.sub(r'<[^>]+>', '', message)
-        print(clean_msg)
-        print("-" * 40)
-    else:
-        success = send_telegram_message(message)
-        print(f"  {'✓ 推播成功' if success else '✗ 推播失敗'}")
+    deliver_digest(domain, filtered, handled, dry_run=dry_run)
 
     print("\n" + "=" * 60)
     print("完成")
@@ -484,11 +1033,86 @@ def run_domain_digest(domain: str, hours: int = None, dry_run: bool = False):
     return True
 
 
-def run_all_domains(dry_run: bool = False):
-    """執行所有領域的推播"""
-    for domain in DOMAIN_CONFIG.keys():
-        run_domain_digest(domain, dry_run=dry_run)
-        print("\n")
+def run_all_domains(dry_run: bool = False, workers: int = None, ignore_seen: bool = False,
+                    ai_concurrency: int = None, combined_rank: bool = False):
+    """
+    執行所有領域的推播（單次流程）
+
+    1. 所有領域的 feed URL 去重後一次併發抓取
+    2. 各領域的 AI 篩選平行執行（全域併發上限 AI_CONCURRENCY），
+       或以 combined_rank 在一次 Claude 呼叫中篩選所有領域
+    3. 依 DOMAIN_CONFIG 順序逐一推播
+
+    Args:
+        dry_run: 測試模式
+        workers: 同時抓取的 feed 數
+        ignore_seen: 不跳過先前已處理過 / 已推播過的文章
+        ai_concurrency: 同時進行的 AI 篩選數（也是全程序同時送出的 Claude 呼叫上限）
+        combined_rank: 所有領域合併為一次 AI 篩選
+    """
+    domains = list(DOMAIN_CONFIG.keys())
+    windows = {d: DOMAIN_CONFIG[d].get("default_hours", 24) for d in domains}
+
+    print("=" * 60)
+    print(f"全領域推播：{len(domains)} 個領域")
+    print(f"時間：{datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    print(f"模式：{'測試' if dry_run else '正式'}")
+    print("=" * 60)
+
+    # 1. 一次抓取所有 feed
+    urls = [feed["url"] for d in domains for feed in DOMAIN_CONFIG[d]["feeds"]]
+    unique_urls = list(dict.fromkeys(urls))
+    print(f"\n[1/3] 獲取文章（{len(unique_urls)} 個 feed，原本 {len(urls)} 次抓取）...")
+    started = time.monotonic()
+    entries_by_url = fetch_unique_feeds(unique_urls, workers=workers)
+    print(f"  抓取耗時 {time.monotonic() - started:.1f}s")
+
+    candidates = {}
+    for domain in domains:
+        articles = build_domain_articles(domain, entries_by_url, windows[domain],
+                                         skip_seen=not ignore_seen)
+        candidates[domain] = prepare_candidates(domain, articles, ignore_seen=ignore_seen)
+        print(f"  {DOMAIN_CONFIG[domain]['emoji']} {domain}: {len(candidates[domain])} 篇候選")
+
+    # 2. 平行篩選
+    print(f"\n[2/3] 篩選文章...")
+    started = time.monotonic()
+    if ai_concurrency:
+        set_ai_concurrency(ai_concurrency)
+    ranked = {}
+    to_rank = [d for d in domains if candidates[d]]
+    if combined_rank:
+        print("  合併篩選所有領域...")
+        selections = ai_rank_domains({d: candidates[d] for d in to_rank
+                                      if DOMAIN_CONFIG[d].get("use_ai_filter")})
+        for domain in to_rank:
+            if domain in selections:
+                ranked[domain] = (selections[domain], candidates[domain])
+            else:
+                ranked[domain] = rank_candidates(domain, candidates[domain])
+            print(f"  {domain}: 精選 {len(ranked[domain][0])} 篇")
+    else:
+        with ThreadPoolExecutor(max_workers=ai_concurrency or AI_CONCURRENCY) as executor:
+            futures = {d: executor.submit(rank_candidates, d, candidates[d]) for d in to_rank}
+            for domain, future in futures.items():
+                ranked[domain] = future.result()
+                print(f"  {domain}: 精選 {len(ranked[domain][0])} 篇")
+    print(f"  篩選耗時 {time.monotonic() - started:.1f}s")
+
+    # 3. 依固定順序推播
+    print(f"\n[3/3] 推播...")
+    for domain in domains:
+        config = DOMAIN_CONFIG[domain]
+        print(f"\n  {config['emoji']} {config['name']}")
+        if domain not in ranked:
+            _send_empty_notice(domain, windows[domain], dry_run)
+            continue
+        filtered, handled = ranked[domain]
+        deliver_digest(domain, filtered, handled, dry_run=dry_run)
+
+    print("\n" + "=" * 60)
+    print("完成")
+    print("=" * 60)
 
 
 if __name__ == "__main__":
@@ -501,6 +1125,14 @@ if __name__ == "__main__":
                        help="測試模式，不實際發送")
     parser.add_argument("--list", action="store_true",
                        help="列出所有可用領域")
+    parser.add_argument("--workers", type=int, default=None,
+                       help=f"同時抓取的 feed 數 (預設 {FEED_FETCH_WORKERS}，1 = 逐一抓取)")
+    parser.add_argument("--ignore-seen", action="store_true",
+                       help="不跳過先前推播已處理過 / 已推播過的文章")
+    parser.add_argument("--ai-concurrency", type=int, default=None,
+                       help=f"all 模式下同時進行的 AI 篩選數 (預設 {AI_CONCURRENCY})")
+    parser.add_argument("--combined-rank", action="store_true",
+                       help="all 模式下以一次 AI 呼叫篩選所有領域（失敗時逐領域重試）")
 
     args = parser.parse_args()
 
@@ -518,6 +1150,11 @@ if __name__ == "__main__":
         sys.exit(1)
 
     if args.domain == "all":
-        run_all_domains(dry_run=args.dry_run)
+        run_all_domains(dry_run=args.dry_run, workers=args.workers,
+                        ignore_seen=args.ignore_seen, ai_concurrency=args.ai_concurrency,
+                        combined_rank=args.combined_rank)
     else:
-        run_domain_digest(args.domain, hours=args.hours, dry_run=args.dry_run)
+        run_domain_digest(args.domain, hours=args.hours, dry_run=args.dry_run,
+                          workers=args.workers, ignore_seen=args.ignore_seen)
+
+    print_connection_stats()
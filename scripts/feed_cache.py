@@ -0,0 +1,166 @@
+"""
+RSS Feed 快取模組
+
+以 HTTP 條件式請求（ETag / Last-Modified）抓取 feed：
+- 每個 feed URL 在 FEED_CACHE_DIR 存一個 JSON 檔（validator + 已解析的 entries）
+- 伺服器回 304 時直接使用快取的 entries，不下載也不重新解析 XML
+"""
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional
+
+import feedparser
+
+from config import FEED_CACHE_DIR, FEED_FETCH_TIMEOUT
+from http_session import get_session
+
+# 每個 entry 保留的摘要長度（下游最多使用 200 字）
+SUMMARY_CHARS = 500
+
+# 本次執行的快取統計
+_stats_lock = threading.Lock()
+stats = {"fetched": 0, "not_modified": 0}
+
+
+def _cache_path(url: str) -> str:
+    """取得 feed 快取檔路徑"""
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(FEED_CACHE_DIR, f"{digest}.json")
+
+
+def load_cached_feed(url: str) -> Optional[Dict]:
+    """
+    讀取 feed 快取
+
+    Args:
+        url: feed URL
+
+    Returns:
+        快取內容（etag, last_modified, entries），不存在或損毀時返回 None
+    """
+    try:
+        with open(_cache_path(url), encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if cached.get("url") != url:
+        return None
+    return cached
+
+
+def save_cached_feed(url: str, etag: Optional[str], last_modified: Optional[str],
+                     entries: List[Dict]) -> None:
+    """
+    寫入 feed 快取（先寫暫存檔再 rename，避免併發讀到半個檔案）
+
+    Args:
+        url: feed URL
+        etag: 回應的 ETag header
+        last_modified: 回應的 Last-Modified header
+        entries: 已正規化的 entries
+    """
+    os.makedirs(FEED_CACHE_DIR, exist_ok=True)
+    path = _cache_path(url)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": datetime.now().isoformat(),
+            "entries": entries,
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def drop_cached_feed(url: str) -> None:
+    """刪除 feed 快取（含 validator）"""
+    try:
+        os.remove(_cache_path(url))
+    except OSError:
+        pass
+
+
+def _parse_entry_time(entry) -> Optional[str]:
+    """取得 entry 的發布時間（ISO 格式），優先使用 published，其次 updated"""
+    for field in ("published_parsed", "updated_parsed"):
+        parsed = entry.get(field)
+        if parsed:
+            try:
+                return datetime(*parsed[:6]).isoformat()
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def _normalize_entry(entry) -> Dict:
+    """把 feedparser entry 轉為可 JSON 序列化的精簡格式"""
+    summary = entry.get("summary") or ""
+    return {
+        "id": entry.get("id") or entry.get("link", ""),
+        "title": entry.get("title", ""),
+        "link": entry.get("link", ""),
+        "summary": summary[:SUMMARY_CHARS],
+        "published": _parse_entry_time(entry),
+    }
+
+
+def fetch_feed_entries(url: str, timeout: int = None) -> List[Dict]:
+    """
+    以條件式 GET 抓取 feed 並返回正規化後的 entries
+
+    Args:
+        url: feed URL
+        timeout: 請求逾時秒數（預設 FEED_FETCH_TIMEOUT）
+
+    Returns:
+        entries 列表，每筆包含 id, title, link, summary, published（ISO 字串或 None）
+    """
+    cached = load_cached_feed(url)
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = get_session().get(url, headers=headers, timeout=timeout or FEED_FETCH_TIMEOUT)
+
+    if response.status_code == 304:
+        if cached and "entries" in cached:
+            with _stats_lock:
+                stats["not_modified"] += 1
+            return cached["entries"]
+        # 304 卻沒有可用的快取（快取檔在請求期間被刪除等）：捨棄 validator，不帶條件重新抓取
+        print(f"  收到 304 但沒有快取，重新抓取: {url}")
+        drop_cached_feed(url)
+        response = get_session().get(url, headers={"Cache-Control": "no-cache"},
+                                     timeout=timeout or FEED_FETCH_TIMEOUT)
+
+    response.raise_for_status()
+
+    feed = feedparser.parse(
+        response.content,
+        response_headers={
+            "content-location": response.url,
+            "content-type": response.headers.get("Content-Type", ""),
+        },
+    )
+    entries = [_normalize_entry(entry) for entry in feed.entries]
+
+    with _stats_lock:
+        stats["fetched"] += 1
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    # 只有伺服器支援 validator 時才值得寫快取
+    if etag or last_modified:
+        save_cached_feed(url, etag, last_modified, entries)
+
+    return entries
@@ -0,0 +1,120 @@
+"""
+共用 HTTP 連線
+
+所有對 readwise.io、api.telegram.org 與 RSS 來源的請求都走同一個 requests.Session：
+- 每個主機各自的 keep-alive 連線池，連續呼叫不必重新做 TCP / TLS 握手
+- gzip / deflate 壓縮（requests 預設的 Accept-Encoding）
+- 未指定 timeout 的請求套用 HTTP_TIMEOUT
+- 連線失敗一律重試；502/503/504 只重試冪等的方法（POST 不重試，避免重複存入）
+- 429 不在這裡重試：Reader 由 reader_client 的限流器依 Retry-After 統一等待
+
+Session 在各程序第一次使用時建立（gunicorn fork 後各 worker 各自一份）。
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_TIMEOUT, HTTP_POOL_HOSTS, HTTP_POOL_SIZE, HTTP_RETRIES
+
+USER_AGENT = "readwise-bot/1.0 (+https://github.com/tnfsp/readwise_bot)"
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """未指定 timeout 時套用預設值的 HTTPAdapter"""
+
+    def __init__(self, *args, timeout: float = HTTP_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"}),
+        respect_retry_after_header=False,  # 否則 urllib3 會自行重試帶 Retry-After 的 429
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE,
+                                 max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    取得本程序共用的 Session
+
+    fork 之後（pid 改變）會重建，避免多個程序共用同一條 socket。
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    各主機的連線重用統計
+
+    Returns:
+        host -> {"requests": 送出的請求數, "connections": 建立的連線數}
+        （requests - connections 即省下的 TCP / TLS 握手次數）
+    """
+    if _session is None or _session_pid != os.getpid():
+        return {}
+
+    stats = {}
+    # https:// 與 http:// 共用同一個 adapter，只統計一次
+    for adapter in {id(a): a for a in _session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = pool.host if pool.port in (None, 80, 443) else f"{pool.host}:{pool.port}"
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+    return stats
+
+
+def print_connection_stats():
+    """印出連線重用統計"""
+    stats = connection_stats()
+    if not stats:
+        return
+
+    total_requests = sum(s["requests"] for s in stats.values())
+    total_connections = sum(s["connections"] for s in stats.values())
+    print(f"HTTP 連線重用：{total_requests} 次請求 / {total_connections} 個連線"
+          f"（省下 {total_requests - total_connections} 次握手）")
+    for host, s in sorted(stats.items(), key=lambda item: -item[1]["requests"]):
+        if s["requests"] > s["connections"]:
+            print(f"  {host}: {s['requests']} 次請求 / {s['connections']} 個連線")
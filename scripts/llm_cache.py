@@ -0,0 +1,163 @@
+"""
+AI 評分結果快取
+
+同一篇文章在 48h / 168h 的時間窗口內會被重複評分。
+以 (model, prompt 模板版本, 標題 + 摘要) 的雜湊為 key，
+快取 Claude 給出的 importance / domain / highlight，只把未命中的文章送進 prompt。
+
+使用 SQLite（WAL 模式），gunicorn 多個 worker 與 GitHub Actions 的多個 job 可安全共用；
+過期（TTL）與超過容量（依最後使用時間）的紀錄會被淘汰。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from config import LLM_CACHE_PATH, LLM_CACHE_TTL_DAYS, LLM_CACHE_MAX_ENTRIES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    importance INTEGER,
+    domain TEXT,
+    highlight TEXT,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_verdicts_accessed ON verdicts (accessed_at);
+CREATE INDEX IF NOT EXISTS idx_verdicts_created ON verdicts (created_at);
+"""
+
+
+def make_key(model: str, template_version: str, title: str, summary: str) -> str:
+    """
+    計算快取 key
+
+    Args:
+        model: Claude 模型名稱
+        template_version: prompt 模板版本（含會影響評分的固定內容雜湊）
+        title: 文章標題
+        summary: 文章摘要
+
+    Returns:
+        SHA-256 hex
+    """
+    payload = "\x1f".join([model, template_version, title or "", summary or ""])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def template_digest(*parts: str) -> str:
+    """固定 prompt 內容的短雜湊（內容變更時舊快取自動失效）"""
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:10]
+
+
+class LLMCache:
+    """SQLite 評分快取"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_days: int = LLM_CACHE_TTL_DAYS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每個執行緒使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批次查詢（只返回未過期的紀錄，並更新最後使用時間）
+
+        Returns:
+            key -> {"importance", "domain", "highlight"}
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        conn = self._conn()
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, importance, domain, highlight FROM verdicts "
+                f"WHERE key IN ({placeholders}) AND created_at >= ?",
+                (*chunk, now - self.ttl)
+            ).fetchall()
+            for key, importance, domain, highlight in rows:
+                found[key] = {"importance": importance, "domain": domain, "highlight": highlight or ""}
+
+        if found:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE verdicts SET accessed_at = ? WHERE key = ?",
+                             [(now, key) for key in found])
+            conn.execute("COMMIT")
+        return found
+
+    def put_many(self, verdicts: Dict[str, Dict]) -> None:
+        """
+        批次寫入評分結果，寫入後淘汰過期 / 超量的紀錄
+
+        Args:
+            verdicts: key -> {"importance", "domain", "highlight"}
+        """
+        if not verdicts:
+            return
+
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, importance, domain, highlight, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, v.get("importance"), v.get("domain"), v.get("highlight") or "", now, now)
+                 for key, v in verdicts.items()]
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM verdicts WHERE created_at < ?", (now - self.ttl,))
+        count = conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM verdicts WHERE key IN "
+                "(SELECT key FROM verdicts ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict:
+        """快取筆數"""
+        count = self._conn().execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        return {"entries": count, "path": self.path}
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """取得共用的 LLMCache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+    return _cache
@@ -14,7 +14,6 @@ Quick Capture - Telegram Bot 快速捕捉到 Reader
 import sys
 import time
 import argparse
-import requests
 from datetime import datetime
 
 # 修復 Windows 控制台編碼問題
@@ -24,7 +23,10 @@ if sys.platform == "win32":
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 from message_parser import parse_telegram_message, determine_save_action
 from reader_client import save_url, save_note
+from http_session import get_session, print_connection_stats
 from ai_filter import process_capture_content, detect_domain
+from saved_urls import find_saved_capture, record_saved_capture
+from capture_queue import note_id
 
 
 # ============================================================
@@ -39,7 +41,7 @@ def get_updates(offset=None, timeout=30):
         params["offset"] = offset
 
     try:
-        response = requests.get(url, params=params, timeout=timeout + 10)
+        response = get_session().get(url, params=params, timeout=timeout + 10)
         if response.status_code == 200:
             return response.json()
     except Exception as e:
@@ -58,7 +60,7 @@ def send_reply(chat_id: int, text: str, parse_mode: str = "HTML"):
         "disable_web_page_preview": True
     }
     try:
-        requests.post(url, json=payload)
+        get_session().post(url, json=payload)
     except Exception as e:
         print(f"Error sending reply: {e}")
 
@@ -87,6 +89,7 @@ def process_message(message: dict) -> dict:
         "title": None,
         "domain": None,
         "source": parsed.source_label,
+        "duplicate": False,
         "url": None,
         "doc_id": None,
         "error": None
@@ -102,6 +105,13 @@ def process_message(message: dict) -> dict:
             # 準備 tags
             tags = ["#TG收集"]
 
+            # 已存入的連結：直接回覆，不再判斷領域與存入
+            saved = find_saved_capture(url, tags)
+            if saved:
+                result.update(success=True, duplicate=True, doc_id=saved["doc_id"],
+                              title=saved["title"] or url[:50], domain=saved["domain"])
+                return result
+
             # 判斷領域
             domain = detect_domain(parsed.text)
             domain_tag = f"@{domain}" if domain != "其他" else None
@@ -126,6 +136,7 @@ def process_message(message: dict) -> dict:
                 result["success"] = True
                 result["doc_id"] = doc.get("id")
                 result["title"] = doc.get("title") or url[:50]
+                record_saved_capture(url, doc, tags)
             else:
                 result["error"] = "存入失敗"
 
@@ -152,7 +163,8 @@ def process_message(message: dict) -> dict:
                 content=content,
                 title=title,
                 source_name=parsed.source_label,
-                tags=tags
+                tags=tags,
+                note_id=note_id(message)
             )
 
             if doc:
@@ -170,7 +182,7 @@ def process_message(message: dict) -> dict:
 def format_reply(result: dict) -> str:
     """格式化回覆訊息"""
     if result["success"]:
-        lines = ["<b>OK</b> 已存入 Reader"]
+        lines = ["<b>OK</b> 已在 Reader 中" if result.get("duplicate") else "<b>OK</b> 已存入 Reader"]
 
         if result["title"]:
             # 截斷過長的標題
@@ -278,6 +290,7 @@ def run_bot(test_mode=False):
         print("\n\nBot stopped by user")
     finally:
         print(f"\nTotal messages processed: {messages_processed}")
+        print_connection_stats()
 
 
 def main():
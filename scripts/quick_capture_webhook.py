@@ -9,6 +9,8 @@ Quick Capture - Webhook 版本（適用於 Zeabur 部署）
 """
 import os
 import sys
+import time
+import threading
 
 # 確保可以 import 同目錄的模組
 scripts_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,17 +23,20 @@ load_dotenv(os.path.join(root_dir, '.env'))
 
 from flask import Flask, request, jsonify
 from datetime import datetime
-import requests
 
 # 直接從環境變數讀取（避免 config.py 路徑問題）
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 READWISE_TOKEN = os.getenv("READWISE_TOKEN")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+CAPTURE_QUEUE_POLL = float(os.getenv("CAPTURE_QUEUE_POLL", "5"))  # 背景執行緒檢查遺留 update 的間隔（秒）
 
 from message_parser import parse_telegram_message, determine_save_action
 from reader_client import save_url, save_note
+from http_session import get_session
 from ai_filter import process_capture_content, detect_domain
+from saved_urls import find_saved_capture, record_saved_capture
+from capture_queue import enqueue_update, process_next, prune_updates, note_id
 
 app = Flask(__name__)
 
@@ -46,7 +51,7 @@ def send_reply(chat_id: int, text: str, parse_mode: str = "HTML"):
         "disable_web_page_preview": True
     }
     try:
-        requests.post(url, json=payload)
+        get_session().post(url, json=payload)
     except Exception as e:
         print(f"Error sending reply: {e}")
 
@@ -62,6 +67,7 @@ def process_message(message: dict) -> dict:
         "title": None,
         "domain": None,
         "source": parsed.source_label,
+        "duplicate": False,
         "url": None,
         "doc_id": None,
         "error": None
@@ -73,6 +79,13 @@ def process_message(message: dict) -> dict:
             result["url"] = url
             tags = ["#TG收集"]
 
+            # 已存入的連結：直接回覆，不再判斷領域與存入
+            saved = find_saved_capture(url, tags)
+            if saved:
+                result.update(success=True, duplicate=True, doc_id=saved["doc_id"],
+                              title=saved["title"] or url[:50], domain=saved["domain"])
+                return result
+
             domain = detect_domain(parsed.text)
             domain_tag = f"@{domain}" if domain != "其他" else None
             if domain_tag:
@@ -93,6 +106,7 @@ def process_message(message: dict) -> dict:
                 result["success"] = True
                 result["doc_id"] = doc.get("id")
                 result["title"] = doc.get("title") or url[:50]
+                record_saved_capture(url, doc, tags)
             else:
                 result["error"] = "存入失敗"
 
@@ -114,7 +128,8 @@ def process_message(message: dict) -> dict:
                 content=content,
                 title=title,
                 source_name=parsed.source_label,
-                tags=tags
+                tags=tags,
+                note_id=note_id(message)
             )
 
             if doc:
@@ -132,7 +147,7 @@ def process_message(message: dict) -> dict:
 def format_reply(result: dict) -> str:
     """格式化回覆訊息"""
     if result["success"]:
-        lines = ["<b>OK</b> 已存入 Reader"]
+        lines = ["<b>OK</b> 已在 Reader 中" if result.get("duplicate") else "<b>OK</b> 已存入 Reader"]
 
         if result["title"]:
             title = result["title"][:40]
@@ -154,6 +169,44 @@ def format_reply(result: dict) -> str:
         return f"Error 存入失敗\n{result.get('error', '未知錯誤')}"
 
 
+def handle_message(message: dict):
+    """處理訊息並發送回覆"""
+    result = process_message(message)
+
+    # 發送回覆
+    reply = format_reply(result)
+    send_reply(message["chat"]["id"], reply)
+
+    print(f"Processed: {result['case_type']} - {result['title']}")
+
+
+_wakeup = threading.Event()
+
+
+def process_updates():
+    """
+    背景執行緒：處理佇列中的 update
+
+    webhook 保存 update 後喚醒；另外每 CAPTURE_QUEUE_POLL 秒檢查一次，
+    處理重啟前未完成、重試到期或其他程序 lease 過期的 update。
+    """
+    last_prune = 0.0
+    while True:
+        _wakeup.wait(CAPTURE_QUEUE_POLL)
+        _wakeup.clear()
+        try:
+            while process_next(handle_message) is not None:
+                pass
+            if time.monotonic() - last_prune > 3600:
+                prune_updates()
+                last_prune = time.monotonic()
+        except Exception as e:
+            print(f"Error processing updates: {e}")
+
+
+threading.Thread(target=process_updates, name="update-worker", daemon=True).start()
+
+
 @app.route("/", methods=["GET"])
 def index():
     """健康檢查"""
@@ -179,14 +232,13 @@ def webhook():
                 print(f"Ignored message from unauthorized chat: {chat_id}")
                 return jsonify({"status": "ignored"})
 
-            # 處理訊息
-            result = process_message(message)
-
-            # 發送回覆
-            reply = format_reply(result)
-            send_reply(chat_id, reply)
+            # 先保存 update（以 update_id 去重，Telegram 重送的 update 不再處理）
+            if enqueue_update(update) is None:
+                print(f"Duplicate update: {update['update_id']}")
+                return jsonify({"status": "duplicate"})
 
-            print(f"Processed: {result['case_type']} - {result['title']}")
+            # update 已保存，交給背景執行緒處理（請求不等待 AI 判斷與存檔）
+            _wakeup.set()
 
         return jsonify({"status": "ok"})
 
@@ -203,7 +255,7 @@ def set_webhook():
     webhook_url = f"{host}/webhook"
 
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/setWebhook"
-    response = requests.post(url, json={"url": webhook_url})
+    response = get_session().post(url, json={"url": webhook_url})
 
     if response.status_code == 200:
         return jsonify({
@@ -222,7 +274,7 @@ def set_webhook():
 def delete_webhook():
     """刪除 Webhook（切換回 Polling 模式時使用）"""
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/deleteWebhook"
-    response = requests.post(url)
+    response = get_session().post(url)
     return jsonify(response.json())
 
 
@@ -0,0 +1,103 @@
+"""
+Token bucket 限流
+
+在送出請求前取得 token，讓並行的呼叫平均分散在 API 的每分鐘限額內；
+收到 429 時暫停整個 bucket 直到 Retry-After 結束，其他執行緒也一起等待，
+而不是各自撞牆再各自重試。
+"""
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket（每個 API 類別一個）"""
+
+    def __init__(self, name: str, rate_per_min: float, burst: int = None):
+        """
+        Args:
+            name: 名稱（統計用）
+            rate_per_min: 每分鐘可送出的請求數
+            burst: 可瞬間送出的請求數（預設為 10 秒的額度）
+        """
+        self.name = name
+        self.rate = rate_per_min / 60.0
+        self.capacity = burst or max(1, int(rate_per_min // 6))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        取得一個 token（必要時等待）
+
+        Returns:
+            等待的秒數
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    waited = now - started
+                    self.requests += 1
+                    self.total_wait += waited
+                    self.max_wait = max(self.max_wait, waited)
+                    return waited
+                delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        """收到 429 後暫停 bucket，並清空累積的 token"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+            self.throttled += 1
+
+    def stats(self) -> Dict:
+        """請求數、429 次數與排隊等待時間"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "total_wait": round(self.total_wait, 2),
+                "max_wait": round(self.max_wait, 2),
+                "avg_wait": round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+def parse_retry_after(value: Optional[str], default: float = 60.0) -> float:
+    """
+    解析 Retry-After header（秒數或 HTTP 日期）
+
+    Returns:
+        需要等待的秒數
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
@@ -1,10 +1,43 @@
 """
 Readwise Reader API 客戶端
 """
+import os
+import json
+import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from config import READWISE_TOKEN, READWISE_BASE_URL
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from config import (
+    READWISE_TOKEN,
+    READWISE_BASE_URL,
+    READER_WRITE_WORKERS,
+    READER_LIST_PER_MIN,
+    READER_SAVE_PER_MIN,
+    READER_UPDATE_PER_MIN,
+    READER_THROTTLE_RETRIES,
+    TAG_REGISTRY_TTL,
+    WORK_QUEUE_PATH,
+    READER_SAVE_QUEUE_WORKERS,
+    READER_SAVE_QUEUE_ATTEMPTS,
+    READER_SAVE_QUEUE_BACKOFF,
+    READER_SAVE_QUEUE_LEASE,
+)
+from http_session import get_session
+from rate_limit import TokenBucket, parse_retry_after
+from tag_registry import TagRegistry
+from work_queue import WorkQueue
+
+# 各類 API 的限流（Reader 文件：list 20/min、save 與 update 50/min）
+RATE_LIMITS = {
+    "list": TokenBucket("list", READER_LIST_PER_MIN),
+    "save": TokenBucket("save", READER_SAVE_PER_MIN),
+    "update": TokenBucket("update", READER_UPDATE_PER_MIN),
+}
+
+# 程序內的 tag 登錄表（查詢不連網，過期時在背景重新載入）
+TAG_REGISTRY = TagRegistry(lambda: fetch_all_tags(), TAG_REGISTRY_TTL)
 
 
 def get_headers():
@@ -12,69 +45,252 @@ def get_headers():
     return {"Authorization": f"Token {READWISE_TOKEN}"}
 
 
-def get_recent_documents(hours: int = 24, location: str = "feed") -> List[Dict]:
+def reader_request(kind: str, method: str, path: str, **kwargs) -> requests.Response:
     """
-    獲取最近的文章
+    送出 Reader API 請求（經過限流，429 時依 Retry-After 等待後重試）
 
     Args:
-        hours: 過去幾小時內的文章
-        location: 文章位置 (feed, archive, later)
+        kind: 限流類別 (list, save, update)
+        method: HTTP 方法
+        path: API 路徑，例如 "/list/"
+        **kwargs: 傳給 requests 的其他參數
 
     Returns:
-        文章列表
+        最後一次的回應（重試用盡時仍可能是 429）
     """
-    since = (datetime.now() - timedelta(hours=hours)).isoformat()
+    bucket = RATE_LIMITS[kind]
+    for attempt in range(READER_THROTTLE_RETRIES + 1):
+        waited = bucket.acquire()
+        if waited >= 5:
+            print(f"  Reader {kind} 限流：排隊 {waited:.1f}s")
 
-    all_docs = []
-    next_cursor = None
+        response = get_session().request(method, f"{READWISE_BASE_URL}{path}",
+                                         headers=get_headers(), **kwargs)
+        if response.status_code != 429 or attempt == READER_THROTTLE_RETRIES:
+            return response
 
-    while True:
-        params = {
-            "updatedAfter": since,
-            "location": location,
-        }
-        if next_cursor:
-            params["pageCursor"] = next_cursor
-
-        response = requests.get(
-            f"{READWISE_BASE_URL}/list/",
-            headers=get_headers(),
-            params=params
-        )
-
-        if response.status_code != 200:
-            print(f"Error fetching documents: {response.status_code}")
-            break
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        print(f"  Reader {kind} 回應 429，{delay:.0f}s 後重試 ({attempt + 1}/{READER_THROTTLE_RETRIES})")
+        bucket.pause(delay)
+
+    return response
+
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    """各類 API 的請求數、429 次數與排隊等待時間"""
+    return {kind: bucket.stats() for kind, bucket in RATE_LIMITS.items()}
+
+
+def print_rate_limit_stats():
+    """印出限流統計"""
+    for kind, stats in rate_limit_stats().items():
+        if stats["requests"]:
+            print(f"Reader {kind}: {stats['requests']} 次請求，429 {stats['throttled']} 次，"
+                  f"排隊共 {stats['total_wait']}s（最長 {stats['max_wait']}s）")
 
-        data = response.json()
-        results = data.get("results", [])
 
-        # 只保留有標題的文章（排除 note, highlight）
-        docs = [d for d in results if d.get("title") and d.get("category") in ["rss", "article", "email"]]
-        all_docs.extend(docs)
+def _fetch_page(params: Dict, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """列出一頁文件，返回 (本頁文件, 下一頁 cursor)"""
+    page_params = dict(params)
+    if cursor:
+        page_params["pageCursor"] = cursor
 
-        next_cursor = data.get("nextPageCursor")
-        if not next_cursor:
-            break
+    response = reader_request("list", "GET", "/list/", params=page_params)
+
+    if response.status_code != 200:
+        # 不可只回傳部分結果：讓呼叫端知道這次的文章列表不完整
+        print(f"Error fetching documents: {response.status_code}")
+        response.raise_for_status()
+        raise requests.HTTPError(f"Unexpected status {response.status_code}", response=response)
+
+    data = response.json()
+    return data.get("results", []), data.get("nextPageCursor")
+
+
+def iter_document_pages(params: Dict = None, cursor: str = None,
+                        prefetch: bool = True) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+    """
+    逐頁列出 Reader 文件
+
+    prefetch 時，呼叫端處理本頁的同時，下一頁已在背景請求中；
+    記憶體中最多只有兩頁。
+
+    Args:
+        params: /list/ 的查詢參數（updatedAfter, location, category, withHtmlContent...）
+        cursor: 從這個 page cursor 開始（續傳用）
+        prefetch: 是否在背景預先請求下一頁
+
+    Yields:
+        (本頁文件, 下一頁 cursor；最後一頁為 None)
+    """
+    params = params or {}
+    if not prefetch:
+        while True:
+            docs, cursor = _fetch_page(params, cursor)
+            yield docs, cursor
+            if not cursor:
+                return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_fetch_page, params, cursor)
+        while pending is not None:
+            docs, cursor = pending.result()
+            pending = executor.submit(_fetch_page, params, cursor) if cursor else None
+            try:
+                yield docs, cursor
+            except GeneratorExit:
+                if pending is not None:
+                    pending.cancel()
+                raise
+
+
+class CursorCheckpoint:
+    """
+    分頁列出的 checkpoint（JSON 檔）
+
+    記錄查詢參數與下一頁的 cursor；參數（不含 updatedAfter）相同時才續傳，
+    續傳時沿用上次的 updatedAfter，cursor 才有效。
+    """
 
-    return all_docs
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def _scope(params: Dict) -> Dict:
+        return {k: v for k, v in params.items() if k != "updatedAfter"}
+
+    def load(self, params: Dict) -> Tuple[Dict, Optional[str]]:
+        """
+        Returns:
+            (要使用的查詢參數, 續傳的 cursor；沒有可續傳的 checkpoint 時為 None)
+        """
+        params, cursor, _ = self.load_state(params)
+        return params, cursor
+
+    def load_state(self, params: Dict) -> Tuple[Dict, Optional[str], Dict]:
+        """
+        同 load，另外返回與 cursor 一起保存的狀態（例如輸出檔案的位移）
+
+        Returns:
+            (要使用的查詢參數, 續傳的 cursor, 保存的狀態)
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return params, None, {}
+        if self._scope(saved.get("params", {})) != self._scope(params) or not saved.get("cursor"):
+            return params, None, {}
+        return saved["params"], saved["cursor"], saved.get("state") or {}
+
+    def save(self, params: Dict, cursor: str, state: Dict = None):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "cursor": cursor, "state": state or {},
+                       "saved_at": datetime.now().isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def iter_documents(params: Dict = None, doc_filter: Callable[[Dict], bool] = None,
+                   checkpoint_path: str = None, prefetch: bool = True) -> Iterator[Dict]:
+    """
+    逐篇產生 Reader 文件（邊列出邊處理，記憶體不隨文件數成長）
+
+    指定 checkpoint_path 時，每頁的文件都被取用後才記錄下一頁的 cursor，
+    中斷後以相同參數再次呼叫會從未完成的頁面繼續；全部列完後刪除 checkpoint。
+
+    Args:
+        params: /list/ 的查詢參數
+        doc_filter: 只產生符合條件的文件
+        checkpoint_path: cursor checkpoint 檔案路徑
+        prefetch: 是否在背景預先請求下一頁
+
+    Yields:
+        文件（Reader 原始格式）
+    """
+    params = dict(params or {})
+    checkpoint = CursorCheckpoint(checkpoint_path) if checkpoint_path else None
+    cursor = None
+    if checkpoint:
+        params, cursor = checkpoint.load(params)
+        if cursor:
+            print(f"從 checkpoint 繼續列出文件：{checkpoint_path}")
+
+    for docs, next_cursor in iter_document_pages(params, cursor=cursor, prefetch=prefetch):
+        for doc in docs:
+            if doc_filter is None or doc_filter(doc):
+                yield doc
+        if checkpoint:
+            if next_cursor:
+                checkpoint.save(params, next_cursor)
+            else:
+                checkpoint.clear()
+
+
+def _is_digest_article(doc: Dict) -> bool:
+    """只保留有標題的文章（排除 note, highlight）"""
+    return bool(doc.get("title")) and doc.get("category") in ["rss", "article", "email"]
+
+
+def iter_recent_documents(hours: int = 24, location: str = "feed",
+                          checkpoint_path: str = None) -> Iterator[Dict]:
+    """
+    逐篇產生最近的文章（get_recent_documents 的串流版本）
+
+    Args:
+        hours: 過去幾小時內的文章
+        location: 文章位置 (feed, archive, later)
+        checkpoint_path: cursor checkpoint 檔案路徑（可續傳）
+
+    Yields:
+        文章
+    """
+    params = {
+        "updatedAfter": (datetime.now() - timedelta(hours=hours)).isoformat(),
+        "location": location,
+    }
+    yield from iter_documents(params, doc_filter=_is_digest_article, checkpoint_path=checkpoint_path)
+
+
+def get_recent_documents(hours: int = 24, location: str = "feed") -> List[Dict]:
+    """
+    獲取最近的文章
+
+    Args:
+        hours: 過去幾小時內的文章
+        location: 文章位置 (feed, archive, later)
+
+    Returns:
+        文章列表
+    """
+    return list(iter_recent_documents(hours=hours, location=location))
 
 
-def get_document_content(doc_id: str) -> Optional[Dict]:
+def get_document_content(doc_id: str, with_html: bool = True) -> Optional[Dict]:
     """
     獲取單篇文章的完整內容
 
     Args:
         doc_id: 文章 ID
+        with_html: 是否包含 HTML 內容（只需要 metadata 時設為 False）
 
     Returns:
         文章詳細資訊
     """
-    response = requests.get(
-        f"{READWISE_BASE_URL}/list/",
-        headers=get_headers(),
-        params={"id": doc_id, "withHtmlContent": True}
-    )
+    params = {"id": doc_id}
+    if with_html:
+        params["withHtmlContent"] = True
+
+    response = reader_request("list", "GET", "/list/", params=params)
 
     if response.status_code == 200:
         data = response.json()
@@ -95,13 +311,114 @@ def update_document_tags(doc_id: str, tags: List[str]) -> bool:
     Returns:
         是否成功
     """
-    response = requests.patch(
-        f"{READWISE_BASE_URL}/update/{doc_id}/",
-        headers=get_headers(),
+    response = reader_request(
+        "update", "PATCH", f"/update/{doc_id}/",
         json={"tags": tags}
     )
 
-    return response.status_code == 200
+    if response.status_code == 200:
+        TAG_REGISTRY.observe(tags)
+        return True
+    return False
+
+
+def tag_names(tags) -> List[str]:
+    """
+    取出 tag 名稱
+
+    Reader 的 list 回應中 tags 是 {名稱: tag 物件}，
+    其他地方可能是 tag 物件列表或字串列表。
+
+    Args:
+        tags: Reader 回傳的 tags
+
+    Returns:
+        Tag 名稱列表
+    """
+    if isinstance(tags, dict):
+        return [t.get("name") or key if isinstance(t, dict) else key for key, t in tags.items()]
+
+    names = []
+    for t in tags or []:
+        if isinstance(t, dict):
+            names.append(t.get("name", ""))
+        elif isinstance(t, str):
+            names.append(t)
+    return [name for name in names if name]
+
+
+def _new_tags(existing_tags: List[str], new_tags: List[str]) -> List[str]:
+    """
+    要加到文件上的 tags
+
+    以 TAG_REGISTRY 換成 Reader 中既有的名稱（大小寫以 Reader 為準，不會另外建立 @ai / @AI），
+    文件已有的 tag（不分大小寫）與重複的 tag 不再加入。
+    """
+    have = {tag.strip().lower() for tag in existing_tags}
+    added = []
+    for tag in new_tags:
+        name = TAG_REGISTRY.canonical(tag) or tag
+        if name.strip().lower() not in have:
+            have.add(name.strip().lower())
+            added.append(name)
+    return added
+
+
+def _merge_tags(doc_id: str, new_tags: List[str], known_tags=None, title: str = None) -> bool:
+    """把 new_tags 合併進文章現有的 tags（可同時更新標題），以單一 PATCH 更新（沒有變更時不送出）"""
+    fields = {"title": title} if title else {}
+    if new_tags:
+        if known_tags is None:
+            doc = get_document_content(doc_id, with_html=False)
+            if not doc:
+                return False
+            known_tags = doc.get("tags")
+
+        existing_tags = tag_names(known_tags)
+        added = _new_tags(existing_tags, new_tags)
+        if added:
+            fields["tags"] = existing_tags + added
+    if not fields:
+        return True
+
+    response = reader_request("update", "PATCH", f"/update/{doc_id}/", json=fields)
+    if response.status_code == 200:
+        TAG_REGISTRY.observe(fields.get("tags") or [])
+        return True
+    return False
+
+
+def add_tags_to_documents(additions: Dict[str, List[str]], known_tags: Dict[str, object] = None,
+                          workers: int = READER_WRITE_WORKERS) -> Dict[str, bool]:
+    """
+    批次為多篇文章添加 tags
+
+    每篇文章的所有新 tag 合併成一次 PATCH，並行送出。
+    已知現有 tags 的文章（例如 get_recent_documents 回應中的 tags）不再重新查詢。
+
+    Args:
+        additions: 文章 ID -> 要添加的 tags
+        known_tags: 文章 ID -> 現有 tags（Reader 回傳格式）
+        workers: 同時進行的請求數
+
+    Returns:
+        文章 ID -> 是否成功
+    """
+    known_tags = known_tags or {}
+
+    def run(doc_id: str) -> bool:
+        try:
+            return _merge_tags(doc_id, additions[doc_id], known_tags.get(doc_id))
+        except Exception as e:
+            print(f"Error updating tags for {doc_id}: {e}")
+            return False
+
+    doc_ids = [doc_id for doc_id, tags in additions.items() if tags]
+    if not doc_ids:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(doc_ids)))) as executor:
+        return dict(zip(doc_ids, executor.map(run, doc_ids)))
 
 
 def add_tag_to_document(doc_id: str, tag: str) -> bool:
@@ -115,48 +432,117 @@ def add_tag_to_document(doc_id: str, tag: str) -> bool:
     Returns:
         是否成功
     """
-    # 先獲取現有 tags
-    doc = get_document_content(doc_id)
-    if not doc:
-        return False
+    return _merge_tags(doc_id, [tag])
 
-    tags_data = doc.get("tags", [])
-    existing_tags = []
-    for t in tags_data:
-        if isinstance(t, dict):
-            existing_tags.append(t.get("name", ""))
-        elif isinstance(t, str):
-            existing_tags.append(t)
 
-    if tag not in existing_tags:
-        existing_tags.append(tag)
+def update_document(doc_id: str, title: str = None, add_tags: List[str] = None) -> bool:
+    """
+    更新文章標題並合併 tags（一次 PATCH）
 
-    return update_document_tags(doc_id, existing_tags)
+    Args:
+        doc_id: 文章 ID
+        title: 新標題（None 表示不變）
+        add_tags: 要添加的 tags（會先讀取現有 tags 再合併）
 
+    Returns:
+        是否成功
+    """
+    return _merge_tags(doc_id, add_tags or [], title=title)
 
-def get_all_tags() -> List[Dict]:
+
+def fetch_all_tags() -> List[Dict]:
     """
-    獲取所有 tags
+    從 API 列出所有 tags（跟隨分頁）
 
     Returns:
         Tag 列表
-    """
-    response = requests.get(
-        f"{READWISE_BASE_URL}/tags/",
-        headers=get_headers()
-    )
 
-    if response.status_code == 200:
+    Raises:
+        requests.HTTPError: API 回傳錯誤
+    """
+    tags = []
+    cursor = None
+    while True:
+        params = {"pageCursor": cursor} if cursor else {}
+        response = reader_request("list", "GET", "/tags/", params=params)
+        response.raise_for_status()
         data = response.json()
-        return data.get("results", [])
+        tags.extend(data.get("results", []))
+        cursor = data.get("nextPageCursor")
+        if not cursor:
+            return tags
 
-    return []
+
+def get_all_tags() -> List[Dict]:
+    """
+    獲取所有 tags（從 TAG_REGISTRY 讀取，第一次呼叫時載入）
+
+    Returns:
+        Tag 列表
+    """
+    if not TAG_REGISTRY.loaded:
+        TAG_REGISTRY.refresh()
+    return TAG_REGISTRY.all()
 
 
 # ============================================================
 # Quick Capture 功能 - Save API
 # ============================================================
 
+def _url_payload(url: str, tags: List[str] = None, notes: str = None, summary: str = None) -> Dict:
+    """組裝存入 URL 的 /save/ payload"""
+    payload = {"url": url}
+
+    if tags:
+        payload["tags"] = tags
+    if notes:
+        payload["notes"] = notes
+    if summary:
+        payload["summary"] = summary
+    return payload
+
+
+def _note_payload(content: str, title: str, source_name: str = None,
+                  tags: List[str] = None, notes: str = None, note_id: str = None) -> Dict:
+    """組裝存入純文字筆記的 /save/ payload"""
+    # 組裝來源標記
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    if source_name:
+        author = f"[{source_name}] {now}"
+    else:
+        author = f"[我的筆記] {now}"
+
+    # 將純文字轉換為 HTML（保留換行）
+    html_lines = content.replace("\n", "<br>")
+    html_content = f"<article><p>{html_lines}</p></article>"
+
+    # 使用虛擬 URL（Reader 需要 URL 欄位）；有 note_id 時固定，重送不會產生重複文件
+    fake_url = f"https://tg-capture.local/{note_id or datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    payload = {
+        "url": fake_url,
+        "html": html_content,
+        "title": title,
+        "author": author,
+        "should_clean_html": True,
+        "saved_using": "TG Quick Capture"
+    }
+
+    if tags:
+        payload["tags"] = tags
+    if notes:
+        payload["notes"] = notes
+    return payload
+
+
+def _post_save(payload: Dict) -> requests.Response:
+    """送出 /save/，成功時通知 tag 登錄表"""
+    response = reader_request("save", "POST", "/save/", json=payload)
+    if response.status_code in [200, 201]:
+        TAG_REGISTRY.observe(payload.get("tags") or [])
+    return response
+
+
 def save_url(
     url: str,
     tags: List[str] = None,
@@ -175,20 +561,7 @@ def save_url(
     Returns:
         成功時返回文章資訊，失敗返回 None
     """
-    payload = {"url": url}
-
-    if tags:
-        payload["tags"] = tags
-    if notes:
-        payload["notes"] = notes
-    if summary:
-        payload["summary"] = summary
-
-    response = requests.post(
-        f"{READWISE_BASE_URL}/save/",
-        headers=get_headers(),
-        json=payload
-    )
+    response = _post_save(_url_payload(url, tags, notes, summary))
 
     if response.status_code in [200, 201]:
         return response.json()
@@ -203,7 +576,8 @@ def save_note(
     title: str,
     source_name: str = None,
     tags: List[str] = None,
-    notes: str = None
+    notes: str = None,
+    note_id: str = None
 ) -> Optional[Dict]:
     """
     存入純文字筆記到 Reader
@@ -214,43 +588,12 @@ def save_note(
         source_name: 來源名稱，例如頻道名稱或「我的筆記」
         tags: 標籤列表
         notes: 額外的用戶評論
+        note_id: 固定的筆記識別碼（例如 chat_id-message_id），同一 ID 重送時 Reader 返回同一份文件
 
     Returns:
         成功時返回文章資訊，失敗返回 None
     """
-    # 組裝來源標記
-    now = datetime.now().strftime("%Y-%m-%d %H:%M")
-    if source_name:
-        author = f"[{source_name}] {now}"
-    else:
-        author = f"[我的筆記] {now}"
-
-    # 將純文字轉換為 HTML（保留換行）
-    html_lines = content.replace("\n", "<br>")
-    html_content = f"<article><p>{html_lines}</p></article>"
-
-    # 使用虛擬 URL（Reader 需要 URL 欄位）
-    fake_url = f"https://tg-capture.local/{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    payload = {
-        "url": fake_url,
-        "html": html_content,
-        "title": title,
-        "author": author,
-        "should_clean_html": True,
-        "saved_using": "TG Quick Capture"
-    }
-
-    if tags:
-        payload["tags"] = tags
-    if notes:
-        payload["notes"] = notes
-
-    response = requests.post(
-        f"{READWISE_BASE_URL}/save/",
-        headers=get_headers(),
-        json=payload
-    )
+    response = _post_save(_note_payload(content, title, source_name, tags, notes, note_id))
 
     if response.status_code in [200, 201]:
         return response.json()
@@ -260,6 +603,192 @@ def save_note(
         return None
 
 
+# ============================================================
+# Quick Capture 功能 - Write-behind 存檔佇列
+# ============================================================
+
+class SaveQueue:
+    """
+    Reader 存檔的 write-behind 佇列
+
+    save_url / save_note 只把 payload 寫入本地 SQLite 佇列就返回，
+    背景執行緒再依序送出（同一 order_key 依加入順序，不同 key 並行）：
+    - 連線錯誤、5xx 以指數退避重試，最多 max_attempts 次
+    - 4xx 不重試
+    - 完成或放棄時呼叫 on_complete 註冊的 handler(meta, doc, error, attempts)
+
+    佇列存在檔案中，程序重啟後未完成的工作會繼續送出（lease 到期後重新領取）。
+    Reader 以 URL 識別文件，同一 payload 重送不會產生重複文件。
+    """
+
+    def __init__(self, path: str = WORK_QUEUE_PATH, workers: int = READER_SAVE_QUEUE_WORKERS,
+                 max_attempts: int = READER_SAVE_QUEUE_ATTEMPTS):
+        self.queue = WorkQueue(path, "reader_save")
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._handlers: List[Callable[[Dict, Optional[Dict], Optional[str], int], None]] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._pid = None
+        self._active = 0
+        self._lock = threading.Lock()
+
+        self.saved = 0
+        self.retried = 0
+        self.failed = 0
+
+    def on_complete(self, handler: Callable[[Dict, Optional[Dict], Optional[str], int], None]):
+        """註冊完成 handler（meta 為加入時帶入的資料，doc 為 Reader 回應，失敗時 error 為錯誤訊息，attempts 為送出次數）"""
+        self._handlers.append(handler)
+        return handler
+
+    def save_url(self, url: str, tags: List[str] = None, notes: str = None, summary: str = None,
+                 order_key: str = None, meta: Dict = None, dedupe_key: str = None) -> Optional[int]:
+        """
+        排入存入 URL
+
+        Args:
+            url, tags, notes, summary: 同 save_url
+            order_key: 同一 key 依序送出（例如 chat_id）
+            meta: 傳給完成 handler 的資料（需可 JSON 序列化）
+            dedupe_key: 重複的 key 不再排入（例如同一則 Telegram 訊息）
+
+        Returns:
+            工作 ID，dedupe_key 已存在時為 None
+        """
+        return self._put("URL", _url_payload(url, tags, notes, summary), order_key, meta, dedupe_key)
+
+    def save_note(self, content: str, title: str, source_name: str = None, tags: List[str] = None,
+                  notes: str = None, note_id: str = None, order_key: str = None, meta: Dict = None,
+                  dedupe_key: str = None) -> Optional[int]:
+        """排入存入純文字筆記（參數同 save_note 與 SaveQueue.save_url）"""
+        return self._put("note", _note_payload(content, title, source_name, tags, notes, note_id),
+                         order_key, meta, dedupe_key)
+
+    def _put(self, label: str, payload: Dict, order_key: Optional[str], meta: Optional[Dict],
+             dedupe_key: Optional[str]) -> Optional[int]:
+        job_id = self.queue.put({"label": label, "payload": payload, "meta": meta or {}},
+                                order_key=order_key, dedupe_key=dedupe_key)
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def start(self):
+        """啟動背景執行緒（每個程序各自一組，fork 後第一次呼叫時重建）"""
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"reader-save-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        self.queue.prune(7 * 86400)
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(READER_SAVE_QUEUE_LEASE)
+            except Exception as e:
+                print(f"Error claiming save job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            with self._lock:
+                self._active += 1
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def _run(self, job: Dict):
+        body = job["payload"]
+        doc, error, retryable = None, None, True
+        try:
+            response = _post_save(body["payload"])
+            if response.status_code in [200, 201]:
+                doc = response.json()
+            else:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                retryable = response.status_code >= 500 or response.status_code == 429
+        except Exception as e:
+            error = str(e)
+
+        if doc is not None:
+            self.queue.complete(job["id"], {"id": doc.get("id"), "title": doc.get("title")})
+            with self._lock:
+                self.saved += 1
+        elif retryable and job["attempts"] < self.max_attempts:
+            delay = min(300, READER_SAVE_QUEUE_BACKOFF * 2 ** (job["attempts"] - 1))
+            print(f"  Reader 存入 {body['label']} 失敗（{error}），{delay:.0f}s 後重試 "
+                  f"({job['attempts']}/{self.max_attempts})")
+            self.queue.fail(job["id"], error, retry_in=delay)
+            with self._lock:
+                self.retried += 1
+            return
+        else:
+            print(f"Error saving {body['label']}: {error}")
+            self.queue.fail(job["id"], error)
+            with self._lock:
+                self.failed += 1
+
+        for handler in self._handlers:
+            try:
+                handler(body["meta"], doc, error, job["attempts"])
+            except Exception as e:
+                print(f"Error in save handler: {e}")
+
+    def drain(self, timeout: float = 30) -> bool:
+        """
+        等待佇列清空（關閉前呼叫）
+
+        Returns:
+            是否在時限內清空（重試中的工作仍留在佇列，下次啟動時繼續）
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                active = self._active
+            if not active and not self.queue.stats()["pending"]:
+                return True
+            self._wake.set()
+            time.sleep(0.1)
+        return False
+
+    def stop(self):
+        """停止背景執行緒（處理中的工作會先完成）"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=READER_SAVE_QUEUE_LEASE)
+
+    def stats(self) -> Dict:
+        """佇列中各狀態的工作數與本程序的處理統計"""
+        with self._lock:
+            counters = {"active": self._active, "saved": self.saved, "retried": self.retried, "failed": self.failed}
+        return {"queue": self.queue.stats(), **counters}
+
+
+_save_queue: Optional[SaveQueue] = None
+_save_queue_lock = threading.Lock()
+
+
+def get_save_queue() -> SaveQueue:
+    """取得共用的 write-behind 存檔佇列"""
+    global _save_queue
+    with _save_queue_lock:
+        if _save_queue is None:
+            _save_queue = SaveQueue()
+        return _save_queue
+
+
 if __name__ == "__main__":
     # 測試
     print("Testing Reader Client...")
@@ -0,0 +1,229 @@
+"""
+Readwise Reader 全庫匯出
+
+以 /list/ 分頁串流匯出所有文件，供分析與排序實驗使用：
+- jsonl：gzip 壓縮的 JSONL，每頁寫成一個 gzip member（多個 member 串接仍是合法的 .gz）
+- parquet：資料夾，每頁一個 part 檔（需要 pyarrow）
+
+每頁寫入並 fsync 後才記錄 cursor checkpoint（含檔案位移 / part 編號），
+中斷後以相同參數重新執行會截掉未完成的部分，從下一頁繼續。
+請求經過 reader_client 的限流器，以穩定的速率匯出；記憶體中最多只有兩頁。
+
+使用方式：
+    python reader_export.py --output library.jsonl.gz
+    python reader_export.py --format parquet --output library_parquet --html
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import glob
+import argparse
+from typing import Dict, List, Optional
+
+from reader_client import CursorCheckpoint, iter_document_pages, tag_names, print_rate_limit_stats
+
+# Parquet 固定欄位（其餘欄位保留在 raw JSON 中）
+PARQUET_COLUMNS = [
+    "id", "url", "source_url", "title", "author", "category", "location", "site_name",
+    "summary", "word_count", "created_at", "updated_at", "published_date", "saved_at",
+]
+
+
+def _checkpoint_path(output: str) -> str:
+    return f"{output.rstrip(os.sep)}.checkpoint.json"
+
+
+class JsonlGzipWriter:
+    """gzip JSONL 輸出：每頁一個 gzip member，可截斷到任一頁的結尾續寫"""
+
+    def __init__(self, path: str, offset: Optional[int]):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        mode = "r+b" if offset is not None and os.path.exists(path) else "wb"
+        self._file = open(path, mode)
+        if mode == "r+b":
+            # 截掉上次中斷時寫了一半的頁面
+            self._file.truncate(offset)
+            self._file.seek(offset)
+
+    def write_page(self, docs: List[Dict]) -> Dict:
+        if docs:
+            lines = "".join(json.dumps(doc, ensure_ascii=False) + "\n" for doc in docs)
+            self._file.write(gzip.compress(lines.encode("utf-8")))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"offset": self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetPartWriter:
+    """Parquet 輸出：每頁一個 part 檔，續寫時刪除 checkpoint 之後的 part"""
+
+    def __init__(self, path: str, next_part: Optional[int], with_html: bool):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet 匯出需要 pyarrow：pip install pyarrow")
+
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.next_part = next_part or 0
+        os.makedirs(path, exist_ok=True)
+        if next_part is None:
+            stale = glob.glob(os.path.join(path, "part-*.parquet"))
+        else:
+            stale = [p for p in glob.glob(os.path.join(path, "part-*.parquet"))
+                     if int(os.path.basename(p)[5:10]) >= self.next_part]
+        for p in stale:
+            os.remove(p)
+
+        fields = [pa.field(name, pa.int64() if name == "word_count" else pa.string())
+                  for name in PARQUET_COLUMNS]
+        fields.append(pa.field("tags", pa.list_(pa.string())))
+        if with_html:
+            fields.append(pa.field("html_content", pa.string()))
+        fields.append(pa.field("raw", pa.string()))
+        self.schema = pa.schema(fields)
+        self.with_html = with_html
+
+    def _row(self, doc: Dict) -> Dict:
+        row = {name: doc.get(name) for name in PARQUET_COLUMNS}
+        if row["word_count"] is not None:
+            try:
+                row["word_count"] = int(row["word_count"])
+            except (TypeError, ValueError):
+                row["word_count"] = None
+        for name in PARQUET_COLUMNS:
+            if name != "word_count" and row[name] is not None and not isinstance(row[name], str):
+                row[name] = str(row[name])
+        row["tags"] = tag_names(doc.get("tags"))
+        raw = dict(doc)
+        if self.with_html:
+            row["html_content"] = raw.pop("html_content", None)
+        row["raw"] = json.dumps(raw, ensure_ascii=False)
+        return row
+
+    def write_page(self, docs: List[Dict]) -> Dict:
+        if docs:
+            table = self._pa.Table.from_pylist([self._row(doc) for doc in docs], schema=self.schema)
+            part_path = os.path.join(self.path, f"part-{self.next_part:05d}.parquet")
+            tmp_path = f"{part_path}.tmp"
+            self._pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, part_path)
+            self.next_part += 1
+        return {"next_part": self.next_part}
+
+    def close(self):
+        pass
+
+
+def _output_intact(output: str, fmt: str, state: Dict) -> bool:
+    """checkpoint 記錄的已匯出部分是否仍在輸出中（檔案被刪除或截短時不能續傳）"""
+    if fmt == "parquet":
+        return all(os.path.exists(os.path.join(output, f"part-{n:05d}.parquet"))
+                   for n in range(state.get("next_part") or 0))
+    return os.path.exists(output) and os.path.getsize(output) >= (state.get("offset") or 0)
+
+
+def export_library(output: str, fmt: str = "jsonl", with_html: bool = False,
+                   params: Dict = None, resume: bool = True) -> Dict:
+    """
+    匯出 Reader 文件
+
+    Args:
+        output: 輸出路徑（jsonl 為 .jsonl.gz 檔，parquet 為資料夾）
+        fmt: jsonl 或 parquet
+        with_html: 是否包含 HTML 內容
+        params: 額外的 /list/ 查詢參數（location, category, updatedAfter）
+        resume: 有 checkpoint 時是否續傳（False 則重新匯出）
+
+    Returns:
+        {"documents", "pages", "seconds", "output"}
+    """
+    params = dict(params or {})
+    if with_html:
+        params["withHtmlContent"] = "true"
+
+    checkpoint = CursorCheckpoint(_checkpoint_path(output))
+    cursor, state = None, {}
+    if resume:
+        resumed_params, cursor, state = checkpoint.load_state(params)
+        if cursor and not _output_intact(output, fmt, state):
+            print(f"checkpoint 之前匯出的內容已不在 {output}，從第一頁重新匯出")
+            cursor, state = None, {}
+            checkpoint.clear()
+        elif cursor:
+            params = resumed_params
+            print(f"從 checkpoint 繼續匯出（已匯出 {state.get('documents', 0)} 篇）")
+    else:
+        checkpoint.clear()
+
+    if fmt == "parquet":
+        writer = ParquetPartWriter(output, state.get("next_part") if cursor else None, with_html)
+    else:
+        writer = JsonlGzipWriter(output, state.get("offset") if cursor else None)
+
+    started = time.monotonic()
+    documents = state.get("documents", 0) if cursor else 0
+    exported = 0
+    pages = 0
+    try:
+        for docs, next_cursor in iter_document_pages(params, cursor=cursor):
+            position = writer.write_page(docs)
+            documents += len(docs)
+            exported += len(docs)
+            pages += 1
+            if next_cursor:
+                checkpoint.save(params, next_cursor, {**position, "documents": documents})
+            else:
+                checkpoint.clear()
+
+            if pages % 10 == 0:
+                elapsed = time.monotonic() - started
+                print(f"  {documents} 篇（{exported / elapsed:.1f} 篇/秒）")
+    finally:
+        writer.close()
+
+    return {
+        "documents": documents,
+        "pages": pages,
+        "seconds": round(time.monotonic() - started, 1),
+        "output": output,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯出 Readwise Reader 文件")
+    parser.add_argument("--output", required=True,
+                        help="輸出路徑（jsonl：.jsonl.gz 檔；parquet：資料夾）")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="輸出格式")
+    parser.add_argument("--html", action="store_true", help="包含 HTML 內容")
+    parser.add_argument("--location", default=None, help="只匯出此位置 (new, later, archive, feed...)")
+    parser.add_argument("--category", default=None, help="只匯出此類別 (article, rss, email, note...)")
+    parser.add_argument("--updated-after", default=None, help="只匯出此時間之後有變更的文件 (ISO 8601)")
+    parser.add_argument("--restart", action="store_true", help="忽略 checkpoint，重新匯出")
+    args = parser.parse_args()
+
+    query = {}
+    if args.location:
+        query["location"] = args.location
+    if args.category:
+        query["category"] = args.category
+    if args.updated_after:
+        query["updatedAfter"] = args.updated_after
+
+    try:
+        result = export_library(args.output, fmt=args.format, with_html=args.html,
+                                params=query, resume=not args.restart)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+    print(f"✓ 匯出完成：{result['documents']} 篇（本次 {result['pages']} 頁，{result['seconds']}s）→ {result['output']}")
+    print_rate_limit_stats()
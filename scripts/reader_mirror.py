@@ -0,0 +1,346 @@
+"""
+Readwise Reader 本地鏡像
+
+把 Reader 文件同步到本地 SQLite，之後的查詢（每日推播、測試、臨時腳本）不必重新分頁列出。
+
+同步方式：
+- 以上次同步看到的最大 updated_at 作為 watermark，只拉取之後有變更的文件（delta）
+- 每頁寫入與 page cursor 在同一個交易中 checkpoint，中斷後從該頁繼續
+- 文件以 id upsert，重複拉到同一份文件不影響結果
+
+Reader 的 list API 不會回傳已刪除的文件，鏡像中的刪除需以 --full 重新同步。
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from config import READER_MIRROR_PATH
+from reader_client import iter_document_pages, tag_names
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    url TEXT,
+    source_url TEXT,
+    title TEXT,
+    category TEXT,
+    location TEXT,
+    parent_id TEXT,
+    created_ts REAL,
+    updated_ts REAL,
+    updated_at TEXT,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_location ON documents (location, updated_ts);
+CREATE INDEX IF NOT EXISTS idx_documents_category ON documents (category, updated_ts);
+CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_ts);
+CREATE INDEX IF NOT EXISTS idx_documents_updated ON documents (updated_ts);
+
+CREATE TABLE IF NOT EXISTS document_tags (
+    doc_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (doc_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags (tag);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# watermark 往前重疊的秒數（同一秒更新的文件不會因為邊界被漏掉）
+WATERMARK_OVERLAP = 60
+
+# daily_digest 使用的文章類別（排除 note, highlight）
+DIGEST_CATEGORIES = ("rss", "article", "email")
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """ISO 8601 時間字串轉為 epoch 秒（無法解析時返回 None）"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class ReaderMirror:
+    """Reader 文件的 SQLite 鏡像"""
+
+    def __init__(self, path: str = READER_MIRROR_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每個執行緒使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------
+    # 同步狀態
+    # ------------------------------------------------------------
+
+    def get_state(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, conn: sqlite3.Connection, key: str, value: Optional[str]):
+        if value is None:
+            conn.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    # ------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------
+
+    def _upsert(self, conn: sqlite3.Connection, docs: Iterable[Dict]):
+        for doc in docs:
+            doc_id = doc.get("id")
+            if not doc_id:
+                continue
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (id, url, source_url, title, category, location, "
+                "parent_id, created_ts, updated_ts, updated_at, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, doc.get("url"), doc.get("source_url"), doc.get("title"), doc.get("category"),
+                 doc.get("location"), doc.get("parent_id"), _timestamp(doc.get("created_at")),
+                 _timestamp(doc.get("updated_at")), doc.get("updated_at"),
+                 json.dumps(doc, ensure_ascii=False))
+            )
+            conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+            conn.executemany("INSERT OR IGNORE INTO document_tags (doc_id, tag) VALUES (?, ?)",
+                             [(doc_id, tag) for tag in tag_names(doc.get("tags"))])
+
+    def apply_page(self, docs: List[Dict], next_cursor: Optional[str], max_updated: Optional[str]):
+        """
+        寫入一頁文件並 checkpoint（同一個交易）
+
+        Args:
+            docs: 本頁文件
+            next_cursor: 下一頁的 cursor（None 表示已是最後一頁）
+            max_updated: 本次同步目前看到的最大 updated_at
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._upsert(conn, docs)
+            self._set_state(conn, "cursor", next_cursor)
+            self._set_state(conn, "pending_watermark", max_updated)
+            if next_cursor is None:
+                # 本次同步完成：推進 watermark，清除進行中的狀態
+                if max_updated:
+                    self._set_state(conn, "watermark", max_updated)
+                self._set_state(conn, "cursor_since", None)
+                self._set_state(conn, "pending_watermark", None)
+                self._set_state(conn, "last_sync", datetime.now(timezone.utc).isoformat())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------
+
+    def sync(self, full: bool = False, since_hours: int = None) -> Dict:
+        """
+        從 Reader 同步變更的文件
+
+        Args:
+            full: 忽略 watermark，重新同步全部文件
+            since_hours: 沒有 watermark 時（首次同步）只同步過去幾小時內變更的文件
+
+        Returns:
+            {"pages", "documents", "seconds", "watermark"}
+        """
+        started = time.monotonic()
+        cursor = None if full else self.get_state("cursor")
+        if cursor:
+            # 上次同步中斷：以相同的 updatedAfter 從 checkpoint 繼續
+            since = self.get_state("cursor_since") or None
+            max_updated = self.get_state("pending_watermark")
+            print(f"從上次中斷的頁面繼續同步（updatedAfter={since or '全部'}）")
+        else:
+            watermark = None if full else self.get_state("watermark")
+            if watermark:
+                since_ts = (_timestamp(watermark) or 0) - WATERMARK_OVERLAP
+                since = datetime.fromtimestamp(since_ts, timezone.utc).isoformat()
+            elif since_hours and not full:
+                since = (datetime.now(timezone.utc) - timedelta(hours=since_hours)).isoformat()
+            else:
+                since = None
+            max_updated = None
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            self._set_state(conn, "cursor_since", since or "")
+            conn.execute("COMMIT")
+
+        params = {"updatedAfter": since} if since else {}
+        pages = 0
+        count = 0
+        # 下一頁在背景請求的同時寫入本頁；請求失敗時 checkpoint 停在最後寫入的頁面
+        for docs, next_cursor in iter_document_pages(params, cursor=cursor):
+            for doc in docs:
+                updated = doc.get("updated_at")
+                if updated and (max_updated is None or
+                                (_timestamp(updated) or 0) > (_timestamp(max_updated) or 0)):
+                    max_updated = updated
+
+            self.apply_page(docs, next_cursor, max_updated)
+            pages += 1
+            count += len(docs)
+
+        return {
+            "pages": pages,
+            "documents": count,
+            "seconds": round(time.monotonic() - started, 2),
+            "watermark": self.get_state("watermark"),
+        }
+
+    # ------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------
+
+    def query(self, location: str = None, category: Iterable[str] = None, tag: str = None,
+              updated_after: datetime = None, created_after: datetime = None,
+              limit: int = None) -> List[Dict]:
+        """
+        查詢鏡像中的文件（依 updated_at 由新到舊）
+
+        Args:
+            location: 文章位置 (new, later, archive, feed...)
+            category: 類別或類別列表 (rss, article, email, note, highlight...)
+            tag: 帶有此 tag 的文件
+            updated_after: 此時間之後有變更的文件
+            created_after: 此時間之後建立的文件
+            limit: 最多返回幾筆
+
+        Returns:
+            Reader 原始格式的文件列表
+        """
+        clauses, params = [], []
+        if location:
+            clauses.append("d.location = ?")
+            params.append(location)
+        if category:
+            categories = [category] if isinstance(category, str) else list(category)
+            clauses.append(f"d.category IN ({','.join('?' * len(categories))})")
+            params.extend(categories)
+        if tag:
+            clauses.append("d.id IN (SELECT doc_id FROM document_tags WHERE tag = ?)")
+            params.append(tag)
+        if updated_after:
+            clauses.append("d.updated_ts > ?")
+            params.append(updated_after.timestamp())
+        if created_after:
+            clauses.append("d.created_ts > ?")
+            params.append(created_after.timestamp())
+
+        sql = "SELECT d.raw FROM documents d"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY d.updated_ts DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [json.loads(row[0]) for row in self._conn().execute(sql, params)]
+
+    def recent_documents(self, hours: int = 24, location: str = "feed") -> List[Dict]:
+        """
+        與 reader_client.get_recent_documents 相同條件的查詢（從鏡像讀取）
+
+        Args:
+            hours: 過去幾小時內的文章
+            location: 文章位置 (feed, archive, later)
+
+        Returns:
+            文章列表
+        """
+        since = datetime.now().astimezone() - timedelta(hours=hours)
+        docs = self.query(location=location, category=DIGEST_CATEGORIES, updated_after=since)
+        return [d for d in docs if d.get("title")]
+
+    def stats(self) -> Dict:
+        """鏡像筆數與同步狀態"""
+        conn = self._conn()
+        by_location = dict(conn.execute(
+            "SELECT COALESCE(location, ''), COUNT(*) FROM documents GROUP BY location").fetchall())
+        return {
+            "path": self.path,
+            "documents": sum(by_location.values()),
+            "by_location": by_location,
+            "watermark": self.get_state("watermark"),
+            "last_sync": self.get_state("last_sync"),
+            "resumable": bool(self.get_state("cursor")),
+        }
+
+
+_mirror: Optional[ReaderMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_reader_mirror() -> ReaderMirror:
+    """取得共用的 ReaderMirror"""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = ReaderMirror()
+    return _mirror
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reader 本地鏡像")
+    sub = parser.add_subparsers(dest="command")
+
+    sync_parser = sub.add_parser("sync", help="同步變更的文件")
+    sync_parser.add_argument("--full", action="store_true", help="忽略 watermark，重新同步全部文件")
+    sync_parser.add_argument("--since-hours", type=int, default=None,
+                             help="首次同步只拉取過去幾小時內變更的文件（預設全部）")
+
+    sub.add_parser("stats", help="顯示鏡像狀態")
+
+    query_parser = sub.add_parser("query", help="查詢鏡像")
+    query_parser.add_argument("--location", default=None)
+    query_parser.add_argument("--category", default=None)
+    query_parser.add_argument("--tag", default=None)
+    query_parser.add_argument("--hours", type=int, default=None, help="過去幾小時內有變更的文件")
+    query_parser.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    mirror = get_reader_mirror()
+
+    if args.command == "sync":
+        result = mirror.sync(full=args.full, since_hours=args.since_hours)
+        print(f"✓ 同步完成：{result['pages']} 頁、{result['documents']} 篇，耗時 {result['seconds']}s")
+        print(f"  watermark: {result['watermark']}")
+    elif args.command == "query":
+        updated_after = (datetime.now().astimezone() - timedelta(hours=args.hours)) if args.hours else None
+        started = time.monotonic()
+        docs = mirror.query(location=args.location, category=args.category, tag=args.tag,
+                            updated_after=updated_after, limit=args.limit)
+        print(f"{len(docs)} 篇（{(time.monotonic() - started) * 1000:.1f} ms）")
+        for doc in docs:
+            print(f"  [{doc.get('location')}/{doc.get('category')}] {(doc.get('title') or '')[:60]}")
+    else:
+        for key, value in mirror.stats().items():
+            print(f"{key}: {value}")
@@ -0,0 +1,259 @@
+"""
+Quick Capture 已存入 URL 索引
+
+轉傳的連結先以 canonical_url（並展開已知短網址）正規化，再查本地索引：
+已存入 Reader 的連結直接回覆「已在 Reader 中」，不再呼叫 detect_domain 與 save_url。
+
+索引是 SQLite（WAL），app.py 的多個 gunicorn worker、quick_capture 可共用同一個檔案。
+可用 --seed 從 Reader 鏡像（reader_mirror）匯入既有文件。
+
+使用方式：
+    python saved_urls.py --seed     # 從鏡像匯入
+    python saved_urls.py --stats
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from config import SAVED_URL_INDEX_PATH, CAPTURE_DUPLICATE_TAG_MERGE
+from url_utils import canonical_url, is_shortened, resolve_url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saved_urls (
+    url TEXT PRIMARY KEY,
+    doc_id TEXT,
+    title TEXT,
+    tags TEXT,
+    saved_at REAL NOT NULL
+);
+"""
+
+
+class SavedUrlIndex:
+    """正規化 URL -> Reader 文件"""
+
+    def __init__(self, path: str = SAVED_URL_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每個執行緒使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _keys(self, url: str, resolve: bool = True) -> List[str]:
+        """原始 URL 與展開短網址後的 URL 的正規化形式"""
+        keys = [canonical_url(url)]
+        if resolve and is_shortened(url):
+            resolved = canonical_url(resolve_url(url))
+            if resolved not in keys:
+                keys.append(resolved)
+        return [key for key in keys if key]
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """
+        查詢 URL 是否已存入
+
+        短網址先以原始形式查詢（之前存過就不必連網），查不到才展開。
+
+        Args:
+            url: 轉傳的 URL
+
+        Returns:
+            {"url", "doc_id", "title", "tags", "saved_at"}，未存入時為 None
+
+        Raises:
+            sqlite3.Error / requests.RequestException: 索引讀取或短網址展開失敗（不視為未存入）
+        """
+        entry = self._get(canonical_url(url))
+        if entry or not is_shortened(url):
+            return entry
+        resolved = canonical_url(resolve_url(url, strict=True))
+        entry = self._get(resolved)
+        if entry:
+            # 記住短網址，下次不必再展開
+            self._put([canonical_url(url)], entry["doc_id"], entry["title"], entry["tags"])
+        return entry
+
+    def _get(self, key: str) -> Optional[Dict]:
+        if not key:
+            return None
+        row = self._conn().execute(
+            "SELECT url, doc_id, title, tags, saved_at FROM saved_urls WHERE url = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "url": row[0],
+            "doc_id": row[1],
+            "title": row[2],
+            "tags": json.loads(row[3] or "[]"),
+            "saved_at": row[4],
+        }
+
+    def _put(self, keys: Iterable[str], doc_id: Optional[str], title: Optional[str], tags: Iterable[str]):
+        now = time.time()
+        tags_json = json.dumps(sorted(set(tags or [])), ensure_ascii=False)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO saved_urls (url, doc_id, title, tags, saved_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, doc_id, title, tags_json, now) for key in keys],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def record(self, url: str, doc_id: Optional[str], title: str = None, tags: Iterable[str] = None,
+               resolve: bool = True):
+        """
+        記錄已存入的 URL
+
+        Args:
+            url: 存入的 URL
+            doc_id: Reader 文件 ID
+            title: 標題
+            tags: 已加上的 tag
+            resolve: 短網址是否也記錄展開後的形式
+        """
+        keys = self._keys(url, resolve=resolve)
+        if keys:
+            self._put(keys, doc_id, title, tags)
+
+    def set_tags(self, doc_id: str, tags: Iterable[str]):
+        """更新索引中此文件的 tag 紀錄"""
+        self._conn().execute(
+            "UPDATE saved_urls SET tags = ? WHERE doc_id = ?",
+            (json.dumps(sorted(set(tags)), ensure_ascii=False), doc_id),
+        )
+
+    def seed_from_mirror(self) -> int:
+        """
+        從 Reader 鏡像匯入既有文件的 source_url
+
+        Returns:
+            匯入的筆數
+        """
+        from reader_client import tag_names
+        from reader_mirror import get_reader_mirror
+
+        rows = []
+        for doc in get_reader_mirror().query(limit=None):
+            if doc.get("parent_id") or not doc.get("source_url"):
+                continue
+            key = canonical_url(doc["source_url"])
+            if key:
+                rows.append((key, doc["id"], doc.get("title"),
+                             json.dumps(sorted(tag_names(doc.get("tags"))), ensure_ascii=False),
+                             time.time()))
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 已記錄的 URL 保留原本的資料
+            conn.executemany(
+                "INSERT OR IGNORE INTO saved_urls (url, doc_id, title, tags, saved_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def stats(self) -> Dict:
+        """索引筆數"""
+        row = self._conn().execute("SELECT COUNT(*), COUNT(DISTINCT doc_id) FROM saved_urls").fetchone()
+        return {"urls": row[0], "documents": row[1]}
+
+
+_index: Optional[SavedUrlIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_saved_url_index() -> SavedUrlIndex:
+    """取得共用的已存入 URL 索引"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SavedUrlIndex()
+        return _index
+
+
+def find_saved_capture(url: str, tags: List[str] = None) -> Optional[Dict]:
+    """
+    Quick Capture 用：查詢轉傳的連結是否已存入 Reader
+
+    已存入且 CAPTURE_DUPLICATE_TAG_MERGE 開啟時，把缺少的 tags 合併進文件
+    （索引中的 tag 可能過期，合併前重新讀取文件的 tags，再以一次 PATCH 更新，失敗不影響結果）。
+
+    Args:
+        url: 轉傳的 URL
+        tags: 這次轉傳要加上的 tags
+
+    Returns:
+        {"doc_id", "title", "domain", "tags"}，未存入時為 None
+
+    Raises:
+        sqlite3.Error / requests.RequestException: 無法判斷是否已存入（app.py 以 lookup 階段重試）
+    """
+    index = get_saved_url_index()
+    entry = index.lookup(url)
+    if not entry or not entry["doc_id"]:
+        return None
+
+    missing = [tag for tag in tags or [] if tag not in entry["tags"]]
+    if missing and CAPTURE_DUPLICATE_TAG_MERGE:
+        from reader_client import add_tags_to_documents
+
+        if add_tags_to_documents({entry["doc_id"]: missing}).get(entry["doc_id"]):
+            entry["tags"] = entry["tags"] + missing
+            index.set_tags(entry["doc_id"], entry["tags"])
+
+    domains = [tag[1:] for tag in entry["tags"] if tag.startswith("@")]
+    entry["domain"] = domains[0] if domains else None
+    return entry
+
+
+def record_saved_capture(url: str, doc: Dict, tags: List[str] = None):
+    """Quick Capture 用：記錄剛存入 Reader 的連結（失敗不影響存入結果）"""
+    try:
+        get_saved_url_index().record(url, doc.get("id"), doc.get("title"), tags)
+    except Exception as e:
+        print(f"Error writing saved URL index: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quick Capture 已存入 URL 索引")
+    parser.add_argument("--seed", action="store_true", help="從 Reader 鏡像匯入既有文件")
+    parser.add_argument("--stats", action="store_true", help="顯示索引筆數")
+    parser.add_argument("--lookup", default=None, help="查詢 URL 是否已存入")
+    args = parser.parse_args()
+
+    index = get_saved_url_index()
+    if args.seed:
+        print(f"✓ 從鏡像匯入 {index.seed_from_mirror()} 筆")
+    if args.lookup:
+        entry = index.lookup(args.lookup)
+        if not entry:
+            print("未存入")
+            sys.exit(1)
+        print(json.dumps(entry, ensure_ascii=False, indent=2))
+    if args.stats or not (args.seed or args.lookup):
+        stats = index.stats()
+        print(f"索引：{stats['urls']} 個 URL，{stats['documents']} 篇文件")
@@ -0,0 +1,105 @@
+"""
+已處理 Entry 索引
+
+記錄每個「領域 + feed」已經送進 AI 篩選過的 entry（以 GUID 或連結為 key），
+讓 fetch_rss_feed 遇到已處理的 entry 時可以提前停止，避免同一篇文章每天重複進入 prompt。
+
+以領域區分範圍：同一個 feed 可能被多個領域使用（例如 Claude Code Releases），
+在 github 領域處理過不代表 claude-code 領域也處理過。
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Set
+
+from config import SEEN_INDEX_PATH, SEEN_MAX_PER_FEED
+
+
+def entry_key(entry: Dict) -> str:
+    """取得 entry 的唯一識別（優先 GUID，其次連結）"""
+    return entry.get("id") or entry.get("link") or ""
+
+
+class SeenIndex:
+    """以 JSON 檔保存的已處理 entry 索引"""
+
+    def __init__(self, path: str = SEEN_INDEX_PATH, max_per_feed: int = SEEN_MAX_PER_FEED):
+        self.path = path
+        self.max_per_feed = max_per_feed
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _scope(domain: str, feed_url: str) -> str:
+        return f"{domain}|{feed_url}"
+
+    def seen_keys(self, domain: str, feed_url: str) -> Set[str]:
+        """取得某領域某 feed 已處理過的 entry keys"""
+        with self._lock:
+            return set(self._data.get(self._scope(domain, feed_url), {}))
+
+    def mark(self, domain: str, feed_url: str, keys: Iterable[str]) -> None:
+        """
+        標記 entry 為已處理（只更新記憶體，需呼叫 save() 寫入）
+
+        Args:
+            domain: 領域名稱
+            feed_url: feed URL
+            keys: entry keys
+        """
+        now = datetime.now().isoformat()
+        with self._lock:
+            scope = self._data.setdefault(self._scope(domain, feed_url), {})
+            for key in keys:
+                if not key:
+                    continue
+                # 重新插入，讓最近標記的排在最後（修剪時保留）
+                scope.pop(key, None)
+                scope[key] = now
+            if len(scope) > self.max_per_feed:
+                for key in list(scope)[:len(scope) - self.max_per_feed]:
+                    del scope[key]
+
+    def mark_articles(self, domain: str, articles: Iterable[Dict]) -> int:
+        """
+        依文章上的 feed_url / entry_id 標記已處理
+
+        Returns:
+            標記的文章數
+        """
+        by_feed = {}
+        for article in articles:
+            if article.get("feed_url") and article.get("entry_id"):
+                by_feed.setdefault(article["feed_url"], []).append(article["entry_id"])
+
+        for feed_url, keys in by_feed.items():
+            self.mark(domain, feed_url, keys)
+        return sum(len(keys) for keys in by_feed.values())
+
+    def save(self) -> None:
+        """寫入磁碟（暫存檔 + rename）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+_index = None
+
+
+def get_seen_index() -> SeenIndex:
+    """取得共用的 SeenIndex（首次呼叫時從磁碟載入）"""
+    global _index
+    if _index is None:
+        _index = SeenIndex()
+    return _index
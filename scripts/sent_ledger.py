@@ -0,0 +1,151 @@
+"""
+已推播帳本
+
+記錄每篇已成功推播文章的正規化 URL，讓 domain_digest 與 daily_digest
+在 AI 篩選前就排除已推播過的文章（不同領域的時間窗口會重疊）。
+
+格式為 append-only JSONL，每行 {"url", "domain", "sent_at"}；
+過期（超過保留天數）的紀錄在載入時忽略，並在檔案膨脹時壓縮重寫。
+"""
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from config import SENT_LEDGER_PATH, SENT_LEDGER_RETENTION_DAYS, SENT_LEDGER_COMPACT_RATIO
+from url_utils import canonical_url
+
+# 少於此行數時不值得壓縮
+MIN_COMPACT_LINES = 200
+
+
+class SentLedger:
+    """以 JSONL 保存的已推播 URL 帳本"""
+
+    def __init__(self, path: str = SENT_LEDGER_PATH,
+                 retention_days: int = SENT_LEDGER_RETENTION_DAYS,
+                 compact_ratio: float = SENT_LEDGER_COMPACT_RATIO):
+        self.path = path
+        self.retention = timedelta(days=retention_days)
+        self.compact_ratio = compact_ratio
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._lines = 0
+        self._load()
+
+    def _load(self) -> None:
+        cutoff = datetime.now() - self.retention
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        record = json.loads(line)
+                        sent_at = datetime.fromisoformat(record["sent_at"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 寫入中斷造成的半行
+                    if sent_at >= cutoff:
+                        self._entries[record["url"]] = record
+        except OSError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def contains(self, url: str) -> bool:
+        """URL 是否已推播過（保留期間內）"""
+        key = canonical_url(url)
+        return bool(key) and key in self._entries
+
+    def filter_unsent(self, articles: List[Dict], url_getter) -> Tuple[List[Dict], int]:
+        """
+        排除已推播過的文章
+
+        Args:
+            articles: 文章列表
+            url_getter: 從文章取出 URL 的函式
+
+        Returns:
+            (未推播的文章, 排除的篇數)
+        """
+        kept = [a for a in articles if not self.contains(url_getter(a))]
+        return kept, len(articles) - len(kept)
+
+    def record(self, urls: Iterable[str], domain: str) -> int:
+        """
+        記錄已推播的 URL（立即 append 並 fsync）
+
+        Args:
+            urls: 已推播文章的 URL
+            domain: 推播的領域
+
+        Returns:
+            寫入的筆數
+        """
+        now = datetime.now().isoformat()
+        records = []
+        for url in urls:
+            key = canonical_url(url)
+            if key:
+                records.append({"url": key, "domain": domain, "sent_at": now})
+        if not records:
+            return 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            for record in records:
+                self._entries[record["url"]] = record
+            self._lines += len(records)
+            needs_compact = (self._lines >= MIN_COMPACT_LINES and
+                             self._lines > len(self._entries) * self.compact_ratio)
+
+        if needs_compact:
+            self.compact()
+        return len(records)
+
+    def compact(self) -> None:
+        """重寫帳本，只保留保留期間內每個 URL 的最新紀錄"""
+        cutoff = datetime.now() - self.retention
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            self._entries = {
+                url: record for url, record in self._entries.items()
+                if datetime.fromisoformat(record["sent_at"]) >= cutoff
+            }
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in self._entries.values():
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+
+
+_ledger = None
+
+
+def get_sent_ledger() -> SentLedger:
+    """取得共用的 SentLedger（首次呼叫時從磁碟載入）"""
+    global _ledger
+    if _ledger is None:
+        _ledger = SentLedger()
+    return _ledger
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="已推播帳本")
+    parser.add_argument("--compact", action="store_true", help="壓縮帳本")
+    args = parser.parse_args()
+
+    ledger = get_sent_ledger()
+    print(f"帳本：{ledger.path}")
+    print(f"保留期間內的 URL：{len(ledger)}（檔案 {ledger._lines} 行）")
+    if args.compact:
+        ledger.compact()
+        print("✓ 壓縮完成")
@@ -0,0 +1,161 @@
+"""
+Reader tag 登錄表
+
+在程序內保存所有 tag（以小寫名稱為 key），查詢是 O(1) 的字典操作，不會連網：
+- 超過 TTL 或被標記為過期時，下一次查詢會在背景執行緒重新載入，查詢本身繼續使用舊資料
+- 寫入時（update / save 帶有新 tag）呼叫 observe，新 tag 立即可查，並標記為過期以便背景校正
+"""
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+def _key(name: str) -> str:
+    return (name or "").strip().lower()
+
+
+class TagRegistry:
+    """執行緒安全的 tag 登錄表"""
+
+    def __init__(self, loader: Callable[[], List[Dict]], ttl: float):
+        """
+        Args:
+            loader: 載入所有 tag 的函式（返回 {"name": ...} 字典列表）
+            ttl: 資料有效秒數
+        """
+        self._loader = loader
+        self.ttl = ttl
+        self._tags: Dict[str, Dict] = {}
+        self._observed: Dict[str, Dict] = {}  # 上次載入開始後才寫入的 tag
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------
+    # 載入
+    # ------------------------------------------------------------
+
+    def _expired(self) -> bool:
+        return (self._stale or self._loaded_at is None
+                or time.monotonic() - self._loaded_at >= self.ttl)
+
+    def refresh(self) -> bool:
+        """
+        重新載入所有 tag（阻塞）
+
+        Returns:
+            是否成功（失敗時保留舊資料）
+        """
+        with self._lock:
+            self._stale = False
+            self._observed = {}
+        try:
+            tags = self._loader()
+        except Exception as e:
+            print(f"Error loading tags: {e}")
+            with self._lock:
+                self._stale = True
+                self.failures += 1
+            return False
+
+        with self._lock:
+            loaded = {_key(tag.get("name")): tag for tag in tags if tag.get("name")}
+            for key, tag in self._observed.items():
+                loaded.setdefault(key, tag)
+            self._tags = loaded
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+        return True
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _maybe_refresh(self):
+        """資料過期時啟動背景載入（不等待）"""
+        with self._lock:
+            self.lookups += 1
+            if self._refreshing or not self._expired():
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name="tag-registry", daemon=True).start()
+
+    def warm(self, block: bool = False):
+        """預先載入（啟動時呼叫，避免第一次查詢時還是空的）"""
+        if block:
+            self.refresh()
+        else:
+            self._maybe_refresh()
+
+    # ------------------------------------------------------------
+    # 查詢（不連網）
+    # ------------------------------------------------------------
+
+    def has(self, name: str) -> bool:
+        """tag 是否存在（不分大小寫）"""
+        self._maybe_refresh()
+        return _key(name) in self._tags
+
+    def canonical(self, name: str) -> Optional[str]:
+        """返回 Reader 中的 tag 名稱（大小寫以 Reader 為準），不存在時為 None"""
+        self._maybe_refresh()
+        tag = self._tags.get(_key(name))
+        return tag["name"] if tag else None
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        """返回尚不存在的 tag"""
+        self._maybe_refresh()
+        tags = self._tags
+        return [name for name in names if _key(name) not in tags]
+
+    def all(self) -> List[Dict]:
+        """所有 tag（依名稱排序）"""
+        self._maybe_refresh()
+        return sorted(self._tags.values(), key=lambda tag: _key(tag["name"]))
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    # ------------------------------------------------------------
+    # 寫入 hook
+    # ------------------------------------------------------------
+
+    def observe(self, names: Iterable[str]):
+        """
+        寫入後呼叫：出現新 tag 時立即加入，並標記過期讓下一次查詢在背景重新載入
+
+        Args:
+            names: 剛寫入文件的 tags
+        """
+        with self._lock:
+            new = {_key(name): {"name": name} for name in names or []
+                   if _key(name) and _key(name) not in self._tags}
+            if not new:
+                return
+            # 換新字典而非原地修改，查詢端不需要加鎖
+            self._tags = {**self._tags, **new}
+            self._observed.update(new)
+            self._stale = True
+            self.invalidations += 1
+
+    def stats(self) -> Dict:
+        """tag 數、資料年齡與載入次數"""
+        with self._lock:
+            return {
+                "tags": len(self._tags),
+                "age": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+                "lookups": self.lookups,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "invalidations": self.invalidations,
+            }
@@ -1,9 +1,9 @@
 """
 Telegram Bot 推播模組
 """
-import requests
 from typing import List, Dict, Optional
 from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from http_session import get_session
 
 
 def send_message(text: str, parse_mode: str = "HTML") -> bool:
@@ -26,7 +26,7 @@ def send_message(text: str, parse_mode: str = "HTML") -> bool:
         "disable_web_page_preview": True
     }
 
-    response = requests.post(url, json=payload)
+    response = get_session().post(url, json=payload)
 
     if response.status_code != 200:
         print(f"Error sending message: {response.status_code}")
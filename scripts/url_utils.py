@@ -0,0 +1,122 @@
+"""
+URL 正規化工具
+
+同一篇文章常以不同形式出現（http/https、www、追蹤參數、結尾斜線、短網址），
+canonical_url 把它們轉成同一個 key，供去重使用；resolve_url 另外展開已知的短網址。
+"""
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 不影響內容的追蹤參數
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ref", "ref_src", "ref_url", "source", "si", "spm", "_hsenc", "_hsmi",
+    "cmpid", "smid", "sref", "share", "trk", "s_cid",
+}
+TRACKING_PREFIXES = ("utm_", "__")
+
+# 需要連網展開的短網址服務
+SHORTENER_HOSTS = {
+    "bit.ly", "t.co", "tinyurl.com", "goo.gl", "ow.ly", "buff.ly", "lnkd.in", "is.gd",
+    "t.ly", "dlvr.it", "reurl.cc", "pse.is", "ppt.cc", "rebrand.ly", "shorturl.at", "cutt.ly",
+}
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url: str) -> str:
+    """
+    將 URL 正規化為去重用的 key
+
+    - scheme 統一為 https，host 轉小寫並移除 www. 與預設 port
+    - 移除追蹤參數與 fragment，其餘 query 參數排序
+    - 移除路徑結尾的斜線
+
+    Args:
+        url: 原始 URL
+
+    Returns:
+        正規化後的 URL（無法解析時返回去除空白的原字串）
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    path = parts.path.rstrip("/")
+
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not _is_tracking_param(k)]
+
+    # youtu.be/ID 與 m.youtube.com 不需連網即可轉成標準形式
+    if host == "youtu.be" and path:
+        host, query = "youtube.com", [("v", path.lstrip("/"))] + query
+        path = "/watch"
+    elif host == "m.youtube.com":
+        host = "youtube.com"
+
+    query.sort()
+
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def is_shortened(url: str) -> bool:
+    """是否為已知的短網址"""
+    try:
+        host = (urlsplit((url or "").strip()).hostname or "").lower()
+    except ValueError:
+        return False
+    return host.removeprefix("www.") in SHORTENER_HOSTS
+
+
+def resolve_url(url: str, timeout: float = 5, strict: bool = False) -> str:
+    """
+    展開已知的短網址（跟隨轉址到最終 URL）
+
+    只有 SHORTENER_HOSTS 中的網址會連網；失敗時返回原 URL（strict 時拋出例外）。
+
+    Args:
+        url: 原始 URL
+        timeout: 請求逾時秒數
+        strict: 連線失敗時拋出例外，而不是返回原 URL
+
+    Returns:
+        展開後的 URL
+    """
+    if not is_shortened(url):
+        return url
+
+    from http_session import get_session
+
+    try:
+        response = get_session().head(url.strip(), allow_redirects=True, timeout=timeout)
+        if response.url and response.status_code < 400:
+            return response.url
+        # 部分短網址服務不支援 HEAD
+        response = get_session().get(url.strip(), allow_redirects=True, timeout=timeout, stream=True)
+        response.close()
+        return response.url or url
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error resolving {url}: {e}")
+        return url
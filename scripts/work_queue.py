@@ -0,0 +1,229 @@
+"""
+SQLite 工作佇列
+
+多個執行緒、多個程序（gunicorn worker）共用同一個檔案：
+- 以 BEGIN IMMEDIATE 取得寫入鎖後領取工作，同一筆工作只會被一個 worker 領取
+- 領取時設定 lease，worker 中途結束（容器重啟）時 lease 到期即可被其他 worker 重新領取
+- 同一個 order_key（例如 chat_id）的工作依加入順序一次處理一筆，前一筆完成或放棄後才輪到下一筆
+- dedupe_key 重複的工作不會再次加入（例如 Telegram update_id）
+- 失敗的工作可指定延遲後重試，或標記為 failed 保留錯誤訊息
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    dedupe_key TEXT,
+    order_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (queue, dedupe_key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (queue, status, next_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_order ON jobs (queue, order_key, id);
+"""
+
+# 領取條件：可執行（pending 且到期，或 running 但 lease 已過期），
+# 且同一 order_key 沒有更早、尚未結束的工作
+CLAIM_SQL = """
+SELECT id FROM jobs j
+WHERE j.queue = ?
+  AND ((j.status = 'pending' AND j.next_at <= ?) OR (j.status = 'running' AND j.lease_until < ?))
+  AND (j.order_key IS NULL OR NOT EXISTS (
+        SELECT 1 FROM jobs k
+        WHERE k.queue = j.queue AND k.order_key = j.order_key AND k.id < j.id
+          AND k.status IN ('pending', 'running')))
+ORDER BY j.id
+LIMIT 1
+"""
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class WorkQueue:
+    """以 SQLite 保存的工作佇列（一個檔案可放多個具名佇列）"""
+
+    def __init__(self, path: str, queue: str):
+        self.path = path
+        self.queue = queue
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """每個執行緒使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _write(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(sql, params)
+            conn.execute("COMMIT")
+            return cursor
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, payload: Dict, order_key: str = None, dedupe_key: str = None,
+            delay: float = 0) -> Optional[int]:
+        """
+        加入工作
+
+        Args:
+            payload: 工作內容（可 JSON 序列化）
+            order_key: 同一 key 的工作依序處理
+            dedupe_key: 重複的 key 不再加入
+            delay: 幾秒後才可領取
+
+        Returns:
+            工作 ID，dedupe_key 已存在時為 None
+        """
+        now = time.time()
+        cursor = self._write(
+            "INSERT OR IGNORE INTO jobs (queue, dedupe_key, order_key, payload, next_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.queue, dedupe_key, order_key, json.dumps(payload, ensure_ascii=False), now + delay, now, now),
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def claim(self, lease: float) -> Optional[Dict]:
+        """
+        領取一筆工作
+
+        Args:
+            lease: 處理時限（秒），逾時未完成的工作可被重新領取
+
+        Returns:
+            工作（含 id, payload, attempts 等欄位），沒有可領取的工作時為 None
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(CLAIM_SQL, (self.queue, now, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                "WHERE id = ?",
+                (now + lease, now, row["id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return _row_to_job(job)
+
+    def complete(self, job_id: int, result: Dict = None):
+        """標記完成"""
+        self._write(
+            "UPDATE jobs SET status = 'done', lease_until = NULL, last_error = NULL, result = ?, updated_at = ? "
+            "WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False) if result is not None else None, time.time(), job_id),
+        )
+
+    def set_result(self, job_id: int, result: Dict):
+        """在處理途中保存中間結果（重試時 claim 返回的 job["result"] 帶有這份結果）"""
+        self._write(
+            "UPDATE jobs SET result = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job_id),
+        )
+
+    def fail(self, job_id: int, error: str, retry_in: float = None):
+        """
+        標記失敗
+
+        Args:
+            job_id: 工作 ID
+            error: 錯誤訊息
+            retry_in: 幾秒後重試；None 表示放棄（status = failed）
+        """
+        now = time.time()
+        if retry_in is None:
+            self._write(
+                "UPDATE jobs SET status = 'failed', lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                (error, now, job_id),
+            )
+        else:
+            self._write(
+                "UPDATE jobs SET status = 'pending', lease_until = NULL, last_error = ?, next_at = ?, updated_at = ? "
+                "WHERE id = ?",
+                (error, now + retry_in, now, job_id),
+            )
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def jobs(self, status: str, limit: int = None) -> List[Dict]:
+        """依加入順序列出某個狀態的工作"""
+        sql = "SELECT * FROM jobs WHERE queue = ? AND status = ? ORDER BY id"
+        params = [self.queue, status]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_row_to_job(row) for row in self._conn().execute(sql, params)]
+
+    def prune(self, keep_seconds: float) -> int:
+        """刪除完成超過 keep_seconds 的工作（dedupe_key 保留期間即為 keep_seconds）"""
+        cursor = self._write(
+            "DELETE FROM jobs WHERE queue = ? AND status = 'done' AND updated_at < ?",
+            (self.queue, time.time() - keep_seconds),
+        )
+        return cursor.rowcount
+
+    def ready_count(self) -> int:
+        """目前可領取的工作數（不考慮 order_key 順序）"""
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND ((status = 'pending' AND next_at <= ?) "
+            "OR (status = 'running' AND lease_until < ?))",
+            (self.queue, now, now),
+        ).fetchone()
+        return row[0]
+
+    def pending_count(self) -> int:
+        """尚未結束（pending 或 running）的工作數"""
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status IN ('pending', 'running')", (self.queue,)
+        ).fetchone()
+        return row[0]
+
+    def stats(self) -> Dict[str, int]:
+        """各狀態的工作數"""
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (self.queue,)
+        ).fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
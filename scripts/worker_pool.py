@@ -0,0 +1,182 @@
+"""
+程序內的背景 worker pool
+
+webhook 收到 update 後只把它放進有上限的佇列就返回，由背景執行緒處理：
+- 佇列已滿或正在關閉時 submit 返回 False（update 已先寫入持久化佇列，由 app.py 的 sweep_updates 稍後處理）
+- stats() 提供佇列深度、拒絕次數、排隊與處理時間的百分位數，用來觀察背壓
+- drain() 停止接收新工作，等待佇列中的工作處理完（程序結束前呼叫）
+"""
+import os
+import time
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class LatencyWindow:
+    """最近 N 筆耗時的百分位數統計（執行緒安全）"""
+
+    def __init__(self, size: int = 1000):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict:
+        """{"count", "p50_ms", "p95_ms", "p99_ms", "max_ms"}（百分位數以最近的樣本計算）"""
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        return {"count": count, "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+                "max_ms": round(samples[-1] * 1000, 2)}
+
+
+class WorkerPool:
+    """固定數量執行緒 + 有上限佇列的 worker pool"""
+
+    def __init__(self, name: str, handler: Callable[[Any], None], workers: int, max_queue: int):
+        """
+        Args:
+            name: 名稱（執行緒名稱與統計用）
+            handler: 處理單一工作的函式（例外會被記錄，不會中斷 worker）
+            workers: 執行緒數
+            max_queue: 佇列上限
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._accepting = True
+        self._busy = 0
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait = LatencyWindow()
+        self.run_time = LatencyWindow()
+
+    def start(self):
+        """啟動執行緒（每個程序各自一組，fork 後第一次呼叫時重建）"""
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._accepting = True
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item: Any) -> bool:
+        """
+        加入工作（不等待）
+
+        Returns:
+            是否已加入（佇列已滿或正在關閉時為 False）
+        """
+        self.start()
+        with self._lock:
+            if not self._accepting:
+                self.rejected += 1
+                return False
+            try:
+                self._queue.put_nowait((time.monotonic(), item))
+            except queue.Full:
+                self.rejected += 1
+                return False
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _worker(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                self._queue.task_done()
+                return
+            queued_at, item = entry
+            started = time.monotonic()
+            self.wait.add(started - queued_at)
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handler(item)
+                ok = True
+            except Exception as e:
+                print(f"Error in {self.name} worker: {e}")
+                ok = False
+            finally:
+                self.run_time.add(time.monotonic() - started)
+                with self._lock:
+                    self._busy -= 1
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                self._queue.task_done()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        停止接收新工作，等待已加入的工作完成後結束執行緒
+
+        Args:
+            timeout: 最多等待秒數
+
+        Returns:
+            是否在時限內處理完
+        """
+        with self._lock:
+            self._accepting = False
+            threads = list(self._threads) if self._pid == os.getpid() else []
+        if not threads:
+            return True
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        drained = not self._queue.unfinished_tasks
+        if drained:
+            for _ in threads:
+                self._queue.put(None)
+            for thread in threads:
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        else:
+            print(f"{self.name}: 關閉時仍有 {self._queue.qsize()} 筆未處理")
+        return drained
+
+    def stats(self) -> Dict:
+        """佇列深度、處理數與排隊 / 處理時間"""
+        with self._lock:
+            counters = {
+                "workers": self.workers,
+                "busy": self._busy,
+                "depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "max_depth": self.max_depth,
+                "accepting": self._accepting,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        return {**counters, "wait": self.wait.summary(), "run": self.run_time.summary()}